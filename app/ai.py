@@ -1,13 +1,69 @@
+import json
 import logging
 import re
 import psycopg
 from datetime import datetime, timedelta, timezone
-from .db import pg_dsn
-from .config import read_offset
+from .db import aconnection
+from .config import ai_pick_cache_ttl_seconds, ai_pick_cache_max_entries, country_cache_max_entries, country_cache_ttl_seconds
+from .cache import TTLCache
+from .notify import register_listener
+from .rollup import accuracy_counts
+from .tz import day_windows, to_local
 from .utils import format_tags
 
 logger = logging.getLogger(__name__)
 
+AI_PICK_CHANNEL = "ai_pick_changed"
+USER_COUNTRY_CHANNEL = "user_country_changed"
+
+_pick_cache = TTLCache(ai_pick_cache_max_entries(), ai_pick_cache_ttl_seconds())
+_country_cache = TTLCache(country_cache_max_entries(), country_cache_ttl_seconds())
+_country_gen = 0
+_pick_gen = 0
+_MISSING = object()
+
+COUNTRY_BY_CHATROOM_SQL = "SELECT country FROM users WHERE chatroom_id = %s LIMIT 1"
+COUNTRY_BY_EXTERNAL_ID_SQL = "SELECT country FROM users WHERE external_id = %s LIMIT 1"
+
+RECENT_PICKS_SQL = """
+select pick_hit(t1.predict_winner, t2.result)
+from ai_eval t1
+inner join fixtures t2 on t1.fixture_id = t2.fixture_id
+where t1.if_bet = 1 and t1.confidence > 0.6 and t2.result is not null
+order by t2.fixture_date desc
+limit 10
+"""
+
+YESTERDAY_PICKS_SQL = """
+select t2.home_name,
+       t2.away_name,
+       pick_hit(t1.predict_winner, t2.result) AS success
+from (
+    select fixture_id, predict_winner, confidence
+    from ai_eval where if_bet = 1 and confidence > 0.6
+) t1
+inner join (
+    select fixture_id, home_name, away_name, fixture_date, result
+    from fixtures
+) t2 on t1.fixture_id = t2.fixture_id
+where t2.fixture_date >= %s and t2.fixture_date < %s and t2.result is not null
+order by t1.confidence desc, t2.fixture_date asc
+"""
+
+AI_PICK_SQL = """
+select t1.fixture_id, t1.predict_winner, t1.confidence, t1.key_tag_evidence,
+       t2.fixture_date, t2.home_name, t2.away_name, t1.home_odd, t1.away_odd, t1.draw_odd
+from (
+    select fixture_id, predict_winner, confidence, key_tag_evidence, home_odd, away_odd, draw_odd
+    from ai_eval where if_bet = 1 and confidence > 0.6
+) t1
+inner join (
+    select fixture_id, fixture_date, home_name, away_name
+    from fixtures where fixture_date >= %s and fixture_date < %s
+) t2 on t1.fixture_id = t2.fixture_id
+order by t1.confidence desc, t2.fixture_date asc
+"""
+
 def _fmt_odd(x):
     try:
         if x is None:
@@ -27,7 +83,17 @@ def _fmt_odd(x):
     except Exception:
         return None
 
-def get_country_for_chat(body: dict) -> str:
+async def _lookup_country(cur, sql: str, key) -> str:
+    gen = _country_gen
+    await cur.execute(sql, (key[1],))
+    row = await cur.fetchone()
+    country = row[0] if row else None
+    # a change notified while we were reading must not be overwritten by the stale row
+    if gen == _country_gen:
+        _country_cache.set(key, country)
+    return country
+
+async def get_country_for_chat(body: dict) -> str:
     b = body or {}
     data = b.get("data") or b.get("payload") or b
     from .utils import extract_chatroom_id
@@ -37,112 +103,91 @@ def get_country_for_chat(body: dict) -> str:
         or data.get("sender_id")
         or (data.get("contact") or {}).get("id")
     )
-    with psycopg.connect(pg_dsn()) as conn:
-        with conn.cursor() as cur:
-            country = None
-            if chatroom_id is not None:
-                cur.execute("SELECT country FROM users WHERE chatroom_id = %s LIMIT 1", (str(chatroom_id),))
-                row = cur.fetchone()
-                country = row[0] if row else None
-            if (not country) and external_id is not None:
-                cur.execute("SELECT country FROM users WHERE external_id = %s LIMIT 1", (str(external_id),))
-                row = cur.fetchone()
-                country = row[0] if row else None
-            return country or None
+    lookups = []
+    if chatroom_id is not None:
+        lookups.append((COUNTRY_BY_CHATROOM_SQL, ("chatroom", str(chatroom_id))))
+    if external_id is not None:
+        lookups.append((COUNTRY_BY_EXTERNAL_ID_SQL, ("external", str(external_id))))
+    cached = []
+    for sql, key in lookups:
+        country = _country_cache.get(key, _MISSING)
+        if country is not _MISSING and country:
+            return country
+        cached.append(country)
+    if _MISSING not in cached:
+        return None
+    async with aconnection() as conn:
+        async with conn.cursor() as cur:
+            for (sql, key), country in zip(lookups, cached):
+                if country is _MISSING:
+                    country = await _lookup_country(cur, sql, key)
+                if country:
+                    return country
+            return None
 
-def is_prediction_success(predict_winner, result) -> bool:
+def remember_country(kind: str, key, country: str) -> None:
+    _country_cache.set((kind, str(key)), country)
+
+def country_cache_stats() -> dict:
+    return _country_cache.stats()
+
+def invalidate_country_cache(payload=None) -> None:
+    global _country_gen
+    _country_gen += 1
+    if not payload:
+        _country_cache.clear()
+        return
     try:
-        p = str(predict_winner).strip().lower()
-        r = str(result).strip().lower()
-        if not p or not r:
-            return False
-        return p == r
+        d = json.loads(payload) if isinstance(payload, str) else dict(payload)
     except Exception:
-        return False
+        _country_cache.clear()
+        return
+    if d.get("chatroom_id") is not None:
+        _country_cache.pop(("chatroom", str(d.get("chatroom_id"))))
+    if d.get("external_id") is not None:
+        _country_cache.pop(("external", str(d.get("external_id"))))
 
-def calc_accuracy(rows, start=None, end=None) -> float:
-    filtered = []
-    for row in rows:
-        dt = row.get("fixture_date")
-        if dt is None:
-            continue
-        try:
-            if getattr(dt, "tzinfo", None) is None:
-                dt = dt.replace(tzinfo=timezone.utc)
-            else:
-                dt = dt.astimezone(timezone.utc)
-        except Exception:
-            continue
-        if start and dt < start:
-            continue
-        if end and dt >= end:
-            continue
-        filtered.append(row)
-    total = len(filtered)
-    if total == 0:
+register_listener(USER_COUNTRY_CHANNEL, invalidate_country_cache)
+
+def accuracy_pct(hits, total) -> float:
+    try:
+        total = int(total or 0)
+        if total <= 0:
+            return 0.0
+        return round((int(hits or 0) / total) * 100, 1)
+    except Exception:
         return 0.0
-    success = sum(1 for r in filtered if is_prediction_success(r.get("predict_winner"), r.get("result")))
-    return round((success / total) * 100, 1)
 
-def ai_history_reply(body: dict) -> str:
-    country = get_country_for_chat(body)
-    offset = read_offset(country) if country else 0
+async def ai_history_reply(body: dict) -> str:
+    country = await get_country_for_chat(body)
     now_utc = datetime.now(timezone.utc)
-    local_now = now_utc + timedelta(hours=offset)
-    local_today = datetime(local_now.year, local_now.month, local_now.day, tzinfo=timezone.utc)
-    today_start_utc = local_today - timedelta(hours=offset)
-    yesterday_start = today_start_utc - timedelta(days=1)
-    yesterday_end = today_start_utc
+    w = day_windows(country, now_utc)
+    yesterday_start = w.yesterday_start
+    yesterday_end = w.today_start
     last7_start = now_utc - timedelta(days=7)
     last7_end = now_utc
-    rows = []
+    counts = None
+    recent = []
     try:
-        with psycopg.connect(pg_dsn()) as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    """
-                    select t1.fixture_id,
-                           t1.predict_winner,
-                           t2.result,
-                           t1.confidence,
-                           t2.fixture_date,
-                           t2.home_name,
-                           t2.away_name
-                    from (
-                        select fixture_id, predict_winner, confidence, key_tag_evidence
-                        from ai_eval where if_bet = 1 and confidence > 0.6
-                    ) t1
-                    inner join (
-                        select fixture_id, home_name, away_name, fixture_date, result
-                        from fixtures
-                    ) t2 on t1.fixture_id = t2.fixture_id
-                    where t2.result is not null
-                    order by t2.fixture_date desc
-                    """
+        async with aconnection() as conn:
+            async with conn.cursor() as cur:
+                counts = await accuracy_counts(
+                    cur,
+                    [(None, None), (last7_start, last7_end), (yesterday_start, yesterday_end)],
                 )
-                fetched = cur.fetchall() or []
-                rows = [
-                    {
-                        "fixture_id": r[0],
-                        "predict_winner": r[1],
-                        "result": r[2],
-                        "confidence": r[3],
-                        "fixture_date": r[4],
-                        "home_name": r[5],
-                        "away_name": r[6],
-                    }
-                    for r in fetched
-                ]
+                if counts and counts[0][1]:
+                    await cur.execute(RECENT_PICKS_SQL)
+                    recent = await cur.fetchall() or []
     except Exception:
         logger.exception("DB fetch ai_history error")
-    if not rows:
+    if not counts or not counts[0][1]:
         return "No AI history available, please try again later."
-    overall = calc_accuracy(rows)
-    acc_7d = calc_accuracy(rows, start=last7_start, end=last7_end)
-    acc_yesterday = calc_accuracy(rows, start=yesterday_start, end=yesterday_end)
+    overall = accuracy_pct(*counts[0])
+    acc_7d = accuracy_pct(*counts[1])
+    acc_yesterday = accuracy_pct(*counts[2])
     emojis = []
-    for r in rows[:10]:
-        emojis.append("✅" if is_prediction_success(r.get("predict_winner"), r.get("result")) else "❌")
+    for r in recent:
+        emojis.append("✅" if r[0] else "❌")
     emoji_line = "".join(emojis) if emojis else "No records"
     return (
         f"📊 AI Overall Accuracy: {overall:.1f}%\n\n"
@@ -151,161 +196,35 @@ def ai_history_reply(body: dict) -> str:
         f"🎯 Recent 10 Predictions:\n{emoji_line}"
     )
 
-def ai_yesterday_reply(body: dict) -> str:
-    country = get_country_for_chat(body)
-    offset = read_offset(country) if country else 0
-    now_utc = datetime.now(timezone.utc)
-    local_now = now_utc + timedelta(hours=offset)
-    local_today = datetime(local_now.year, local_now.month, local_now.day, tzinfo=timezone.utc)
-    today_start_utc = local_today - timedelta(hours=offset)
-    yesterday_start = today_start_utc - timedelta(days=1)
-    yesterday_end = today_start_utc
-    rows = []
-    acc = 0.0
-    logger.info(f"ai_yesterday_reply country={country} offset={offset} y_start={yesterday_start} y_end={yesterday_end}")
-    try:
-        with psycopg.connect(pg_dsn()) as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    """
-                    select t1.fixture_id,
-                           t1.predict_winner,
-                           t2.result,
-                           t1.confidence,
-                           t2.fixture_date,
-                           t2.home_name,
-                           t2.away_name,
-                           CASE WHEN t1.predict_winner IS NOT NULL AND t2.result IS NOT NULL AND LOWER(t1.predict_winner) = LOWER(t2.result) THEN 1 ELSE 0 END AS success
-                    from (
-                        select fixture_id, predict_winner, confidence, key_tag_evidence
-                        from ai_eval where if_bet = 1 and confidence > 0.6
-                    ) t1
-                    inner join (
-                        select fixture_id, home_name, away_name, fixture_date, result
-                        from fixtures
-                    ) t2 on t1.fixture_id = t2.fixture_id
-                    where t2.fixture_date >= %s and t2.fixture_date < %s
-                    order by t1.confidence desc, t2.fixture_date asc
-                    """,
-                    (yesterday_start, yesterday_end),
-                )
-                fetched = cur.fetchall() or []
-                rows = [
-                    {
-                        "fixture_id": r[0],
-                        "predict_winner": r[1],
-                        "result": r[2],
-                        "confidence": r[3],
-                        "fixture_date": r[4],
-                        "home_name": r[5],
-                        "away_name": r[6],
-                        "success": r[7],
-                    }
-                    for r in fetched
-                ]
-                logger.info(f"ai_yesterday_reply fetched_rows={len(rows)}")
-                cur.execute(
-                    """
-                    select COALESCE(ROUND(
-                               SUM(CASE WHEN t1.predict_winner IS NOT NULL AND t2.result IS NOT NULL AND LOWER(t1.predict_winner) = LOWER(t2.result) THEN 1 ELSE 0 END)::numeric
-                               / NULLIF(COUNT(1), 0) * 100, 1
-                           ), 0.0) AS acc
-                    from (
-                        select fixture_id, predict_winner, confidence, key_tag_evidence
-                        from ai_eval where if_bet = 1 and confidence > 0.6
-                    ) t1
-                    inner join (
-                        select fixture_id, home_name, away_name, fixture_date, result
-                        from fixtures
-                    ) t2 on t1.fixture_id = t2.fixture_id
-                    where t2.fixture_date >= %s and t2.fixture_date < %s
-                    """,
-                    (yesterday_start, yesterday_end),
-                )
-                row_acc = cur.fetchone()
-                acc = float(row_acc[0]) if row_acc and row_acc[0] is not None else 0.0
-                logger.info(f"ai_yesterday_reply acc={acc}")
-    except Exception:
-        logger.exception("DB fetch ai_yesterday error")
-    if not rows:
-        logger.warning(f"ai_yesterday_reply no rows for window start={yesterday_start} end={yesterday_end} offset={offset}")
-        return "No AI records for yesterday, please try again later."
-    lines = []
-    for i, r in enumerate(rows, 1):
-        ok = bool(r.get("success"))
-        emoji = "✅" if ok else "❌"
-        lines.append(f"{i}. {r.get('home_name')} vs {r.get('away_name')} {emoji}")
-    body_text = "\n".join(lines)
-    return f"📊 AI Yesterday Accuracy: {acc:.1f}%\n\n{body_text}"
+async def ai_yesterday_reply(body: dict) -> str:
+    country = await get_country_for_chat(body)
+    return await ai_yesterday_text_for_country(country)
 
-def ai_yesterday_text_for_country(country: str) -> str:
-    offset = read_offset(country) if country else 0
-    now_utc = datetime.now(timezone.utc)
-    local_now = now_utc + timedelta(hours=offset)
-    local_today = datetime(local_now.year, local_now.month, local_now.day, tzinfo=timezone.utc)
-    today_start_utc = local_today - timedelta(hours=offset)
-    yesterday_start = today_start_utc - timedelta(days=1)
-    yesterday_end = today_start_utc
+async def ai_yesterday_text_for_country(country: str) -> str:
+    w = day_windows(country)
+    yesterday_start = w.yesterday_start
+    yesterday_end = w.today_start
     rows = []
     acc = 0.0
-    logger.info(f"ai_yesterday_text_for_country country={country} offset={offset} y_start={yesterday_start} y_end={yesterday_end}")
+    logger.info(f"ai_yesterday_text_for_country country={country} local_date={w.local_date} y_start={yesterday_start} y_end={yesterday_end}")
     try:
-        with psycopg.connect(pg_dsn()) as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    """
-                    select t1.fixture_id,
-                           t1.predict_winner,
-                           t2.result,
-                           t1.confidence,
-                           t2.fixture_date,
-                           t2.home_name,
-                           t2.away_name,
-                           CASE WHEN t1.predict_winner IS NOT NULL AND t2.result IS NOT NULL AND LOWER(t1.predict_winner) = LOWER(t2.result) THEN 1 ELSE 0 END AS success
-                    from (
-                        select fixture_id, predict_winner, confidence, key_tag_evidence
-                        from ai_eval where if_bet = 1 and confidence > 0.6
-                    ) t1
-                    inner join (
-                        select fixture_id, home_name, away_name, fixture_date, result
-                        from fixtures
-                    ) t2 on t1.fixture_id = t2.fixture_id
-                    where t2.fixture_date >= %s and t2.fixture_date < %s
-                    order by t1.confidence desc, t2.fixture_date asc
-                    """,
-                    (yesterday_start, yesterday_end),
-                )
-                fetched = cur.fetchall() or []
+        async with aconnection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(YESTERDAY_PICKS_SQL, (yesterday_start, yesterday_end))
+                fetched = await cur.fetchall() or []
                 rows = [
-                    {"home_name": r[5], "away_name": r[6], "success": r[7]}
+                    {"home_name": r[0], "away_name": r[1], "success": r[2]}
                     for r in fetched
                 ]
                 logger.info(f"ai_yesterday_text_for_country fetched_rows={len(rows)}")
-                cur.execute(
-                    """
-                    select COALESCE(ROUND(
-                               SUM(CASE WHEN t1.predict_winner IS NOT NULL AND t2.result IS NOT NULL AND LOWER(t1.predict_winner) = LOWER(t2.result) THEN 1 ELSE 0 END)::numeric
-                               / NULLIF(COUNT(1), 0) * 100, 1
-                           ), 0.0) AS acc
-                    from (
-                        select fixture_id, predict_winner, confidence, key_tag_evidence
-                        from ai_eval where if_bet = 1 and confidence > 0.6
-                    ) t1
-                    inner join (
-                        select fixture_id, home_name, away_name, fixture_date, result
-                        from fixtures
-                    ) t2 on t1.fixture_id = t2.fixture_id
-                    where t2.fixture_date >= %s and t2.fixture_date < %s
-                    """,
-                    (yesterday_start, yesterday_end),
-                )
-                row_acc = cur.fetchone()
-                acc = float(row_acc[0]) if row_acc and row_acc[0] is not None else 0.0
-                logger.info(f"ai_yesterday_text_for_country acc={acc}")
+                if rows:
+                    counts = await accuracy_counts(cur, [(yesterday_start, yesterday_end)])
+                    acc = accuracy_pct(*counts[0])
+                    logger.info(f"ai_yesterday_text_for_country acc={acc}")
     except Exception:
-        logger.exception("DB fetch ai_yesterday country error")
+        logger.exception("DB fetch ai_yesterday error")
     if not rows:
-        logger.warning(f"ai_yesterday_text_for_country no rows for window start={yesterday_start} end={yesterday_end} offset={offset}")
+        logger.warning(f"ai_yesterday_text_for_country no rows for window start={yesterday_start} end={yesterday_end} country={country}")
         return "No AI records for yesterday, please try again later."
     lines = []
     for i, r in enumerate(rows, 1):
@@ -314,153 +233,50 @@ def ai_yesterday_text_for_country(country: str) -> str:
     body_text = "\n".join(lines)
     return f"📊 AI Yesterday Accuracy: {acc:.1f}%\n\n{body_text}"
 
-def ai_pick_reply(body: dict) -> str:
-    country = get_country_for_chat(body)
-    offset = read_offset(country) if country else 0
-    now_utc = datetime.now(timezone.utc)
-    local = now_utc + timedelta(hours=offset)
-    local_day = datetime(local.year, local.month, local.day, tzinfo=timezone.utc)
-    tomorrow_local_day = local_day + timedelta(days=1)
-    start_utc = now_utc
-    end_utc = tomorrow_local_day - timedelta(hours=offset) + timedelta(days=1)
-    logger.info(f"ai_pick_reply country={country} offset={offset} start_utc={start_utc} end_utc={end_utc}")
-    rows = []
-    with psycopg.connect(pg_dsn()) as conn:
-        with conn.cursor() as cur:
-            try:
-                cur.execute(
-                    """
-                    select t1.fixture_id, t1.predict_winner, t1.confidence, t1.key_tag_evidence,
-                           t2.fixture_date, t2.home_name, t2.away_name, t1.home_odd, t1.away_odd, t1.draw_odd
-                    from (
-                        select fixture_id, predict_winner, confidence, key_tag_evidence, home_odd, away_odd, draw_odd
-                        from ai_eval where if_bet = 1 and confidence > 0.6
-                    ) t1
-                    inner join (
-                        select fixture_id, fixture_date, home_name, away_name
-                        from fixtures where fixture_date >= %s and fixture_date < %s
-                    ) t2 on t1.fixture_id = t2.fixture_id
-                    order by t1.confidence desc, t2.fixture_date asc
-                    """,
-                    (start_utc, end_utc),
-                )
-                rows = cur.fetchall() or []
-            except psycopg.errors.UndefinedColumn:
-                logger.warning("ai_pick_reply odds columns missing, fallback without odds")
-                try:
-                    conn.rollback()
-                except Exception:
-                    pass
-                cur.execute(
-                    """
-                    select t1.fixture_id, t1.predict_winner, t1.confidence, t1.key_tag_evidence,
-                           t2.fixture_date, t2.home_name, t2.away_name
-                    from (
-                        select fixture_id, predict_winner, confidence, key_tag_evidence
-                        from ai_eval where if_bet = 1 and confidence > 0.6
-                    ) t1
-                    inner join (
-                        select fixture_id, fixture_date, home_name, away_name
-                        from fixtures where fixture_date >= %s and fixture_date < %s
-                    ) t2 on t1.fixture_id = t2.fixture_id
-                    order by t1.confidence desc, t2.fixture_date asc
-                    """,
-                    (start_utc, end_utc),
-                )
-                rows = cur.fetchall() or []
-    logger.info(f"ai_pick_reply fetched_rows={len(rows)}")
-    if not rows:
-        logger.warning(f"ai_pick_reply no rows for window start={start_utc} end={end_utc} offset={offset}")
-        return "No AI picks available, please try again later."
-    out = []
-    for i, r in enumerate(rows, 1):
-        fixture_id = r[0]
-        predict_winner = r[1]
-        confidence = r[2]
-        key_tag_evidence = r[3]
-        fixture_date = r[4]
-        home_name = r[5]
-        away_name = r[6]
-        home_odd = draw_odd = away_odd = None
-        if len(r) >= 10:
-            home_odd = r[7]
-            away_odd = r[8]
-            draw_odd = r[9]
-        when_local = fixture_date + timedelta(hours=offset) if fixture_date else None
-        when_str = when_local.strftime("%Y-%m-%d %H:%M") if when_local else ""
-        tags = format_tags(key_tag_evidence)
-        pw = str(predict_winner).strip().lower() if predict_winner is not None else ""
-        if pw in ("home", "主胜", "h"):
-            result_label = "Home Win"
-        elif pw in ("away", "客胜", "a"):
-            result_label = "Away Win"
-        else:
-            result_label = "Unknown"
-        try:
-            confidence_pct = f"{round(float(confidence) * 100)}%"
-        except Exception:
-            confidence_pct = str(confidence)
-        lines = [
-            f"⚽️ Match {i}: {home_name} vs {away_name}",
-            f"🕒 Kickoff: {when_str}",
-            f"🏆 Predicted Result: {result_label}",
-            f"🎯 Confidence: {confidence_pct}",
-            f"💡 Key Points: {tags}",
-        ]
-        h = _fmt_odd(home_odd)
-        d = _fmt_odd(draw_odd)
-        a = _fmt_odd(away_odd)
-        if h and d and a:
-            lines.append(f"💰 Odds: Home Win {h} - Draw {d} - Away Win {a}")
-        lines.append(f"🔗 More details: https://betaione.com/basketball/{fixture_id}")
-        out.append("\n".join(lines))
-    if not out:
-        return "No AI picks available, please try again later."
-    chunks = []
-    i = 0
-    n = len(out)
-    while i < n:
-        chunks.append("\n\n".join(out[i:i+8]))
-        i += 8
-    return chunks[0] if len(chunks) == 1 else chunks
+def ai_pick_cache_stats() -> dict:
+    return _pick_cache.stats()
+
+def invalidate_ai_pick_cache(payload=None) -> None:
+    global _pick_gen
+    _pick_gen += 1
+    _pick_cache.clear()
+
+register_listener(AI_PICK_CHANNEL, invalidate_ai_pick_cache)
+
+async def ai_pick_reply(body: dict) -> str:
+    country = await get_country_for_chat(body)
+    return await ai_pick_text_for_country(country)
 
-def ai_pick_text_for_country(country: str) -> str:
-    offset = read_offset(country) if country else 0
+async def ai_pick_text_for_country(country: str) -> str:
     now_utc = datetime.now(timezone.utc)
-    local = now_utc + timedelta(hours=offset)
-    local_day = datetime(local.year, local.month, local.day, tzinfo=timezone.utc)
-    tomorrow_local_day = local_day + timedelta(days=1)
-    start_utc = now_utc
-    end_utc = tomorrow_local_day - timedelta(hours=offset) + timedelta(days=1)
-    logger.info(f"ai_pick_text_for_country country={country} offset={offset} start_utc={start_utc} end_utc={end_utc}")
+    w = day_windows(country, now_utc)
+    bucket = ai_pick_cache_ttl_seconds()
+    key = (country, w.local_date, int(now_utc.timestamp()) // bucket)
+    chunks = _pick_cache.get(key)
+    if chunks is None:
+        gen = _pick_gen
+        # the bucket only names the cache entry; games that already tipped off stay out
+        chunks = await _render_ai_pick(country, now_utc, w.pick_end)
+        # a change notified while we were rendering must not be overwritten by the stale text
+        if gen == _pick_gen:
+            _pick_cache.set(key, chunks)
+    return chunks[0] if len(chunks) == 1 else list(chunks)
+
+async def _render_ai_pick(country: str, start_utc: datetime, end_utc: datetime):
+    logger.info(f"ai_pick_text_for_country country={country} start_utc={start_utc} end_utc={end_utc}")
     rows = []
-    with psycopg.connect(pg_dsn()) as conn:
-        with conn.cursor() as cur:
+    async with aconnection() as conn:
+        async with conn.cursor() as cur:
             try:
-                cur.execute(
-                    """
-                    select t1.fixture_id, t1.predict_winner, t1.confidence, t1.key_tag_evidence,
-                           t2.fixture_date, t2.home_name, t2.away_name, t1.home_odd, t1.away_odd, t1.draw_odd
-                    from (
-                        select fixture_id, predict_winner, confidence, key_tag_evidence, home_odd, away_odd, draw_odd
-                        from ai_eval where if_bet = 1 and confidence > 0.6
-                    ) t1
-                    inner join (
-                        select fixture_id, fixture_date, home_name, away_name
-                        from fixtures where fixture_date >= %s and fixture_date < %s
-                    ) t2 on t1.fixture_id = t2.fixture_id
-                    order by t1.confidence desc, t2.fixture_date asc
-                    """,
-                    (start_utc, end_utc),
-                )
-                rows = cur.fetchall() or []
+                await cur.execute(AI_PICK_SQL, (start_utc, end_utc))
+                rows = await cur.fetchall() or []
             except psycopg.errors.UndefinedColumn:
                 logger.warning("ai_pick_text_for_country odds columns missing, fallback without odds")
                 try:
-                    conn.rollback()
+                    await conn.rollback()
                 except Exception:
                     pass
-                cur.execute(
+                await cur.execute(
                     """
                     select t1.fixture_id, t1.predict_winner, t1.confidence, t1.key_tag_evidence,
                            t2.fixture_date, t2.home_name, t2.away_name
@@ -476,11 +292,11 @@ def ai_pick_text_for_country(country: str) -> str:
                     """,
                     (start_utc, end_utc),
                 )
-                rows = cur.fetchall() or []
+                rows = await cur.fetchall() or []
     logger.info(f"ai_pick_text_for_country fetched_rows={len(rows)}")
     if not rows:
-        logger.warning(f"ai_pick_text_for_country no rows for window start={start_utc} end={end_utc} offset={offset}")
-        return "No AI picks available, please try again later."
+        logger.warning(f"ai_pick_text_for_country no rows for window start={start_utc} end={end_utc} country={country}")
+        return ("No AI picks available, please try again later.",)
     out = []
     for i, r in enumerate(rows, 1):
         fixture_id = r[0]
@@ -492,8 +308,10 @@ def ai_pick_text_for_country(country: str) -> str:
         away_name = r[6]
         home_odd = draw_odd = away_odd = None
         if len(r) >= 10:
-            home_odd, draw_odd, away_odd = r[7], r[8], r[9]
-        when_local = fixture_date + timedelta(hours=offset) if fixture_date else None
+            home_odd = r[7]
+            away_odd = r[8]
+            draw_odd = r[9]
+        when_local = to_local(country, fixture_date) if fixture_date else None
         when_str = when_local.strftime("%Y-%m-%d %H:%M") if when_local else ""
         tags = format_tags(key_tag_evidence)
         pw = str(predict_winner).strip().lower() if predict_winner is not None else ""
@@ -522,11 +340,11 @@ def ai_pick_text_for_country(country: str) -> str:
         lines.append(f"🔗 More details: https://betaione.com/basketball/{fixture_id}")
         out.append("\n".join(lines))
     if not out:
-        return "No AI picks available, please try again later."
+        return ("No AI picks available, please try again later.",)
     chunks = []
     i = 0
     n = len(out)
     while i < n:
         chunks.append("\n\n".join(out[i:i+8]))
         i += 8
-    return chunks[0] if len(chunks) == 1 else chunks
+    return tuple(chunks)
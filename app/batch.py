@@ -0,0 +1,156 @@
+import time
+import asyncio
+import logging
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+OVERFLOW_DROP_OLDEST = "drop_oldest"
+OVERFLOW_DROP_NEWEST = "drop_newest"
+
+MAX_FLUSH_ATTEMPTS = 3
+DEAD_LETTER_MAX_CHARS = 500
+
+class BatchWriter:
+    """Buffers records in memory and hands them to `flush` in batches, every `batch_size` records or `interval` seconds.
+
+    Errors in `retryable` (the database being away) keep the batch at the front for the next round. Any other error
+    is retried `max_attempts` times, then the batch is written row by row and the rows that still fail are logged
+    and dropped, so one bad record cannot hold up the rest.
+    """
+
+    def __init__(self, name: str, flush, batch_size: int, interval: float, max_buffer: int, overflow: str = OVERFLOW_DROP_OLDEST,
+                 retryable: tuple = (), max_attempts: int = MAX_FLUSH_ATTEMPTS):
+        self.name = name
+        self.flush = flush
+        self.batch_size = max(1, int(batch_size))
+        self.interval = max(0.01, float(interval))
+        self.max_buffer = max(self.batch_size, int(max_buffer))
+        self.overflow = overflow if overflow in (OVERFLOW_DROP_OLDEST, OVERFLOW_DROP_NEWEST) else OVERFLOW_DROP_OLDEST
+        self.retryable = tuple(retryable)
+        self.max_attempts = max(1, int(max_attempts))
+        self._buf = deque()
+        self._attempts = 0
+        self._transient = False
+        self._full = None
+        self._task = None
+        self._stopping = False
+        self.stats = {"accepted": 0, "written": 0, "batches": 0, "dropped": 0, "flush_errors": 0, "split_batches": 0, "dead_lettered": 0, "last_batch": 0, "last_flush_ms": 0.0}
+
+    def add(self, record) -> bool:
+        if len(self._buf) >= self.max_buffer:
+            self.stats["dropped"] += 1
+            if self.overflow == OVERFLOW_DROP_NEWEST:
+                return False
+            self._buf.popleft()
+        self._buf.append(record)
+        self.stats["accepted"] += 1
+        if len(self._buf) >= self.batch_size and self._full is not None:
+            self._full.set()
+        return True
+
+    def _requeue(self, rows: list) -> None:
+        # keep the failed batch at the front so order survives a retry, within the buffer bound
+        room = self.max_buffer - len(self._buf)
+        if room < len(rows):
+            self.stats["dropped"] += len(rows) - max(room, 0)
+            rows = rows[:max(room, 0)]
+        self._buf.extendleft(reversed(rows))
+
+    async def flush_once(self) -> int:
+        if not self._buf:
+            return 0
+        rows = [self._buf.popleft() for _ in range(min(self.batch_size, len(self._buf)))]
+        t0 = time.perf_counter()
+        try:
+            await self.flush(rows)
+        except asyncio.CancelledError:
+            self._requeue(rows)
+            raise
+        except Exception as e:
+            self.stats["flush_errors"] += 1
+            self._transient = isinstance(e, self.retryable)
+            if not self._transient:
+                self._attempts += 1
+            logger.exception(f"{self.name} flush error rows={len(rows)} attempt={self._attempts}")
+            if self._transient or self._attempts < self.max_attempts:
+                self._requeue(rows)
+                return -1
+            return await self._flush_rows(rows)
+        self._attempts = 0
+        self._transient = False
+        self.stats["written"] += len(rows)
+        self.stats["batches"] += 1
+        self.stats["last_batch"] = len(rows)
+        self.stats["last_flush_ms"] = round((time.perf_counter() - t0) * 1000.0, 1)
+        return len(rows)
+
+    async def _flush_rows(self, rows: list) -> int:
+        # the batch keeps failing the same way: find the rows to blame and let the others through
+        self._attempts = 0
+        self.stats["split_batches"] += 1
+        written = 0
+        for i, row in enumerate(rows):
+            try:
+                await self.flush([row])
+            except asyncio.CancelledError:
+                self._requeue(rows[i:])
+                raise
+            except Exception as e:
+                if isinstance(e, self.retryable):
+                    self._transient = True
+                    self._requeue(rows[i:])
+                    return -1
+                self.stats["dead_lettered"] += 1
+                logger.error(f"{self.name} dead letter error={e!r} row={repr(row)[:DEAD_LETTER_MAX_CHARS]}")
+                continue
+            written += 1
+        self._transient = False
+        self.stats["written"] += written
+        self.stats["batches"] += 1
+        self.stats["last_batch"] = written
+        return len(rows)
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._full.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._full.clear()
+            while self._buf and not self._stopping:
+                n = await self.flush_once()
+                if n < 0 or n < self.batch_size:
+                    break
+
+    def start(self) -> None:
+        if self._task is not None:
+            return
+        self._stopping = False
+        self._full = asyncio.Event()
+        self._task = asyncio.create_task(self._run(), name=f"{self.name}-writer")
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        self._stopping = True
+        t = self._task
+        self._task = None
+        if t is not None:
+            self._full.set()
+            try:
+                await asyncio.wait_for(t, timeout=timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"{self.name} writer did not stop in time")
+            except Exception:
+                logger.exception(f"{self.name} writer stop error")
+        deadline = time.monotonic() + timeout
+        while self._buf and time.monotonic() < deadline:
+            # a bad batch still gets its attempts and split; only an unreachable database ends the drain early
+            if await self.flush_once() < 0 and self._transient:
+                break
+        if self._buf:
+            logger.error(f"{self.name} lost {len(self._buf)} buffered records at shutdown")
+            self.stats["dropped"] += len(self._buf)
+            self._buf.clear()
+
+    def snapshot(self) -> dict:
+        return {"buffered": len(self._buf), "max_buffer": self.max_buffer, "overflow": self.overflow, **self.stats}
@@ -0,0 +1,133 @@
+import time
+import asyncio
+import logging
+from .config import telegram_coalesce_quiet_seconds, telegram_coalesce_max_wait_seconds
+
+logger = logging.getLogger(__name__)
+
+class _ChatTurns:
+    def __init__(self):
+        # (body, token) in arrival order
+        self.pending = []
+        self.first_at = 0.0
+        self.last_at = 0.0
+        self.arrived = asyncio.Event()
+        self.task = None
+
+def merge_telegram_updates(bodies: list) -> dict:
+    if len(bodies) == 1:
+        return bodies[0]
+    last = bodies[-1]
+    msg = dict(last.get("message") or {})
+    texts = [str((b.get("message") or {}).get("text") or "").strip() for b in bodies]
+    msg["text"] = "\n".join(t for t in texts if t)
+    merged = dict(last)
+    merged["message"] = msg
+    merged["coalesced_message_ids"] = [(b.get("message") or {}).get("message_id") for b in bodies]
+    return merged
+
+class ChatCoalescer:
+    """Collects a chat's messages until it goes quiet, then runs them as one turn; one turn per chat at a time."""
+
+    def __init__(self, turn, merge=merge_telegram_updates, quiet: float = None, max_wait: float = None, on_done=None, on_failed=None):
+        self.turn = turn
+        self.on_done = on_done
+        self.on_failed = on_failed
+        self.merge = merge
+        self.quiet = quiet
+        self.max_wait = max_wait
+        self._chats = {}
+        self._flushing = False
+        self.stats = {"messages": 0, "turns": 0, "merged": 0, "max_batch": 0, "turn_errors": 0, "handed_back": 0, "callback_errors": 0, "last_wait_ms": 0.0}
+
+    def _quiet(self) -> float:
+        return telegram_coalesce_quiet_seconds() if self.quiet is None else self.quiet
+
+    def _max_wait(self) -> float:
+        return telegram_coalesce_max_wait_seconds() if self.max_wait is None else self.max_wait
+
+    def submit(self, key, body: dict, token=None) -> None:
+        now = time.monotonic()
+        st = self._chats.get(key)
+        if st is None:
+            st = _ChatTurns()
+            self._chats[key] = st
+        if not st.pending:
+            st.first_at = now
+        st.pending.append((body, token))
+        st.last_at = now
+        st.arrived.set()
+        self.stats["messages"] += 1
+        if st.task is None:
+            st.task = asyncio.create_task(self._run(key, st))
+
+    async def _settle(self, st: _ChatTurns) -> None:
+        while not self._flushing:
+            now = time.monotonic()
+            due = min(st.last_at + self._quiet(), st.first_at + self._max_wait())
+            if due <= now:
+                return
+            st.arrived.clear()
+            try:
+                await asyncio.wait_for(st.arrived.wait(), timeout=due - now)
+            except asyncio.TimeoutError:
+                return
+
+    async def _run(self, key, st: _ChatTurns) -> None:
+        try:
+            while st.pending:
+                await self._settle(st)
+                batch = [b for b, _ in st.pending]
+                tokens = [t for _, t in st.pending if t is not None]
+                st.pending = []
+                self.stats["turns"] += 1
+                self.stats["merged"] += len(batch) - 1
+                self.stats["max_batch"] = max(self.stats["max_batch"], len(batch))
+                self.stats["last_wait_ms"] = round((time.monotonic() - st.first_at) * 1000.0, 1)
+                try:
+                    # messages arriving while the turn runs queue up for the next one
+                    await self.turn(self.merge(batch))
+                except Exception as e:
+                    self.stats["turn_errors"] += 1
+                    logger.exception(f"Agent turn error chat={key} messages={len(batch)}")
+                    await self._hand_back(key, st, tokens, e)
+                    continue
+                await self._report(self.on_done, key, tokens)
+        finally:
+            st.task = None
+            if self._chats.get(key) is st and not st.pending:
+                del self._chats[key]
+
+    async def _hand_back(self, key, st: _ChatTurns, tokens: list, error) -> None:
+        if self.on_failed is None or not tokens:
+            return
+        # later messages of the chat go back with the failed ones, so the retry still runs them in order
+        tokens = tokens + [t for _, t in st.pending if t is not None]
+        st.pending = [(b, t) for b, t in st.pending if t is None]
+        self.stats["handed_back"] += len(tokens)
+        await self._report(self.on_failed, key, tokens, error)
+
+    async def _report(self, callback, key, tokens: list, *args) -> None:
+        if callback is None or not tokens:
+            return
+        try:
+            await callback(tokens, *args)
+        except Exception:
+            self.stats["callback_errors"] += 1
+            logger.exception(f"Agent turn callback error chat={key} tokens={tokens}")
+
+    async def drain(self, timeout: float = 10.0) -> None:
+        # stop debouncing so buffered messages go out now, then wait for the turns in flight
+        self._flushing = True
+        for st in self._chats.values():
+            st.arrived.set()
+        tasks = [st.task for st in self._chats.values() if st.task is not None]
+        if tasks:
+            await asyncio.wait(tasks, timeout=timeout)
+
+    def snapshot(self) -> dict:
+        return {
+            "active_chats": len(self._chats),
+            "buffered": sum(len(st.pending) for st in self._chats.values()),
+            **self.stats,
+        }
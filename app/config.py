@@ -1,5 +1,63 @@
 import os
+import re
 import json
+import asyncio
+import logging
+import threading
+from dataclasses import dataclass, field
+from datetime import timedelta, timezone
+from types import MappingProxyType
+from typing import Mapping
+from zoneinfo import ZoneInfo
+
+logger = logging.getLogger(__name__)
+
+_NUMERIC_ENV = (
+    ("THREAD_TTL_MINUTES_TELEGRAM", int),
+    ("THREAD_TTL_MINUTES_CHATWOOT", int),
+    ("THREAD_MAX_AGE_DAYS", int),
+    ("POSTGRES_POOL_MIN_SIZE", int),
+    ("POSTGRES_POOL_MAX_SIZE", int),
+    ("POSTGRES_POOL_MAX_IDLE_SECONDS", float),
+    ("POSTGRES_POOL_TIMEOUT_SECONDS", float),
+    ("TELEGRAM_GLOBAL_RATE", float),
+    ("TELEGRAM_CHAT_RATE", float),
+    ("TELEGRAM_CHAT_BURST", int),
+    ("TELEGRAM_SEND_CONCURRENCY", int),
+    ("TELEGRAM_SEND_MAX_RETRIES", int),
+    ("PUSH_CATCHUP_GRACE_MINUTES", int),
+    ("AI_PICK_CACHE_TTL_SECONDS", int),
+    ("AI_PICK_CACHE_MAX_ENTRIES", int),
+    ("COUNTRY_CACHE_MAX_ENTRIES", int),
+    ("COUNTRY_CACHE_TTL_SECONDS", int),
+    ("SETTINGS_RELOAD_INTERVAL_SECONDS", float),
+    ("INBOUND_WORKERS", int),
+    ("INBOUND_BATCH_SIZE", int),
+    ("INBOUND_MAX_ATTEMPTS", int),
+    ("INBOUND_LEASE_SECONDS", int),
+    ("INBOUND_TURN_LEASE_SECONDS", int),
+    ("INBOUND_POLL_SECONDS", float),
+    ("INBOUND_RETENTION_HOURS", int),
+    ("INBOUND_DEDUP_WINDOW", int),
+    ("TELEGRAM_STREAM_EDIT_INTERVAL_SECONDS", float),
+    ("AGENT_RETRY_ATTEMPTS", int),
+    ("AGENT_RETRY_BASE_SECONDS", float),
+    ("AGENT_RETRY_MAX_SECONDS", float),
+    ("AGENT_BREAKER_FAILURES", int),
+    ("AGENT_BREAKER_RESET_SECONDS", float),
+    ("THREAD_CACHE_MAX_ENTRIES", int),
+    ("THREAD_TOUCH_INTERVAL_SECONDS", int),
+    ("TELEGRAM_COALESCE_QUIET_SECONDS", float),
+    ("TELEGRAM_COALESCE_MAX_WAIT_SECONDS", float),
+    ("AGENT_MAX_CONCURRENCY", int),
+    ("AGENT_QUEUE_LIMIT", int),
+    ("AGENT_QUEUE_WAIT_SECONDS", float),
+    ("AGENT_SPARE_THREADS", int),
+    ("AGENT_SPARE_THREAD_MAX_AGE_SECONDS", int),
+    ("AGENT_LOG_BATCH_SIZE", int),
+    ("AGENT_LOG_FLUSH_MS", int),
+    ("AGENT_LOG_BUFFER", int),
+)
 
 def chatwoot_base_url() -> str:
     url = os.getenv("CHATWOOT_BASE_URL", "")
@@ -24,88 +82,193 @@ def telegram_support_group_url() -> str:
 def lark_webhook_url() -> str:
     return os.getenv("LARK_BOT_WEBHOOK_URL", "")
 
-def read_offset(country: str) -> int:
+@dataclass(frozen=True)
+class Settings:
+    zones: Mapping = field(default_factory=dict)
+    account_inbox_pairs: frozenset = frozenset()
+    agent_url: str = ""
+    agent_name: str = ""
+    mtimes: tuple = ()
+    problems: tuple = ()
+
+_settings = None
+_settings_lock = threading.Lock()
+
+def _base_dir() -> str:
+    return os.path.dirname(os.path.dirname(__file__))
+
+def _settings_files():
+    base = _base_dir()
+    return (os.path.join(base, "时差.json"), os.path.join(base, ".env"))
+
+def _mtimes() -> tuple:
+    out = []
+    for path in _settings_files():
+        try:
+            out.append(os.stat(path).st_mtime_ns)
+        except OSError:
+            out.append(None)
+    return tuple(out)
+
+def _read_text(path: str) -> str:
     try:
-        base = os.path.dirname(os.path.dirname(__file__))
-        path = os.path.join(base, "时差.json")
         with open(path, "r", encoding="utf-8") as f:
-            m = json.load(f)
-        v = m.get(country)
-        return int(v) if v is not None else 0
-    except Exception:
-        return 0
+            return f.read()
+    except FileNotFoundError:
+        return ""
 
-def allowed_account_inbox_pairs():
+def _parse_zone(v):
+    if isinstance(v, bool):
+        raise ValueError(v)
+    if isinstance(v, (int, float)):
+        return timezone(timedelta(hours=v))
+    name = str(v).strip()
+    try:
+        return timezone(timedelta(hours=float(name)))
+    except ValueError:
+        return ZoneInfo(name)
+
+def _load_zones(path: str, problems: list) -> dict:
+    zones = {}
     try:
-        s = os.getenv("accounts_id_list", "") or os.getenv("ACCOUNTS_ID_LIST", "")
-        pairs = set()
-        if s and s.strip():
+        content = _read_text(path)
+        m = json.loads(content) if content.strip() else {}
+        if not isinstance(m, dict):
+            problems.append(f"{os.path.basename(path)}: expected an object of country -> IANA zone")
+            return zones
+        for k, v in m.items():
             try:
-                data = json.loads(s)
+                zones[str(k)] = _parse_zone(v)
             except Exception:
-                data = None
-        else:
+                problems.append(f"{os.path.basename(path)}: invalid zone for {k}: {v!r}")
+    except Exception as e:
+        problems.append(f"{os.path.basename(path)}: {e}")
+    return zones
+
+def _load_account_inbox_pairs(dotenv: str, problems: list) -> frozenset:
+    s = os.getenv("accounts_id_list", "") or os.getenv("ACCOUNTS_ID_LIST", "")
+    data = None
+    if s and s.strip():
+        try:
+            data = json.loads(s)
+        except Exception:
+            data = None
+    if data is None and dotenv:
+        try:
+            m = re.search(r"accounts_id_list\s*=\s*\[(.*?)\]", dotenv, re.DOTALL)
+            if m:
+                data = json.loads("[" + m.group(1) + "]")
+        except Exception:
+            problems.append("accounts_id_list: not valid JSON")
             data = None
-        if data is None:
+    pairs = set()
+    if isinstance(data, list):
+        for item in data:
             try:
-                base = os.path.dirname(os.path.dirname(__file__))
-                path = os.path.join(base, ".env")
-                with open(path, "r", encoding="utf-8") as f:
-                    content = f.read()
-                import re
-                m = re.search(r"accounts_id_list\s*=\s*\[(.*?)\]", content, re.DOTALL)
-                if m:
-                    block = "[" + m.group(1) + "]"
-                    data = json.loads(block)
+                pairs.add((int(item.get("accounts_id")), int(item.get("inbox_id"))))
             except Exception:
-                data = None
-        if isinstance(data, list):
-            for item in data:
-                try:
-                    a = int(item.get("accounts_id"))
-                    i = int(item.get("inbox_id"))
-                    pairs.add((a, i))
-                except Exception:
-                    pass
-        return pairs
-    except Exception:
-        return set()
+                problems.append(f"accounts_id_list: invalid entry {item!r}")
+    return frozenset(pairs)
 
-def agent_url() -> str:
-    try:
-        s = os.getenv("agent_url", "") or os.getenv("AGENT_URL", "")
-        s = s.strip()
-        if s:
-            return s.rstrip("/")
-        base = os.path.dirname(os.path.dirname(__file__))
-        path = os.path.join(base, ".env")
-        with open(path, "r", encoding="utf-8") as f:
-            content = f.read()
-        import re
-        m = re.search(r"agent_url\s*=\s*([^\s]+)", content)
-        if m:
-            return str(m.group(1)).strip().rstrip("/")
-    except Exception:
-        pass
+def _load_agent_url(dotenv: str) -> str:
+    s = (os.getenv("agent_url", "") or os.getenv("AGENT_URL", "")).strip()
+    if s:
+        return s.rstrip("/")
+    m = re.search(r"agent_url\s*=\s*([^\s]+)", dotenv or "")
+    if m:
+        return str(m.group(1)).strip().rstrip("/")
     return ""
 
-def agent_name() -> str:
-    try:
-        s = os.getenv("agent", "") or os.getenv("AGENT", "")
-        if s and s.strip():
-            return s.strip()
-        base = os.path.dirname(os.path.dirname(__file__))
-        path = os.path.join(base, ".env")
-        with open(path, "r", encoding="utf-8") as f:
-            content = f.read()
-        import re
-        m = re.search(r"agent\s*=\s*([\w\-]+)", content)
-        if m:
-            return str(m.group(1)).strip()
-    except Exception:
-        pass
+def _load_agent_name(dotenv: str) -> str:
+    s = os.getenv("agent", "") or os.getenv("AGENT", "")
+    if s and s.strip():
+        return s.strip()
+    m = re.search(r"agent\s*=\s*([\w\-]+)", dotenv or "")
+    if m:
+        return str(m.group(1)).strip()
     return ""
 
+def load_settings() -> Settings:
+    tz_path, env_path = _settings_files()
+    mtimes = _mtimes()
+    problems = []
+    dotenv = ""
+    try:
+        dotenv = _read_text(env_path)
+    except Exception as e:
+        problems.append(f".env: {e}")
+    return Settings(
+        zones=MappingProxyType(_load_zones(tz_path, problems)),
+        account_inbox_pairs=_load_account_inbox_pairs(dotenv, problems),
+        agent_url=_load_agent_url(dotenv),
+        agent_name=_load_agent_name(dotenv),
+        mtimes=mtimes,
+        problems=tuple(problems),
+    )
+
+def settings() -> Settings:
+    s = _settings
+    if s is None:
+        reload_settings(force=True)
+        s = _settings
+    return s
+
+def reload_settings(force: bool = False) -> bool:
+    global _settings
+    with _settings_lock:
+        if not force and _settings is not None and _settings.mtimes == _mtimes():
+            return False
+        try:
+            new = load_settings()
+        except Exception:
+            logger.exception("Settings reload failed, keeping previous snapshot")
+            if _settings is None:
+                _settings = Settings()
+            return False
+        changed = _settings is not None and new.mtimes != _settings.mtimes
+        _settings = new
+    if changed or force:
+        logger.info(f"Settings loaded countries={len(new.zones)} inbox_pairs={len(new.account_inbox_pairs)} problems={len(new.problems)}")
+    return True
+
+async def run_settings_watcher() -> None:
+    while True:
+        try:
+            await asyncio.sleep(settings_reload_interval_seconds())
+            reload_settings()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Settings watcher error")
+
+def check_settings() -> list:
+    problems = list(settings().problems)
+    if not telegram_token():
+        problems.append("TELEGRAM_BOT_TOKEN is not set")
+    for name, kind in _NUMERIC_ENV:
+        v = os.getenv(name, "")
+        if v and str(v).strip():
+            try:
+                kind(str(v).strip())
+            except Exception:
+                problems.append(f"{name}: invalid {kind.__name__} {v!r}, using default")
+    return problems
+
+def country_zone(country: str):
+    return settings().zones.get(country) or timezone.utc
+
+def push_countries():
+    return list(settings().zones.keys())
+
+def allowed_account_inbox_pairs():
+    return set(settings().account_inbox_pairs)
+
+def agent_url() -> str:
+    return settings().agent_url
+
+def agent_name() -> str:
+    return settings().agent_name
+
 def agent_endpoint_path() -> str:
     try:
         p = os.getenv("agent_endpoint", "") or os.getenv("AGENT_ENDPOINT", "")
@@ -147,3 +310,444 @@ def thread_max_age_days() -> int:
     except Exception:
         pass
     return 7
+
+def thread_cache_max_entries() -> int:
+    try:
+        v = os.getenv("THREAD_CACHE_MAX_ENTRIES", "")
+        if v and str(v).strip():
+            return max(1, int(str(v).strip()))
+    except Exception:
+        pass
+    return 10000
+
+def thread_touch_interval_seconds() -> int:
+    try:
+        v = os.getenv("THREAD_TOUCH_INTERVAL_SECONDS", "")
+        if v and str(v).strip():
+            return max(0, int(str(v).strip()))
+    except Exception:
+        pass
+    return 60
+
+def agent_spare_threads() -> int:
+    try:
+        v = os.getenv("AGENT_SPARE_THREADS", "")
+        if v and str(v).strip():
+            return max(0, int(str(v).strip()))
+    except Exception:
+        pass
+    return 2
+
+def agent_spare_thread_max_age_seconds() -> int:
+    try:
+        v = os.getenv("AGENT_SPARE_THREAD_MAX_AGE_SECONDS", "")
+        if v and str(v).strip():
+            return max(60, int(str(v).strip()))
+    except Exception:
+        pass
+    return 3600
+
+def pg_pool_min_size() -> int:
+    try:
+        v = os.getenv("POSTGRES_POOL_MIN_SIZE", "")
+        if v and str(v).strip():
+            return max(0, int(str(v).strip()))
+    except Exception:
+        pass
+    return 1
+
+def pg_pool_max_size() -> int:
+    try:
+        v = os.getenv("POSTGRES_POOL_MAX_SIZE", "")
+        if v and str(v).strip():
+            return max(1, int(str(v).strip()))
+    except Exception:
+        pass
+    return 10
+
+def pg_pool_max_idle_seconds() -> float:
+    try:
+        v = os.getenv("POSTGRES_POOL_MAX_IDLE_SECONDS", "")
+        if v and str(v).strip():
+            return float(str(v).strip())
+    except Exception:
+        pass
+    return 300.0
+
+def pg_pool_timeout_seconds() -> float:
+    try:
+        v = os.getenv("POSTGRES_POOL_TIMEOUT_SECONDS", "")
+        if v and str(v).strip():
+            return float(str(v).strip())
+    except Exception:
+        pass
+    return 10.0
+
+def _upstream_env(name: str, upstream: str = None) -> str:
+    keys = []
+    if upstream:
+        keys.append(f"HTTP_{str(upstream).upper()}_{name}")
+    keys.append(f"HTTP_{name}")
+    for k in keys:
+        v = os.getenv(k, "")
+        if v and str(v).strip():
+            return str(v).strip()
+    return ""
+
+def http_max_connections(upstream: str = None) -> int:
+    try:
+        v = _upstream_env("MAX_CONNECTIONS", upstream)
+        if v:
+            return max(1, int(v))
+    except Exception:
+        pass
+    return 50
+
+def http_max_keepalive_connections(upstream: str = None) -> int:
+    try:
+        v = _upstream_env("MAX_KEEPALIVE", upstream)
+        if v:
+            return max(0, int(v))
+    except Exception:
+        pass
+    return 20
+
+def http_keepalive_expiry_seconds(upstream: str = None) -> float:
+    try:
+        v = _upstream_env("KEEPALIVE_EXPIRY_SECONDS", upstream)
+        if v:
+            return float(v)
+    except Exception:
+        pass
+    return 60.0
+
+def http_timeout_seconds(upstream: str = None) -> float:
+    try:
+        v = _upstream_env("TIMEOUT_SECONDS", upstream)
+        if v:
+            return float(v)
+    except Exception:
+        pass
+    return 10.0
+
+def http_connect_timeout_seconds(upstream: str = None) -> float:
+    try:
+        v = _upstream_env("CONNECT_TIMEOUT_SECONDS", upstream)
+        if v:
+            return float(v)
+    except Exception:
+        pass
+    return 5.0
+
+def http2_enabled(upstream: str = None) -> bool:
+    v = _upstream_env("HTTP2", upstream).lower()
+    return v in ("1", "true", "yes", "on")
+
+def telegram_global_rate() -> float:
+    try:
+        v = os.getenv("TELEGRAM_GLOBAL_RATE", "")
+        if v and str(v).strip():
+            return max(0.1, float(str(v).strip()))
+    except Exception:
+        pass
+    return 30.0
+
+def telegram_chat_rate() -> float:
+    try:
+        v = os.getenv("TELEGRAM_CHAT_RATE", "")
+        if v and str(v).strip():
+            return max(0.01, float(str(v).strip()))
+    except Exception:
+        pass
+    return 1.0
+
+def telegram_chat_burst() -> int:
+    try:
+        v = os.getenv("TELEGRAM_CHAT_BURST", "")
+        if v and str(v).strip():
+            return max(1, int(str(v).strip()))
+    except Exception:
+        pass
+    return 3
+
+def telegram_send_concurrency() -> int:
+    try:
+        v = os.getenv("TELEGRAM_SEND_CONCURRENCY", "")
+        if v and str(v).strip():
+            return max(1, int(str(v).strip()))
+    except Exception:
+        pass
+    return 16
+
+def telegram_send_max_retries() -> int:
+    try:
+        v = os.getenv("TELEGRAM_SEND_MAX_RETRIES", "")
+        if v and str(v).strip():
+            return max(0, int(str(v).strip()))
+    except Exception:
+        pass
+    return 5
+
+def push_catchup_grace_minutes() -> int:
+    try:
+        v = os.getenv("PUSH_CATCHUP_GRACE_MINUTES", "")
+        if v and str(v).strip():
+            return max(0, int(str(v).strip()))
+    except Exception:
+        pass
+    return 30
+
+def ai_pick_cache_ttl_seconds() -> int:
+    try:
+        v = os.getenv("AI_PICK_CACHE_TTL_SECONDS", "")
+        if v and str(v).strip():
+            return max(1, int(str(v).strip()))
+    except Exception:
+        pass
+    return 300
+
+def ai_pick_cache_max_entries() -> int:
+    try:
+        v = os.getenv("AI_PICK_CACHE_MAX_ENTRIES", "")
+        if v and str(v).strip():
+            return max(1, int(str(v).strip()))
+    except Exception:
+        pass
+    return 64
+
+def country_cache_max_entries() -> int:
+    try:
+        v = os.getenv("COUNTRY_CACHE_MAX_ENTRIES", "")
+        if v and str(v).strip():
+            return max(1, int(str(v).strip()))
+    except Exception:
+        pass
+    return 10000
+
+def country_cache_ttl_seconds() -> int:
+    try:
+        v = os.getenv("COUNTRY_CACHE_TTL_SECONDS", "")
+        if v and str(v).strip():
+            return max(1, int(str(v).strip()))
+    except Exception:
+        pass
+    return 3600
+
+def settings_reload_interval_seconds() -> float:
+    try:
+        v = os.getenv("SETTINGS_RELOAD_INTERVAL_SECONDS", "")
+        if v and str(v).strip():
+            return max(0.5, float(str(v).strip()))
+    except Exception:
+        pass
+    return 5.0
+
+def inbound_workers() -> int:
+    try:
+        v = os.getenv("INBOUND_WORKERS", "")
+        if v and str(v).strip():
+            return max(1, int(str(v).strip()))
+    except Exception:
+        pass
+    return 4
+
+def inbound_batch_size() -> int:
+    try:
+        v = os.getenv("INBOUND_BATCH_SIZE", "")
+        if v and str(v).strip():
+            return max(1, int(str(v).strip()))
+    except Exception:
+        pass
+    return 16
+
+def inbound_max_attempts() -> int:
+    try:
+        v = os.getenv("INBOUND_MAX_ATTEMPTS", "")
+        if v and str(v).strip():
+            return max(1, int(str(v).strip()))
+    except Exception:
+        pass
+    return 5
+
+def inbound_lease_seconds() -> int:
+    try:
+        v = os.getenv("INBOUND_LEASE_SECONDS", "")
+        if v and str(v).strip():
+            return max(5, int(str(v).strip()))
+    except Exception:
+        pass
+    return 120
+
+def inbound_turn_lease_seconds() -> int:
+    try:
+        v = os.getenv("INBOUND_TURN_LEASE_SECONDS", "")
+        if v and str(v).strip():
+            return max(30, int(str(v).strip()))
+    except Exception:
+        pass
+    return 900
+
+def inbound_poll_seconds() -> float:
+    try:
+        v = os.getenv("INBOUND_POLL_SECONDS", "")
+        if v and str(v).strip():
+            return max(0.1, float(str(v).strip()))
+    except Exception:
+        pass
+    return 2.0
+
+def inbound_retention_hours() -> int:
+    try:
+        v = os.getenv("INBOUND_RETENTION_HOURS", "")
+        if v and str(v).strip():
+            return max(1, int(str(v).strip()))
+    except Exception:
+        pass
+    return 24
+
+def inbound_dedup_window() -> int:
+    try:
+        v = os.getenv("INBOUND_DEDUP_WINDOW", "")
+        if v and str(v).strip():
+            return max(1, int(str(v).strip()))
+    except Exception:
+        pass
+    return 10000
+
+def telegram_stream_replies() -> bool:
+    v = os.getenv("TELEGRAM_STREAM_REPLIES", "1").strip().lower()
+    return v in ("1", "true", "yes", "on")
+
+def telegram_stream_edit_interval_seconds() -> float:
+    try:
+        v = os.getenv("TELEGRAM_STREAM_EDIT_INTERVAL_SECONDS", "")
+        if v and str(v).strip():
+            return max(0.3, float(str(v).strip()))
+    except Exception:
+        pass
+    return 1.0
+
+def telegram_coalesce_quiet_seconds() -> float:
+    try:
+        v = os.getenv("TELEGRAM_COALESCE_QUIET_SECONDS", "")
+        if v and str(v).strip():
+            return max(0.0, float(str(v).strip()))
+    except Exception:
+        pass
+    return 1.5
+
+def telegram_coalesce_max_wait_seconds() -> float:
+    try:
+        v = os.getenv("TELEGRAM_COALESCE_MAX_WAIT_SECONDS", "")
+        if v and str(v).strip():
+            return max(0.0, float(str(v).strip()))
+    except Exception:
+        pass
+    return 5.0
+
+def agent_retry_attempts() -> int:
+    try:
+        v = os.getenv("AGENT_RETRY_ATTEMPTS", "")
+        if v and str(v).strip():
+            return max(0, int(str(v).strip()))
+    except Exception:
+        pass
+    return 2
+
+def agent_retry_base_seconds() -> float:
+    try:
+        v = os.getenv("AGENT_RETRY_BASE_SECONDS", "")
+        if v and str(v).strip():
+            return max(0.0, float(str(v).strip()))
+    except Exception:
+        pass
+    return 0.5
+
+def agent_retry_max_seconds() -> float:
+    try:
+        v = os.getenv("AGENT_RETRY_MAX_SECONDS", "")
+        if v and str(v).strip():
+            return max(0.0, float(str(v).strip()))
+    except Exception:
+        pass
+    return 4.0
+
+def agent_breaker_failures() -> int:
+    try:
+        v = os.getenv("AGENT_BREAKER_FAILURES", "")
+        if v and str(v).strip():
+            return max(1, int(str(v).strip()))
+    except Exception:
+        pass
+    return 5
+
+def agent_breaker_reset_seconds() -> float:
+    try:
+        v = os.getenv("AGENT_BREAKER_RESET_SECONDS", "")
+        if v and str(v).strip():
+            return max(1.0, float(str(v).strip()))
+    except Exception:
+        pass
+    return 30.0
+
+def agent_max_concurrency() -> int:
+    try:
+        v = os.getenv("AGENT_MAX_CONCURRENCY", "")
+        if v and str(v).strip():
+            return max(1, int(str(v).strip()))
+    except Exception:
+        pass
+    return 16
+
+def agent_queue_limit() -> int:
+    try:
+        v = os.getenv("AGENT_QUEUE_LIMIT", "")
+        if v and str(v).strip():
+            return max(0, int(str(v).strip()))
+    except Exception:
+        pass
+    return 32
+
+def agent_queue_wait_seconds() -> float:
+    try:
+        v = os.getenv("AGENT_QUEUE_WAIT_SECONDS", "")
+        if v and str(v).strip():
+            return max(0.0, float(str(v).strip()))
+    except Exception:
+        pass
+    return 15.0
+
+def agent_log_enabled() -> bool:
+    v = os.getenv("AGENT_MESSAGE_LOG", "1").strip().lower()
+    return v in ("1", "true", "yes", "on")
+
+def agent_log_batch_size() -> int:
+    try:
+        v = os.getenv("AGENT_LOG_BATCH_SIZE", "")
+        if v and str(v).strip():
+            return max(1, int(str(v).strip()))
+    except Exception:
+        pass
+    return 200
+
+def agent_log_flush_ms() -> int:
+    try:
+        v = os.getenv("AGENT_LOG_FLUSH_MS", "")
+        if v and str(v).strip():
+            return max(10, int(str(v).strip()))
+    except Exception:
+        pass
+    return 1000
+
+def agent_log_buffer() -> int:
+    try:
+        v = os.getenv("AGENT_LOG_BUFFER", "")
+        if v and str(v).strip():
+            return max(1, int(str(v).strip()))
+    except Exception:
+        pass
+    return 10000
+
+def agent_log_overflow() -> str:
+    v = os.getenv("AGENT_LOG_OVERFLOW", "drop_oldest").strip().lower()
+    return v if v in ("drop_oldest", "drop_newest") else "drop_oldest"
@@ -1,9 +1,16 @@
 import os
-import psycopg
+import threading
 import logging
+from contextlib import asynccontextmanager
+from psycopg_pool import ConnectionPool, AsyncConnectionPool
+from .config import pg_pool_min_size, pg_pool_max_size, pg_pool_max_idle_seconds, pg_pool_timeout_seconds
 
 logger = logging.getLogger(__name__)
 
+_pool = None
+_pool_lock = threading.Lock()
+_async_pool = None
+
 def pg_dsn() -> str:
     user = os.getenv("POSTGRES_USER", "postgres")
     password = os.getenv("POSTGRES_PASSWORD", "")
@@ -12,135 +19,562 @@ def pg_dsn() -> str:
     db = os.getenv("POSTGRES_DB", user or "postgres")
     return f"postgresql://{user}:{password}@{host}:{port}/{db}"
 
-def init_db() -> None:
-    try:
-        with psycopg.connect(pg_dsn()) as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    """
-                    CREATE TABLE IF NOT EXISTS users (
-                        id BIGSERIAL PRIMARY KEY,
-                        external_id TEXT UNIQUE,
-                        username TEXT,
-                        created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
-                        updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
-                    )
-                    """
-                )
-                cur.execute(
-                    """
-                    ALTER TABLE users
-                    ADD COLUMN IF NOT EXISTS chatroom_id TEXT
-                    """
-                )
-                cur.execute(
-                    """
-                    CREATE TABLE IF NOT EXISTS chat_messages (
-                        id BIGSERIAL PRIMARY KEY,
-                        chatroom_id TEXT,
-                        account_id BIGINT,
-                        conversation_id BIGINT,
-                        user_id BIGINT REFERENCES users(id) ON DELETE SET NULL,
-                        content TEXT,
-                        message_type TEXT,
-                        created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
-                    )
-                    """
-                )
-                cur.execute(
-                    """
-                    ALTER TABLE chat_messages
-                    ADD COLUMN IF NOT EXISTS message_id BIGINT,
-                    ADD COLUMN IF NOT EXISTS sender_id TEXT,
-                    ADD COLUMN IF NOT EXISTS contact_id TEXT,
-                    ADD COLUMN IF NOT EXISTS inbox_id BIGINT,
-                    ADD COLUMN IF NOT EXISTS source_id TEXT
-                    """
+def get_pool() -> ConnectionPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    pg_dsn(),
+                    min_size=pg_pool_min_size(),
+                    max_size=max(pg_pool_max_size(), pg_pool_min_size()),
+                    max_idle=pg_pool_max_idle_seconds(),
+                    timeout=pg_pool_timeout_seconds(),
+                    check=ConnectionPool.check_connection,
+                    name="pg",
+                    open=True,
                 )
-                cur.execute(
-                    """
-                    ALTER TABLE users
-                    ADD COLUMN IF NOT EXISTS country TEXT
-                    """
+    return _pool
+
+def connection():
+    return get_pool().connection()
+
+async def get_async_pool() -> AsyncConnectionPool:
+    global _async_pool
+    if _async_pool is None:
+        _async_pool = AsyncConnectionPool(
+            pg_dsn(),
+            min_size=pg_pool_min_size(),
+            max_size=max(pg_pool_max_size(), pg_pool_min_size()),
+            max_idle=pg_pool_max_idle_seconds(),
+            timeout=pg_pool_timeout_seconds(),
+            check=AsyncConnectionPool.check_connection,
+            name="pg-async",
+            open=False,
+        )
+    if _async_pool.closed:
+        await _async_pool.open()
+    return _async_pool
+
+@asynccontextmanager
+async def aconnection():
+    pool = await get_async_pool()
+    async with pool.connection() as conn:
+        yield conn
+
+async def open_async_pool() -> None:
+    try:
+        await get_async_pool()
+    except Exception:
+        logger.exception("DB async pool open error")
+
+async def close_async_pool() -> None:
+    global _async_pool
+    p = _async_pool
+    _async_pool = None
+    if p is not None:
+        try:
+            await p.close()
+        except Exception:
+            logger.exception("DB async pool close error")
+
+def pool_stats() -> dict:
+    out = {}
+    for key, p in (("sync", _pool), ("async", _async_pool)):
+        if p is None:
+            continue
+        try:
+            out[key] = dict(p.get_stats())
+        except Exception:
+            out[key] = {}
+    return out
+
+def close_pool() -> None:
+    global _pool
+    with _pool_lock:
+        p = _pool
+        _pool = None
+    if p is not None:
+        try:
+            p.close()
+        except Exception:
+            logger.exception("DB pool close error")
+
+MIGRATIONS = [
+    (
+        1,
+        "baseline schema",
+        [
+            """
+                CREATE TABLE IF NOT EXISTS users (
+                    id BIGSERIAL PRIMARY KEY,
+                    external_id TEXT UNIQUE,
+                    username TEXT,
+                    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+                    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
                 )
-                cur.execute(
-                    """
-                    CREATE TABLE IF NOT EXISTS ai_eval (
-                        id BIGSERIAL PRIMARY KEY,
-                        fixture_id BIGINT,
-                        predict_winner TEXT,
-                        confidence DOUBLE PRECISION,
-                        key_tag_evidence TEXT,
-                        if_bet SMALLINT,
-                        created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
-                        updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
-                    )
-                    """
+            """,
+            """
+                ALTER TABLE users
+                ADD COLUMN IF NOT EXISTS chatroom_id TEXT
+            """,
+            """
+                CREATE TABLE IF NOT EXISTS chat_messages (
+                    id BIGSERIAL PRIMARY KEY,
+                    chatroom_id TEXT,
+                    account_id BIGINT,
+                    conversation_id BIGINT,
+                    user_id BIGINT REFERENCES users(id) ON DELETE SET NULL,
+                    content TEXT,
+                    message_type TEXT,
+                    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
                 )
-                cur.execute(
-                    """
-                    ALTER TABLE ai_eval
-                    ADD COLUMN IF NOT EXISTS result TEXT
-                    """
+            """,
+            """
+                ALTER TABLE chat_messages
+                ADD COLUMN IF NOT EXISTS message_id BIGINT,
+                ADD COLUMN IF NOT EXISTS sender_id TEXT,
+                ADD COLUMN IF NOT EXISTS contact_id TEXT,
+                ADD COLUMN IF NOT EXISTS inbox_id BIGINT,
+                ADD COLUMN IF NOT EXISTS source_id TEXT
+            """,
+            """
+                ALTER TABLE users
+                ADD COLUMN IF NOT EXISTS country TEXT
+            """,
+            """
+                CREATE TABLE IF NOT EXISTS ai_eval (
+                    id BIGSERIAL PRIMARY KEY,
+                    fixture_id BIGINT,
+                    predict_winner TEXT,
+                    confidence DOUBLE PRECISION,
+                    key_tag_evidence TEXT,
+                    if_bet SMALLINT,
+                    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+                    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
                 )
-                cur.execute(
-                    """
-                    CREATE TABLE IF NOT EXISTS api_football_fixtures (
-                        id BIGSERIAL PRIMARY KEY,
-                        fixture_id BIGINT UNIQUE,
-                        fixture_date TIMESTAMPTZ,
-                        home_name TEXT,
-                        away_name TEXT
-                    )
-                    """
+            """,
+            """
+                ALTER TABLE ai_eval
+                ADD COLUMN IF NOT EXISTS result TEXT
+            """,
+            """
+                CREATE TABLE IF NOT EXISTS api_football_fixtures (
+                    id BIGSERIAL PRIMARY KEY,
+                    fixture_id BIGINT UNIQUE,
+                    fixture_date TIMESTAMPTZ,
+                    home_name TEXT,
+                    away_name TEXT
                 )
-                cur.execute(
-                    """
-                    CREATE TABLE IF NOT EXISTS push_log (
-                        id BIGSERIAL PRIMARY KEY,
-                        user_id BIGINT REFERENCES users(id) ON DELETE CASCADE,
-                        push_date DATE NOT NULL,
-                        push_type TEXT NOT NULL,
-                        created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
-                    )
-                    """
+            """,
+            """
+                CREATE TABLE IF NOT EXISTS push_log (
+                    id BIGSERIAL PRIMARY KEY,
+                    user_id BIGINT REFERENCES users(id) ON DELETE CASCADE,
+                    push_date DATE NOT NULL,
+                    push_type TEXT NOT NULL,
+                    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
                 )
-                cur.execute(
-                    """
-                    CREATE UNIQUE INDEX IF NOT EXISTS uniq_push_log ON push_log(user_id, push_date, push_type)
-                    """
+            """,
+            """
+                CREATE UNIQUE INDEX IF NOT EXISTS uniq_push_log ON push_log(user_id, push_date, push_type)
+            """,
+            """
+                CREATE TABLE IF NOT EXISTS agent_threads (
+                    id BIGSERIAL PRIMARY KEY,
+                    platform TEXT NOT NULL,
+                    chatroom_id TEXT NOT NULL,
+                    agent_thread_id TEXT NOT NULL,
+                    subject TEXT,
+                    started_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+                    last_activity_at TIMESTAMPTZ,
+                    expires_at TIMESTAMPTZ,
+                    status TEXT NOT NULL DEFAULT 'active',
+                    metadata JSONB
                 )
-                cur.execute(
-                    """
-                    CREATE TABLE IF NOT EXISTS agent_threads (
-                        id BIGSERIAL PRIMARY KEY,
-                        platform TEXT NOT NULL,
-                        chatroom_id TEXT NOT NULL,
-                        agent_thread_id TEXT NOT NULL,
-                        subject TEXT,
-                        started_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
-                        last_activity_at TIMESTAMPTZ,
-                        expires_at TIMESTAMPTZ,
-                        status TEXT NOT NULL DEFAULT 'active',
-                        metadata JSONB
-                    )
-                    """
+            """,
+            """
+                CREATE UNIQUE INDEX IF NOT EXISTS uniq_agent_thread_id ON agent_threads(agent_thread_id)
+            """,
+            """
+                CREATE INDEX IF NOT EXISTS idx_agent_threads_active ON agent_threads(platform, chatroom_id, status)
+            """,
+            """
+                CREATE INDEX IF NOT EXISTS idx_agent_threads_expires ON agent_threads(expires_at)
+            """,
+            """
+                CREATE OR REPLACE FUNCTION notify_ai_pick_changed() RETURNS trigger AS $$
+                BEGIN
+                    PERFORM pg_notify('ai_pick_changed', TG_TABLE_NAME);
+                    RETURN NULL;
+                END;
+                $$ LANGUAGE plpgsql
+            """,
+            """
+                CREATE TABLE IF NOT EXISTS daily_accuracy (
+                    day DATE NOT NULL,
+                    hour SMALLINT NOT NULL,
+                    threshold NUMERIC(4, 3) NOT NULL,
+                    picks INTEGER NOT NULL DEFAULT 0,
+                    hits INTEGER NOT NULL DEFAULT 0,
+                    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+                    PRIMARY KEY (day, hour, threshold)
                 )
-                cur.execute(
-                    """
-                    CREATE UNIQUE INDEX IF NOT EXISTS uniq_agent_thread_id ON agent_threads(agent_thread_id)
-                    """
+            """,
+            """
+                CREATE OR REPLACE FUNCTION refresh_daily_accuracy(ts TIMESTAMPTZ) RETURNS void AS $$
+                DECLARE
+                    b TIMESTAMP;
+                BEGIN
+                    IF ts IS NULL THEN
+                        RETURN;
+                    END IF;
+                    b := date_trunc('hour', ts AT TIME ZONE 'UTC');
+                    INSERT INTO daily_accuracy (day, hour, threshold, picks, hits)
+                    SELECT b::date, EXTRACT(HOUR FROM b)::smallint, th.threshold,
+                           COUNT(x.confidence),
+                           COUNT(x.confidence) FILTER (WHERE x.hit)
+                    FROM (
+                        SELECT 0.6::numeric AS threshold
+                        UNION
+                        SELECT DISTINCT threshold FROM daily_accuracy
+                    ) th
+                    LEFT JOIN (
+                        SELECT e.confidence,
+                               COALESCE(LOWER(TRIM(e.predict_winner)) = LOWER(TRIM(f.result)) AND TRIM(f.result) <> '', FALSE) AS hit
+                        FROM ai_eval e
+                        JOIN fixtures f ON f.fixture_id = e.fixture_id
+                        WHERE e.if_bet = 1 AND f.result IS NOT NULL
+                          AND f.fixture_date >= b AT TIME ZONE 'UTC'
+                          AND f.fixture_date < (b + INTERVAL '1 hour') AT TIME ZONE 'UTC'
+                    ) x ON x.confidence > th.threshold
+                    GROUP BY th.threshold
+                    ON CONFLICT (day, hour, threshold) DO UPDATE SET
+                        picks = EXCLUDED.picks,
+                        hits = EXCLUDED.hits,
+                        updated_at = NOW();
+                END;
+                $$ LANGUAGE plpgsql
+            """,
+            """
+                CREATE OR REPLACE FUNCTION fixtures_daily_accuracy() RETURNS trigger AS $$
+                BEGIN
+                    IF TG_OP <> 'INSERT' THEN
+                        PERFORM refresh_daily_accuracy(OLD.fixture_date);
+                    END IF;
+                    IF TG_OP = 'INSERT' THEN
+                        PERFORM refresh_daily_accuracy(NEW.fixture_date);
+                    ELSIF TG_OP = 'UPDATE' AND NEW.fixture_date IS DISTINCT FROM OLD.fixture_date THEN
+                        PERFORM refresh_daily_accuracy(NEW.fixture_date);
+                    END IF;
+                    RETURN NULL;
+                END;
+                $$ LANGUAGE plpgsql
+            """,
+            """
+                CREATE OR REPLACE FUNCTION ai_eval_daily_accuracy() RETURNS trigger AS $$
+                BEGIN
+                    IF TG_OP <> 'INSERT' THEN
+                        PERFORM refresh_daily_accuracy(f.fixture_date) FROM fixtures f WHERE f.fixture_id = OLD.fixture_id;
+                    END IF;
+                    IF TG_OP <> 'DELETE' THEN
+                        PERFORM refresh_daily_accuracy(f.fixture_date) FROM fixtures f WHERE f.fixture_id = NEW.fixture_id;
+                    END IF;
+                    RETURN NULL;
+                END;
+                $$ LANGUAGE plpgsql
+            """,
+        ],
+    ),
+    (
+        2,
+        "hot path indexes",
+        [
+            """
+                CREATE INDEX IF NOT EXISTS idx_users_chatroom_latest ON users(chatroom_id, updated_at DESC, id DESC)
+            """,
+            """
+                CREATE INDEX IF NOT EXISTS idx_ai_eval_fixture ON ai_eval(fixture_id)
+            """,
+            """
+                CREATE INDEX IF NOT EXISTS idx_ai_eval_pick ON ai_eval(fixture_id) INCLUDE (predict_winner, confidence)
+                WHERE if_bet = 1 AND confidence > 0.6
+            """,
+            """
+                CREATE INDEX IF NOT EXISTS idx_agent_threads_active_latest ON agent_threads(platform, chatroom_id, id DESC)
+                WHERE status = 'active'
+            """,
+        ],
+    ),
+    (
+        3,
+        "user country change notify",
+        [
+            """
+                CREATE OR REPLACE FUNCTION notify_user_country_changed() RETURNS trigger AS $$
+                BEGIN
+                    IF TG_OP = 'INSERT' AND NEW.country IS NULL THEN
+                        RETURN NULL;
+                    END IF;
+                    IF TG_OP = 'UPDATE'
+                        AND OLD.country IS NOT DISTINCT FROM NEW.country
+                        AND OLD.chatroom_id IS NOT DISTINCT FROM NEW.chatroom_id THEN
+                        RETURN NULL;
+                    END IF;
+                    IF TG_OP <> 'INSERT' THEN
+                        PERFORM pg_notify('user_country_changed', json_build_object('chatroom_id', OLD.chatroom_id, 'external_id', OLD.external_id)::text);
+                    END IF;
+                    IF TG_OP <> 'DELETE' THEN
+                        PERFORM pg_notify('user_country_changed', json_build_object('chatroom_id', NEW.chatroom_id, 'external_id', NEW.external_id)::text);
+                    END IF;
+                    RETURN NULL;
+                END;
+                $$ LANGUAGE plpgsql
+            """,
+            """
+                DROP TRIGGER IF EXISTS trg_users_country_notify ON users
+            """,
+            """
+                CREATE TRIGGER trg_users_country_notify AFTER INSERT OR UPDATE OR DELETE ON users
+                FOR EACH ROW EXECUTE FUNCTION notify_user_country_changed()
+            """,
+        ],
+    ),
+    (
+        4,
+        "inbound update queue",
+        [
+            """
+                CREATE TABLE IF NOT EXISTS inbound_updates (
+                    id BIGSERIAL PRIMARY KEY,
+                    platform TEXT NOT NULL DEFAULT 'telegram',
+                    update_id BIGINT,
+                    chat_key TEXT NOT NULL DEFAULT '',
+                    payload JSONB NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    available_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+                    locked_until TIMESTAMPTZ,
+                    received_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+                    processed_at TIMESTAMPTZ,
+                    last_error TEXT
                 )
-                cur.execute(
-                    """
-                    CREATE INDEX IF NOT EXISTS idx_agent_threads_active ON agent_threads(platform, chatroom_id, status)
-                    """
+            """,
+            """
+                CREATE INDEX IF NOT EXISTS idx_inbound_updates_open ON inbound_updates(chat_key, id)
+                WHERE status IN ('pending', 'processing')
+            """,
+            """
+                CREATE INDEX IF NOT EXISTS idx_inbound_updates_finished ON inbound_updates(processed_at)
+                WHERE status = 'done'
+            """,
+        ],
+    ),
+    (
+        5,
+        "inbound update dedup key",
+        [
+            """
+                DELETE FROM inbound_updates a
+                USING inbound_updates b
+                WHERE a.platform = b.platform AND a.update_id = b.update_id AND a.id > b.id
+            """,
+            """
+                CREATE UNIQUE INDEX IF NOT EXISTS uniq_inbound_updates_update_id ON inbound_updates(platform, update_id)
+                WHERE update_id IS NOT NULL
+            """,
+        ],
+    ),
+    (
+        6,
+        "agent message audit log",
+        [
+            """
+                CREATE TABLE IF NOT EXISTS agent_message_log (
+                    id BIGSERIAL PRIMARY KEY,
+                    platform TEXT NOT NULL,
+                    chatroom_id TEXT,
+                    agent_thread_id TEXT,
+                    role TEXT NOT NULL,
+                    text TEXT,
+                    message_id TEXT,
+                    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+                    attachments JSONB,
+                    agent_request_id TEXT,
+                    response_status TEXT,
+                    latency_ms INTEGER,
+                    tokens INTEGER,
+                    conversation_id BIGINT,
+                    account_id BIGINT,
+                    inbox_id BIGINT
                 )
-                cur.execute(
-                    """
-                    CREATE INDEX IF NOT EXISTS idx_agent_threads_expires ON agent_threads(expires_at)
-                    """
+            """,
+            """
+                CREATE INDEX IF NOT EXISTS idx_agent_message_log_chat ON agent_message_log(platform, chatroom_id, created_at)
+            """,
+            """
+                CREATE INDEX IF NOT EXISTS idx_agent_message_log_thread ON agent_message_log(agent_thread_id)
+            """,
+        ],
+    ),
+    (
+        7,
+        "inbound deferred agent turns",
+        [
+            """
+                CREATE INDEX IF NOT EXISTS idx_inbound_updates_deferred ON inbound_updates(locked_until)
+                WHERE status = 'deferred'
+            """,
+        ],
+    ),
+    (
+        8,
+        "shared pick hit rule, serialized daily_accuracy refresh",
+        [
+            """
+                CREATE OR REPLACE FUNCTION pick_hit(predict_winner TEXT, result TEXT) RETURNS boolean AS $$
+                    SELECT COALESCE(LOWER(TRIM(predict_winner)) = LOWER(TRIM(result)) AND TRIM(result) <> '', FALSE)
+                $$ LANGUAGE sql IMMUTABLE
+            """,
+            """
+                CREATE OR REPLACE FUNCTION refresh_daily_accuracy(ts TIMESTAMPTZ) RETURNS void AS $$
+                DECLARE
+                    b TIMESTAMP;
+                BEGIN
+                    IF ts IS NULL THEN
+                        RETURN;
+                    END IF;
+                    b := date_trunc('hour', ts AT TIME ZONE 'UTC');
+                    -- one writer per bucket; the recount below then starts after the previous writer committed
+                    PERFORM pg_advisory_xact_lock(hashtext('daily_accuracy:' || b::text));
+                    INSERT INTO daily_accuracy (day, hour, threshold, picks, hits)
+                    SELECT b::date, EXTRACT(HOUR FROM b)::smallint, th.threshold,
+                           COUNT(x.confidence),
+                           COUNT(x.confidence) FILTER (WHERE x.hit)
+                    FROM (
+                        SELECT 0.6::numeric AS threshold
+                        UNION
+                        SELECT DISTINCT threshold FROM daily_accuracy
+                    ) th
+                    LEFT JOIN (
+                        SELECT e.confidence, pick_hit(e.predict_winner, f.result) AS hit
+                        FROM ai_eval e
+                        JOIN fixtures f ON f.fixture_id = e.fixture_id
+                        WHERE e.if_bet = 1 AND f.result IS NOT NULL
+                          AND f.fixture_date >= b AT TIME ZONE 'UTC'
+                          AND f.fixture_date < (b + INTERVAL '1 hour') AT TIME ZONE 'UTC'
+                    ) x ON x.confidence > th.threshold
+                    GROUP BY th.threshold
+                    ON CONFLICT (day, hour, threshold) DO UPDATE SET
+                        picks = EXCLUDED.picks,
+                        hits = EXCLUDED.hits,
+                        updated_at = NOW();
+                END;
+                $$ LANGUAGE plpgsql
+            """,
+        ],
+    ),
+]
+
+# objects on tables the ETL owns; fixtures may appear after our first boot, so these run at every start
+FIXTURES_DDL = [
+    """
+        DROP TRIGGER IF EXISTS trg_ai_eval_ai_pick_notify ON ai_eval
+    """,
+    """
+        CREATE TRIGGER trg_ai_eval_ai_pick_notify AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON ai_eval
+        FOR EACH STATEMENT EXECUTE FUNCTION notify_ai_pick_changed()
+    """,
+    """
+        DROP TRIGGER IF EXISTS trg_fixtures_ai_pick_notify ON fixtures
+    """,
+    """
+        CREATE TRIGGER trg_fixtures_ai_pick_notify AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON fixtures
+        FOR EACH STATEMENT EXECUTE FUNCTION notify_ai_pick_changed()
+    """,
+    """
+        DROP TRIGGER IF EXISTS trg_fixtures_daily_accuracy ON fixtures
+    """,
+    """
+        CREATE TRIGGER trg_fixtures_daily_accuracy
+            AFTER INSERT OR DELETE OR UPDATE OF result, fixture_date ON fixtures
+            FOR EACH ROW EXECUTE FUNCTION fixtures_daily_accuracy()
+    """,
+    """
+        DROP TRIGGER IF EXISTS trg_ai_eval_daily_accuracy ON ai_eval
+    """,
+    """
+        CREATE TRIGGER trg_ai_eval_daily_accuracy
+            AFTER INSERT OR DELETE OR UPDATE OF fixture_id, if_bet, confidence, predict_winner ON ai_eval
+            FOR EACH ROW EXECUTE FUNCTION ai_eval_daily_accuracy()
+    """,
+    """
+        CREATE INDEX IF NOT EXISTS idx_fixtures_fixture_id ON fixtures(fixture_id)
+    """,
+    """
+        CREATE INDEX IF NOT EXISTS idx_fixtures_fixture_date ON fixtures(fixture_date)
+    """,
+]
+
+def migrate() -> int:
+    applied = 0
+    with connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                CREATE TABLE IF NOT EXISTS schema_version (
+                    version INTEGER PRIMARY KEY,
+                    description TEXT,
+                    applied_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
                 )
+                """
+            )
+            conn.commit()
+            cur.execute("SELECT pg_advisory_lock(hashtext('schema_version'))")
+            try:
+                cur.execute("SELECT version FROM schema_version")
+                done = {r[0] for r in cur.fetchall() or []}
                 conn.commit()
+                for version, description, statements in sorted(MIGRATIONS, key=lambda m: m[0]):
+                    if version in done:
+                        continue
+                    with conn.transaction():
+                        for stmt in statements:
+                            cur.execute(stmt)
+                        cur.execute(
+                            "INSERT INTO schema_version (version, description) VALUES (%s, %s)",
+                            (version, description),
+                        )
+                    logger.info(f"Applied migration {version}: {description}")
+                    applied += 1
+            finally:
+                try:
+                    conn.rollback()
+                    cur.execute("SELECT pg_advisory_unlock(hashtext('schema_version'))")
+                    conn.commit()
+                except Exception:
+                    logger.exception("Release migration lock error")
+    return applied
+
+def ensure_fixtures_objects() -> bool:
+    with connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT to_regclass('fixtures')")
+            row = cur.fetchone()
+            conn.commit()
+            if not row or row[0] is None:
+                logger.error("fixtures table missing: ai pick notify, daily_accuracy triggers and fixtures indexes not installed")
+                return False
+            with conn.transaction():
+                # same lock as migrate() so two starting instances do not race on the triggers
+                cur.execute("SELECT pg_advisory_xact_lock(hashtext('schema_version'))")
+                for stmt in FIXTURES_DDL:
+                    cur.execute(stmt)
+    return True
+
+def init_db() -> None:
+    try:
+        migrate()
+        ensure_fixtures_objects()
     except Exception:
         logger.exception("DB init error")
@@ -0,0 +1,110 @@
+import logging
+from .config import telegram_token, telegram_support_group_url
+from .utils import is_help_command, is_ai_pick_command, is_ai_history_command, is_ai_yesterday_command, is_start_command, normalize_country
+from .services import send_telegram_country_keyboard, answer_callback_query, set_user_country, send_telegram_message, forward_telegram_to_agent
+from .ai import ai_pick_reply, ai_history_reply, ai_yesterday_reply
+from .inbound import register_update_handler, complete_deferred, fail_deferred, DEFERRED
+from .coalesce import ChatCoalescer
+
+logger = logging.getLogger(__name__)
+
+WELCOME_TEXT = """Welcome to the NBA assistant.
+We provide AI NBA game picks and fundamentals analysis.
+Coverage highlights: NBA Regular Season and Playoffs.
+Please choose your country so we can show tip-off times in your local timezone.
+"""
+
+_agent_turns = ChatCoalescer(forward_telegram_to_agent, on_done=complete_deferred, on_failed=fail_deferred)
+
+def spawn_agent_turn(body: dict, qid=None) -> None:
+    # an agent turn can take a minute; run it beside the queue worker instead of holding the chat's slot,
+    # and fold quick follow-up lines from the same chat into that turn. The queue row `qid` stays leased
+    # until the turn finishes, so a restart mid-turn runs it again.
+    chat_id = ((body.get("message") or {}).get("chat") or {}).get("id")
+    _agent_turns.submit(chat_id, body, qid)
+
+async def drain_agent_turns(timeout: float = 10.0) -> None:
+    await _agent_turns.drain(timeout)
+
+def agent_turn_stats() -> dict:
+    return _agent_turns.snapshot()
+
+async def handle_telegram_update(body: dict, qid=None):
+    token = telegram_token()
+    msg = body.get("message") or {}
+    cb = body.get("callback_query") or {}
+    deferred = False
+    if msg:
+        text = msg.get("text") or ""
+        chat = msg.get("chat") or {}
+        chat_id = chat.get("id")
+        if is_start_command(text):
+            await send_telegram_message(chat_id, WELCOME_TEXT)
+            await send_telegram_country_keyboard(chat_id)
+        choice = normalize_country(text)
+        if choice:
+            await set_user_country(body, text)
+        if is_ai_pick_command(text) and chat_id is not None:
+            try:
+                hint = {"data": {"message": {"additional_attributes": {"chat_id": chat_id}}}}
+                reply = await ai_pick_reply(hint)
+                if isinstance(reply, list):
+                    for seg in reply:
+                        await send_telegram_message(chat_id, seg)
+                else:
+                    await send_telegram_message(chat_id, reply)
+            except Exception:
+                logger.exception("Telegram AI pick reply error")
+        if is_help_command(text) and chat_id is not None:
+            try:
+                url = telegram_support_group_url() or "url"
+                await send_telegram_message(chat_id, f"Our Telegram support group: {url}")
+            except Exception:
+                logger.exception("Telegram help reply error")
+        if is_ai_history_command(text) and chat_id is not None:
+            try:
+                hint = {"data": {"message": {"additional_attributes": {"chat_id": chat_id}}}}
+                reply = await ai_history_reply(hint)
+                await send_telegram_message(chat_id, reply)
+            except Exception:
+                logger.exception("Telegram AI history reply error")
+        if is_ai_yesterday_command(text) and chat_id is not None:
+            try:
+                hint = {"data": {"message": {"additional_attributes": {"chat_id": chat_id}}}}
+                reply = await ai_yesterday_reply(hint)
+                await send_telegram_message(chat_id, reply)
+            except Exception:
+                logger.exception("Telegram AI yesterday reply error")
+        t = str(text or "").strip()
+        if chat_id is not None and t and not (
+            is_start_command(text)
+            or is_help_command(text)
+            or is_ai_pick_command(text)
+            or is_ai_history_command(text)
+            or is_ai_yesterday_command(text)
+            or normalize_country(text)
+        ):
+            spawn_agent_turn(body, qid)
+            deferred = qid is not None
+    if cb:
+        data = cb.get("data") or ""
+        choice = normalize_country(data)
+        if choice:
+            await set_user_country(body, data)
+            await answer_callback_query(token, cb.get("id"), "Selection recorded")
+            m = cb.get("message") or {}
+            ch = m.get("chat") or {}
+            cid = ch.get("id")
+            if cid is not None:
+                ack = (
+                    ("Selected Philippines" if choice == "PH" else "Selected United States")
+                    + "\n\n"
+                    + "👇 You can send these commands:\n"
+                    + "🤖 /ai_pick - View today's AI picks\n"
+                    + "📊 /ai_history - View AI history\n"
+                    + "🗓 /ai_yesterday - View yesterday summary\n"
+                )
+                await send_telegram_message(cid, ack)
+    return DEFERRED if deferred else None
+
+register_update_handler("telegram", handle_telegram_update)
@@ -0,0 +1,105 @@
+import time
+import logging
+import httpx
+from contextlib import asynccontextmanager
+from .config import http_max_connections, http_max_keepalive_connections, http_keepalive_expiry_seconds, http_timeout_seconds, http_connect_timeout_seconds, http2_enabled
+
+logger = logging.getLogger(__name__)
+
+UPSTREAMS = ("telegram", "agent", "chatwoot", "lark")
+
+_clients = {}
+_stats = {}
+
+def _h2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except Exception:
+        return False
+
+def _new_client(upstream: str) -> httpx.AsyncClient:
+    http2 = http2_enabled(upstream)
+    if http2 and not _h2_available():
+        logger.warning(f"HTTP/2 requested for {upstream} but h2 is not installed, using HTTP/1.1")
+        http2 = False
+    limits = httpx.Limits(
+        max_connections=http_max_connections(upstream),
+        max_keepalive_connections=http_max_keepalive_connections(upstream),
+        keepalive_expiry=http_keepalive_expiry_seconds(upstream),
+    )
+    timeout = httpx.Timeout(http_timeout_seconds(upstream), connect=http_connect_timeout_seconds(upstream))
+    return httpx.AsyncClient(limits=limits, timeout=timeout, http2=http2)
+
+def get_client(upstream: str) -> httpx.AsyncClient:
+    c = _clients.get(upstream)
+    if c is None or c.is_closed:
+        c = _new_client(upstream)
+        _clients[upstream] = c
+    return c
+
+async def open_http_clients() -> None:
+    for u in UPSTREAMS:
+        get_client(u)
+
+async def close_http_clients() -> None:
+    clients = list(_clients.items())
+    _clients.clear()
+    for u, c in clients:
+        try:
+            await c.aclose()
+        except Exception:
+            logger.exception(f"HTTP client close error upstream={u}")
+
+def _record(upstream: str, started: float, status: int = None, error: bool = False) -> None:
+    s = _stats.get(upstream)
+    if s is None:
+        s = {"requests": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0, "status": {}}
+        _stats[upstream] = s
+    ms = (time.perf_counter() - started) * 1000.0
+    s["requests"] += 1
+    s["total_ms"] += ms
+    if ms > s["max_ms"]:
+        s["max_ms"] = ms
+    if error:
+        s["errors"] += 1
+    if status is not None:
+        k = f"{int(status) // 100}xx"
+        s["status"][k] = s["status"].get(k, 0) + 1
+
+async def request(upstream: str, method: str, url: str, **kwargs) -> httpx.Response:
+    started = time.perf_counter()
+    try:
+        resp = await get_client(upstream).request(method, url, **kwargs)
+    except Exception:
+        _record(upstream, started, error=True)
+        raise
+    _record(upstream, started, status=resp.status_code)
+    return resp
+
+@asynccontextmanager
+async def stream(upstream: str, method: str, url: str, **kwargs):
+    started = time.perf_counter()
+    recorded = False
+    try:
+        async with get_client(upstream).stream(method, url, **kwargs) as resp:
+            _record(upstream, started, status=resp.status_code)
+            recorded = True
+            yield resp
+    except httpx.HTTPError:
+        if not recorded:
+            _record(upstream, started, error=True)
+        raise
+
+def http_stats() -> dict:
+    out = {}
+    for u, s in _stats.items():
+        n = s["requests"] or 1
+        out[u] = {
+            "requests": s["requests"],
+            "errors": s["errors"],
+            "avg_ms": round(s["total_ms"] / n, 1),
+            "max_ms": round(s["max_ms"], 1),
+            "status": dict(s["status"]),
+        }
+    return out
@@ -0,0 +1,417 @@
+import json
+import time
+import random
+import asyncio
+import logging
+from collections import deque
+from psycopg.types.json import Jsonb
+from .db import aconnection
+from .config import inbound_workers, inbound_batch_size, inbound_max_attempts, inbound_lease_seconds, inbound_turn_lease_seconds, inbound_poll_seconds, inbound_retention_hours, inbound_dedup_window
+from .notify import register_listener
+
+logger = logging.getLogger(__name__)
+
+INBOUND_CHANNEL = "inbound_update"
+
+BACKOFF_BASE_SECONDS = 2.0
+BACKOFF_MAX_SECONDS = 300.0
+CLEANUP_INTERVAL_SECONDS = 600.0
+REDRIVE_INTERVAL_SECONDS = 60.0
+
+# returned by a handler that handed the update to work still running; the row stays leased until complete_deferred()
+DEFERRED = object()
+
+ENQUEUE_SQL = """
+WITH ins AS (
+    INSERT INTO inbound_updates (platform, update_id, chat_key, payload)
+    VALUES (%s, %s, %s, %s)
+    ON CONFLICT (platform, update_id) WHERE update_id IS NOT NULL DO NOTHING
+    RETURNING id
+)
+SELECT id, pg_notify('inbound_update', id::text) FROM ins
+"""
+
+# only the oldest open update of each chat is claimable, so a chat's updates run one at a time in order
+CLAIM_SQL = """
+WITH heads AS (
+    SELECT DISTINCT ON (chat_key) id, status, available_at, locked_until
+    FROM inbound_updates
+    WHERE status IN ('pending', 'processing')
+    ORDER BY chat_key, id
+), ready AS (
+    SELECT id FROM heads
+    WHERE (status = 'pending' AND available_at <= NOW())
+       OR (status = 'processing' AND locked_until < NOW())
+    ORDER BY id
+    LIMIT %s
+), locked AS (
+    SELECT q.id
+    FROM inbound_updates q
+    WHERE q.id IN (SELECT id FROM ready)
+      AND ((q.status = 'pending' AND q.available_at <= NOW())
+           OR (q.status = 'processing' AND q.locked_until < NOW()))
+    FOR UPDATE SKIP LOCKED
+)
+UPDATE inbound_updates u
+SET status = 'processing',
+    attempts = u.attempts + 1,
+    locked_until = NOW() + make_interval(secs => %s)
+FROM locked
+WHERE u.id = locked.id
+RETURNING u.id, u.platform, u.payload, u.attempts, u.received_at
+"""
+
+_handlers = {}
+_workers = []
+_wakeup = None
+_stopping = False
+_stats = {"enqueued": 0, "duplicates_suppressed": 0, "duplicates_suppressed_db": 0, "processed": 0, "retried": 0, "dead_lettered": 0, "released": 0, "deferred": 0, "completed_deferred": 0, "redriven": 0, "last_lag_ms": 0.0}
+
+class RecentIds:
+    def __init__(self, maxsize: int):
+        self.maxsize = max(1, int(maxsize))
+        self._order = deque()
+        self._seen = set()
+
+    def __contains__(self, key) -> bool:
+        return key in self._seen
+
+    def add(self, key) -> None:
+        if key in self._seen:
+            return
+        self._seen.add(key)
+        self._order.append(key)
+        while len(self._order) > self.maxsize:
+            self._seen.discard(self._order.popleft())
+
+    def __len__(self) -> int:
+        return len(self._seen)
+
+_recent = RecentIds(inbound_dedup_window())
+
+def register_update_handler(platform: str, handler) -> None:
+    _handlers[platform] = handler
+
+def _chat_key(update: dict) -> str:
+    u = update or {}
+    for k in ("message", "edited_message", "channel_post", "edited_channel_post"):
+        chat = (u.get(k) or {}).get("chat") or {}
+        if chat.get("id") is not None:
+            return str(chat.get("id"))
+    cb = u.get("callback_query") or {}
+    chat = ((cb.get("message") or {}).get("chat") or {})
+    if chat.get("id") is not None:
+        return str(chat.get("id"))
+    sender = (cb.get("from") or {})
+    if sender.get("id") is not None:
+        return str(sender.get("id"))
+    return ""
+
+async def enqueue_update(update: dict, platform: str = "telegram") -> int:
+    update_id = (update or {}).get("update_id")
+    if not isinstance(update_id, int):
+        update_id = None
+    key = (platform, update_id)
+    if update_id is not None and key in _recent:
+        _stats["duplicates_suppressed"] += 1
+        return None
+    async with aconnection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(ENQUEUE_SQL, (platform, update_id, _chat_key(update), Jsonb(update)))
+            row = await cur.fetchone()
+            await conn.commit()
+    if update_id is not None:
+        _recent.add(key)
+    if row is None:
+        # another worker (or an earlier life of this one) already queued it
+        _stats["duplicates_suppressed_db"] += 1
+        return None
+    _stats["enqueued"] += 1
+    _wake()
+    return row[0]
+
+def _wake(payload=None) -> None:
+    if _wakeup is not None:
+        _wakeup.set()
+
+register_listener(INBOUND_CHANNEL, _wake)
+
+def _backoff(attempts: int) -> float:
+    d = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * (2 ** max(0, attempts - 1)))
+    return d * (0.5 + random.random() / 2)
+
+async def _claim(limit: int):
+    async with aconnection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(CLAIM_SQL, (int(limit), int(inbound_lease_seconds())))
+            rows = await cur.fetchall() or []
+            await conn.commit()
+    return rows
+
+async def _finish(done_ids, failed, deferred_ids=()) -> None:
+    if not done_ids and not failed and not deferred_ids:
+        return
+    async with aconnection() as conn:
+        async with conn.cursor() as cur:
+            if done_ids:
+                await cur.execute(
+                    "UPDATE inbound_updates SET status = 'done', processed_at = NOW(), locked_until = NULL WHERE id = ANY(%s)",
+                    (list(done_ids),),
+                )
+            if deferred_ids:
+                # a turn that finished before we got here has already marked its rows done
+                await cur.execute(
+                    """
+                    UPDATE inbound_updates
+                    SET status = 'deferred', locked_until = NOW() + make_interval(secs => %s)
+                    WHERE id = ANY(%s) AND status = 'processing'
+                    """,
+                    (int(inbound_turn_lease_seconds()), list(deferred_ids)),
+                )
+            for qid, attempts, error in failed:
+                if attempts >= inbound_max_attempts():
+                    await cur.execute(
+                        "UPDATE inbound_updates SET status = 'dead', processed_at = NOW(), locked_until = NULL, last_error = %s WHERE id = %s",
+                        (error, qid),
+                    )
+                    _stats["dead_lettered"] += 1
+                    logger.error(f"Inbound update dead-lettered id={qid} attempts={attempts} error={error}")
+                else:
+                    await cur.execute(
+                        """
+                        UPDATE inbound_updates
+                        SET status = 'pending', locked_until = NULL, last_error = %s,
+                            available_at = NOW() + make_interval(secs => %s)
+                        WHERE id = %s
+                        """,
+                        (error, _backoff(attempts), qid),
+                    )
+                    _stats["retried"] += 1
+            await conn.commit()
+
+async def _release(ids) -> None:
+    if not ids:
+        return
+    try:
+        async with aconnection() as conn:
+            await conn.execute(
+                """
+                UPDATE inbound_updates
+                SET status = 'pending', attempts = GREATEST(attempts - 1, 0), locked_until = NULL
+                WHERE id = ANY(%s) AND status = 'processing'
+                """,
+                (list(ids),),
+            )
+            await conn.commit()
+        _stats["released"] += len(ids)
+    except Exception:
+        logger.exception("Inbound release error")
+
+async def complete_deferred(ids) -> None:
+    ids = [i for i in ids if i is not None]
+    if not ids:
+        return
+    async with aconnection() as conn:
+        await conn.execute(
+            """
+            UPDATE inbound_updates SET status = 'done', processed_at = NOW(), locked_until = NULL
+            WHERE id = ANY(%s) AND status IN ('processing', 'deferred')
+            """,
+            (ids,),
+        )
+        await conn.commit()
+    _stats["completed_deferred"] += len(ids)
+
+async def fail_deferred(ids, error=None) -> None:
+    # the turn failed: back on the queue after the usual short backoff, not after the whole turn lease;
+    # as the chat's oldest open update it holds that chat's later updates until it is done
+    ids = [i for i in ids if i is not None]
+    if not ids:
+        return
+    async with aconnection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                "SELECT id, attempts FROM inbound_updates WHERE id = ANY(%s) AND status IN ('processing', 'deferred')",
+                (ids,),
+            )
+            rows = await cur.fetchall() or []
+            await conn.commit()
+    text = f"{type(error).__name__}: {str(error)[:500]}" if error is not None else "agent turn failed"
+    await _finish([], [(qid, attempts, text) for qid, attempts in rows])
+
+async def _process(platform: str, payload, qid=None):
+    update = payload if isinstance(payload, dict) else json.loads(payload)
+    handler = _handlers.get(platform)
+    if handler is None:
+        raise RuntimeError(f"no inbound handler for {platform}")
+    return await handler(update, qid)
+
+async def _worker(n: int) -> None:
+    while not _stopping:
+        _wakeup.clear()
+        try:
+            rows = await _claim(inbound_batch_size())
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Inbound claim error")
+            rows = []
+            await asyncio.sleep(inbound_poll_seconds())
+        if not rows:
+            try:
+                await asyncio.wait_for(_wakeup.wait(), timeout=inbound_poll_seconds())
+            except asyncio.TimeoutError:
+                pass
+            continue
+        done_ids = []
+        deferred_ids = []
+        failed = []
+        pending = [r[0] for r in rows]
+        try:
+            for qid, platform, payload, attempts, received_at in rows:
+                if _stopping:
+                    break
+                pending.remove(qid)
+                try:
+                    if await _process(platform, payload, qid) is DEFERRED:
+                        deferred_ids.append(qid)
+                        _stats["deferred"] += 1
+                    else:
+                        done_ids.append(qid)
+                    _stats["processed"] += 1
+                    if received_at is not None:
+                        _stats["last_lag_ms"] = round((time.time() - received_at.timestamp()) * 1000.0, 1)
+                except asyncio.CancelledError:
+                    pending.append(qid)
+                    raise
+                except Exception as e:
+                    logger.exception(f"Inbound update error id={qid} attempts={attempts}")
+                    failed.append((qid, attempts, f"{type(e).__name__}: {str(e)[:500]}"))
+        finally:
+            try:
+                await asyncio.shield(_finish(done_ids, failed, deferred_ids))
+            except Exception:
+                logger.exception("Inbound finish error")
+            await asyncio.shield(_release(pending))
+
+async def _cleanup_forever() -> None:
+    while True:
+        try:
+            await asyncio.sleep(CLEANUP_INTERVAL_SECONDS)
+            async with aconnection() as conn:
+                await conn.execute(
+                    "DELETE FROM inbound_updates WHERE status = 'done' AND processed_at < NOW() - make_interval(hours => %s)",
+                    (int(inbound_retention_hours()),),
+                )
+                await conn.commit()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Inbound cleanup error")
+
+async def redrive_deferred() -> int:
+    # a turn that never reported back (crash, restart, drain timeout) goes back on the queue
+    async with aconnection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                """
+                UPDATE inbound_updates
+                SET status = 'dead', processed_at = NOW(), locked_until = NULL, last_error = 'agent turn lease expired'
+                WHERE status = 'deferred' AND locked_until < NOW() AND attempts >= %s
+                RETURNING id
+                """,
+                (int(inbound_max_attempts()),),
+            )
+            dead = await cur.fetchall() or []
+            await cur.execute(
+                """
+                UPDATE inbound_updates
+                SET status = 'pending', locked_until = NULL, available_at = NOW(), last_error = 'agent turn lease expired'
+                WHERE status = 'deferred' AND locked_until < NOW()
+                RETURNING id
+                """
+            )
+            rows = await cur.fetchall() or []
+            await conn.commit()
+    if dead:
+        _stats["dead_lettered"] += len(dead)
+        logger.error(f"Inbound deferred updates dead-lettered ids={[r[0] for r in dead]}")
+    if rows:
+        _stats["redriven"] += len(rows)
+        logger.warning(f"Inbound deferred updates redriven ids={[r[0] for r in rows]}")
+        _wake()
+    return len(rows)
+
+async def _redrive_forever() -> None:
+    while True:
+        try:
+            await asyncio.sleep(REDRIVE_INTERVAL_SECONDS)
+            await redrive_deferred()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Inbound redrive error")
+
+def start_inbound_workers() -> None:
+    global _wakeup, _stopping
+    if _workers:
+        return
+    _stopping = False
+    _wakeup = asyncio.Event()
+    for i in range(inbound_workers()):
+        _workers.append(asyncio.create_task(_worker(i), name=f"inbound-worker-{i}"))
+    _workers.append(asyncio.create_task(_cleanup_forever(), name="inbound-cleanup"))
+    _workers.append(asyncio.create_task(_redrive_forever(), name="inbound-redrive"))
+
+async def stop_inbound_workers(timeout: float = 10.0) -> None:
+    global _stopping
+    _stopping = True
+    if _wakeup is not None:
+        _wakeup.set()
+    tasks = list(_workers)
+    _workers.clear()
+    if not tasks:
+        return
+    for t in tasks:
+        # the housekeeping loops only sleep between rounds; nothing to finish there
+        if not t.get_name().startswith("inbound-worker"):
+            t.cancel()
+    done, still = await asyncio.wait(tasks, timeout=timeout)
+    for t in still:
+        t.cancel()
+    for t in tasks:
+        try:
+            await t
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            logger.exception("Inbound worker stop error")
+
+async def inbound_stats() -> dict:
+    out = {"workers": sum(1 for t in _workers if not t.done() and t.get_name().startswith("inbound-worker")), **_stats}
+    try:
+        async with aconnection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    """
+                    SELECT
+                        COUNT(*) FILTER (WHERE status = 'pending'),
+                        COUNT(*) FILTER (WHERE status = 'processing'),
+                        COUNT(*) FILTER (WHERE status = 'deferred'),
+                        COUNT(*) FILTER (WHERE status = 'dead'),
+                        EXTRACT(EPOCH FROM NOW() - MIN(received_at) FILTER (WHERE status IN ('pending', 'processing')))
+                    FROM inbound_updates
+                    WHERE status <> 'done'
+                    """
+                )
+                row = await cur.fetchone() or (0, 0, 0, 0, None)
+        out.update({
+            "pending": int(row[0] or 0),
+            "processing": int(row[1] or 0),
+            "deferred_open": int(row[2] or 0),
+            "dead": int(row[3] or 0),
+            "oldest_open_age_s": round(float(row[4]), 1) if row[4] is not None else 0.0,
+        })
+    except Exception:
+        logger.exception("Inbound stats error")
+    return out
@@ -0,0 +1,70 @@
+import json
+import logging
+import psycopg
+from datetime import datetime, timezone
+from .batch import BatchWriter
+from .config import agent_log_enabled, agent_log_batch_size, agent_log_flush_ms, agent_log_buffer, agent_log_overflow
+from .db import aconnection
+from .utils import to_int
+
+logger = logging.getLogger(__name__)
+
+LOG_COLUMNS = (
+    "platform", "chatroom_id", "agent_thread_id", "role", "text", "message_id", "created_at", "attachments",
+    "agent_request_id", "response_status", "latency_ms", "tokens", "conversation_id", "account_id", "inbox_id",
+)
+
+COPY_LOG_SQL = f"COPY agent_message_log ({', '.join(LOG_COLUMNS)}) FROM STDIN"
+
+async def _write_rows(rows: list) -> None:
+    async with aconnection() as conn:
+        async with conn.cursor() as cur:
+            async with cur.copy(COPY_LOG_SQL) as copy:
+                for row in rows:
+                    await copy.write_row(row)
+        await conn.commit()
+
+_writer = BatchWriter("agent_message_log", _write_rows, agent_log_batch_size(), agent_log_flush_ms() / 1000.0, agent_log_buffer(), agent_log_overflow(),
+                      retryable=(psycopg.OperationalError,))
+
+def _str(v):
+    return str(v) if v is not None else None
+
+def log_agent_message(platform: str, role: str, text: str = None, chatroom_id=None, thread_id=None, message_id=None,
+                      status: str = None, latency_ms=None, tokens=None, conversation_id=None, account_id=None,
+                      inbox_id=None, agent_request_id=None, attachments=None) -> bool:
+    if not agent_log_enabled():
+        return False
+    try:
+        row = (
+            str(platform or ""),
+            _str(chatroom_id),
+            _str(thread_id),
+            str(role or ""),
+            text,
+            _str(message_id),
+            # stamped now, not at flush time, so a batch keeps each message's real time
+            datetime.now(timezone.utc),
+            json.dumps(attachments) if attachments is not None else None,
+            _str(agent_request_id),
+            status,
+            to_int(latency_ms),
+            to_int(tokens),
+            to_int(conversation_id),
+            to_int(account_id),
+            to_int(inbox_id),
+        )
+    except Exception:
+        logger.exception("Agent message log record error")
+        return False
+    return _writer.add(row)
+
+def start_message_log() -> None:
+    if agent_log_enabled():
+        _writer.start()
+
+async def stop_message_log() -> None:
+    await _writer.stop()
+
+def message_log_stats() -> dict:
+    return _writer.snapshot()
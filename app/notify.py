@@ -0,0 +1,60 @@
+import asyncio
+import logging
+import psycopg
+from psycopg import sql
+from .db import pg_dsn
+
+logger = logging.getLogger(__name__)
+
+RECONNECT_MAX_SECONDS = 30.0
+
+_handlers = {}
+_task = None
+
+def register_listener(channel: str, handler) -> None:
+    _handlers.setdefault(channel, []).append(handler)
+
+def _dispatch(channel: str, payload) -> None:
+    for h in _handlers.get(channel, []):
+        try:
+            h(payload)
+        except Exception:
+            logger.exception(f"Notify handler error channel={channel}")
+
+async def _listen_forever() -> None:
+    delay = 1.0
+    while True:
+        try:
+            async with await psycopg.AsyncConnection.connect(pg_dsn(), autocommit=True) as conn:
+                for channel in list(_handlers.keys()):
+                    await conn.execute(sql.SQL("LISTEN {}").format(sql.Identifier(channel)))
+                delay = 1.0
+                # anything sent while we were not listening is lost, so let every handler resync
+                for channel in list(_handlers.keys()):
+                    _dispatch(channel, None)
+                async for n in conn.notifies():
+                    _dispatch(n.channel, n.payload)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Notify listener error, reconnecting")
+        await asyncio.sleep(delay)
+        delay = min(RECONNECT_MAX_SECONDS, delay * 2)
+
+def start_listener() -> None:
+    global _task
+    if _task is None or _task.done():
+        _task = asyncio.create_task(_listen_forever())
+
+async def stop_listener() -> None:
+    global _task
+    t = _task
+    _task = None
+    if t is not None:
+        t.cancel()
+        try:
+            await t
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            pass
@@ -0,0 +1,304 @@
+import time
+import heapq
+import random
+import asyncio
+import logging
+from collections import deque
+from .config import telegram_token, telegram_global_rate, telegram_chat_rate, telegram_chat_burst, telegram_send_concurrency, telegram_send_max_retries
+from .http_clients import request
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 1
+
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 30.0
+IDLE_BUCKET_SECONDS = 120.0
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = float(rate)
+        self.capacity = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def take(self, now: float = None) -> float:
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        if now < self.updated:
+            return self.updated - now
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return 0.0
+        return (1.0 - self.tokens) / self.rate
+
+    def pause(self, seconds: float, now: float = None) -> None:
+        now = time.monotonic() if now is None else now
+        self.tokens = 1.0
+        self.updated = max(self.updated, now + float(seconds))
+
+def _chat_scoped_limit(chat_id) -> bool:
+    # groups and channels (negative ids) carry their own per-chat limit; a 429 there says nothing about the rest
+    try:
+        return int(chat_id) < 0
+    except (TypeError, ValueError):
+        return False
+
+class _Item:
+    __slots__ = ("method", "payload", "priority", "future", "attempts", "enqueued_at")
+
+    def __init__(self, method: str, payload: dict, priority: int, future):
+        self.method = method
+        self.payload = payload
+        self.priority = priority
+        self.future = future
+        self.attempts = 0
+        self.enqueued_at = time.monotonic()
+
+class TelegramOutbox:
+    def __init__(self):
+        self._chats = {}
+        self._buckets = {}
+        self._lanes = (deque(), deque())
+        self._delayed = []
+        self._seq = 0
+        self._wakeup = None
+        self._sem = None
+        self._task = None
+        self._inflight = set()
+        self._busy = set()
+        self._global = None
+        self._sent_times = deque()
+        self._stats = {"enqueued": 0, "sent": 0, "failed": 0, "retried": 0, "rate_limited": 0, "dropped": 0}
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._wakeup = asyncio.Event()
+        self._sem = asyncio.Semaphore(telegram_send_concurrency())
+        self._global = TokenBucket(telegram_global_rate(), max(1.0, telegram_global_rate()))
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 5.0) -> None:
+        if not self.running:
+            return
+        deadline = time.monotonic() + float(timeout)
+        while self.depth() and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        if self._inflight:
+            await asyncio.wait(list(self._inflight), timeout=max(0.0, deadline - time.monotonic()))
+        for q in self._chats.values():
+            for item in q:
+                self._stats["dropped"] += 1
+                self._resolve(item, None)
+        self._chats.clear()
+        self._task = None
+
+    def depth(self) -> int:
+        return sum(len(q) for q in self._chats.values())
+
+    def enqueue(self, chat_id: int, method: str, payload: dict, priority: int = PRIORITY_INTERACTIVE):
+        if not self.running:
+            self.start()
+        fut = asyncio.get_running_loop().create_future()
+        item = _Item(method, payload, priority, fut)
+        q = self._chats.get(chat_id)
+        if q is None:
+            q = deque()
+            self._chats[chat_id] = q
+        q.append(item)
+        self._stats["enqueued"] += 1
+        if len(q) == 1 and chat_id not in self._busy:
+            self._lanes[self._lane(priority)].append(chat_id)
+            self._wakeup.set()
+        return fut
+
+    def _lane(self, priority: int) -> int:
+        return 0 if priority <= PRIORITY_INTERACTIVE else 1
+
+    def _bucket(self, chat_id: int) -> TokenBucket:
+        b = self._buckets.get(chat_id)
+        if b is None:
+            b = TokenBucket(telegram_chat_rate(), telegram_chat_burst())
+            self._buckets[chat_id] = b
+        return b
+
+    def _delay(self, chat_id: int, seconds: float) -> None:
+        self._seq += 1
+        heapq.heappush(self._delayed, (time.monotonic() + max(0.0, seconds), self._seq, chat_id))
+        self._wakeup.set()
+
+    def _promote_delayed(self, now: float) -> None:
+        while self._delayed and self._delayed[0][0] <= now:
+            _, _, chat_id = heapq.heappop(self._delayed)
+            q = self._chats.get(chat_id)
+            if q:
+                self._lanes[self._lane(q[0].priority)].append(chat_id)
+
+    def _next_chat(self):
+        for lane in self._lanes:
+            while lane:
+                chat_id = lane.popleft()
+                if self._chats.get(chat_id):
+                    return chat_id
+        return None
+
+    def _prune_buckets(self, now: float) -> None:
+        if len(self._buckets) <= 1024:
+            return
+        for chat_id in [c for c, b in self._buckets.items() if c not in self._chats and now - b.updated > IDLE_BUCKET_SECONDS]:
+            self._buckets.pop(chat_id, None)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                now = time.monotonic()
+                self._promote_delayed(now)
+                chat_id = self._next_chat()
+                if chat_id is None:
+                    self._wakeup.clear()
+                    timeout = (self._delayed[0][0] - now) if self._delayed else None
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                wait = self._bucket(chat_id).take(now)
+                if wait > 0:
+                    self._delay(chat_id, wait)
+                    continue
+                wait = self._global.take()
+                while wait > 0:
+                    await asyncio.sleep(wait)
+                    wait = self._global.take()
+                await self._sem.acquire()
+                self._busy.add(chat_id)
+                t = asyncio.create_task(self._send(chat_id))
+                self._inflight.add(t)
+                t.add_done_callback(self._inflight.discard)
+                self._prune_buckets(now)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Telegram outbox loop error")
+                await asyncio.sleep(0.5)
+
+    def _resolve(self, item: _Item, result) -> None:
+        if not item.future.done():
+            item.future.set_result(result)
+
+    def _backoff(self, attempts: int) -> float:
+        d = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * (2 ** max(0, attempts - 1)))
+        return d * (0.5 + random.random() / 2)
+
+    async def _send(self, chat_id: int) -> None:
+        q = self._chats.get(chat_id)
+        item = q[0]
+        retry_in = None
+        try:
+            token = telegram_token()
+            url = f"https://api.telegram.org/bot{token}/{item.method}"
+            try:
+                resp = await request("telegram", "POST", url, json=item.payload, timeout=10)
+                status = resp.status_code
+                try:
+                    data = resp.json()
+                except Exception:
+                    data = {}
+            except Exception as e:
+                status = None
+                data = {"description": str(e)}
+            if status is not None and status < 300:
+                q.popleft()
+                self._stats["sent"] += 1
+                self._sent_times.append(time.monotonic())
+                self._resolve(item, (data or {}).get("result"))
+            elif status == 429 or status is None or status >= 500:
+                item.attempts += 1
+                if item.attempts > telegram_send_max_retries():
+                    q.popleft()
+                    self._stats["failed"] += 1
+                    logger.error(f"Telegram {item.method} gave up chat={chat_id} attempts={item.attempts} status={status}")
+                    self._resolve(item, None)
+                else:
+                    self._stats["retried"] += 1
+                    if status == 429:
+                        self._stats["rate_limited"] += 1
+                        try:
+                            retry_in = float(((data or {}).get("parameters") or {}).get("retry_after") or 1)
+                        except Exception:
+                            retry_in = 1.0
+                        self._bucket(chat_id).pause(retry_in)
+                        if not _chat_scoped_limit(chat_id):
+                            # outside groups a 429 is the bot-wide limit; every chat has to back off
+                            self._global.pause(retry_in)
+                    else:
+                        retry_in = self._backoff(item.attempts)
+            else:
+                q.popleft()
+                self._stats["failed"] += 1
+                logger.error(f"Telegram {item.method} failed: {status} {str((data or {}).get('description'))[:200]}")
+                self._resolve(item, None)
+        except Exception:
+            logger.exception("Telegram outbox send error")
+            if q and q[0] is item:
+                q.popleft()
+            self._stats["failed"] += 1
+            self._resolve(item, None)
+        finally:
+            self._sem.release()
+            self._busy.discard(chat_id)
+            if q:
+                if retry_in is not None:
+                    self._delay(chat_id, retry_in)
+                else:
+                    self._lanes[self._lane(q[0].priority)].append(chat_id)
+                    self._wakeup.set()
+            else:
+                self._chats.pop(chat_id, None)
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        while self._sent_times and now - self._sent_times[0] > 60.0:
+            self._sent_times.popleft()
+        lanes = {"interactive": 0, "bulk": 0}
+        for q in self._chats.values():
+            for item in q:
+                lanes["interactive" if self._lane(item.priority) == 0 else "bulk"] += 1
+        return {
+            "queue_depth": sum(lanes.values()),
+            "queue_depth_by_lane": lanes,
+            "chats_pending": len(self._chats),
+            "in_flight": len(self._inflight),
+            "sent_per_second_1m": round(len(self._sent_times) / 60.0, 2),
+            **self._stats,
+        }
+
+outbox = TelegramOutbox()
+
+def start_outbox() -> None:
+    outbox.start()
+
+async def stop_outbox() -> None:
+    await outbox.stop()
+
+def enqueue_telegram(chat_id: int, method: str, payload: dict, priority: int = PRIORITY_INTERACTIVE):
+    return outbox.enqueue(chat_id, method, payload, priority)
+
+def outbox_stats() -> dict:
+    return outbox.stats()
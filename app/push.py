@@ -1,126 +1,162 @@
+import time
+import heapq
 import logging
-import psycopg
 import asyncio
 from datetime import datetime, timedelta, timezone
-from .db import pg_dsn
-from .config import read_offset, telegram_token
+from .db import aconnection
+from .config import push_countries, push_catchup_grace_minutes
+from .tz import day_windows, local_time_utc, to_local
 from .ai import ai_yesterday_text_for_country, ai_pick_text_for_country
 from .services import send_telegram_message
+from .outbox import PRIORITY_BULK
 
 logger = logging.getLogger(__name__)
 
-def _list_users_for_push():
-    try:
-        with psycopg.connect(pg_dsn()) as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    """
-                    SELECT DISTINCT ON (chatroom_id) id, chatroom_id, country
-                    FROM users
-                    WHERE chatroom_id IS NOT NULL AND country IS NOT NULL
-                    ORDER BY chatroom_id, updated_at DESC, id DESC
-                    """
-                )
-                return cur.fetchall() or []
-    except Exception:
-        logger.exception("List users for push error")
-        return []
+PUSH_SLOTS = (("yesterday", 11, 0), ("pick", 20, 0))
+SCHEDULER_MAX_SLEEP_SECONDS = 60.0
 
-def _has_pushed(user_id: int, push_date: datetime, push_type: str) -> bool:
-    try:
-        with psycopg.connect(pg_dsn()) as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    """
-                    SELECT 1 FROM push_log
-                    WHERE user_id = %s AND push_date = %s AND push_type = %s
-                    LIMIT 1
-                    """,
-                    (int(user_id), push_date.date(), push_type),
-                )
-                return bool(cur.fetchone())
-    except Exception:
-        return False
+_last_slots = {}
 
-def _mark_pushed(user_id: int, push_date: datetime, push_type: str) -> None:
+async def _claim_cohort(country: str, push_date: datetime, push_type: str):
     try:
-        with psycopg.connect(pg_dsn()) as conn:
-            with conn.cursor() as cur:
-                cur.execute(
+        async with aconnection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
                     """
-                    INSERT INTO push_log (user_id, push_date, push_type)
-                    VALUES (%s, %s, %s)
-                    ON CONFLICT (user_id, push_date, push_type) DO NOTHING
+                    WITH cohort AS (
+                        SELECT id, chatroom_id, country
+                        FROM (
+                            SELECT DISTINCT ON (chatroom_id) id, chatroom_id, country
+                            FROM users
+                            WHERE chatroom_id IS NOT NULL AND country IS NOT NULL
+                            ORDER BY chatroom_id, updated_at DESC, id DESC
+                        ) latest
+                        WHERE country = %s
+                    ), claimed AS (
+                        INSERT INTO push_log (user_id, push_date, push_type)
+                        SELECT id, %s, %s FROM cohort
+                        ON CONFLICT (user_id, push_date, push_type) DO NOTHING
+                        RETURNING user_id
+                    )
+                    SELECT c.id, c.chatroom_id, c.country
+                    FROM claimed
+                    JOIN cohort c ON c.id = claimed.user_id
                     """,
-                    (int(user_id), push_date.date(), push_type),
+                    (str(country), push_date.date(), push_type),
                 )
-                conn.commit()
+                rows = await cur.fetchall() or []
+                await conn.commit()
+                return rows
     except Exception:
-        logger.exception("Mark pushed error")
+        logger.exception("Claim push cohort error")
+        return []
+
+async def _render_slot(push_type: str, country: str):
+    if push_type == "yesterday":
+        text = await ai_yesterday_text_for_country(country)
+    else:
+        text = await ai_pick_text_for_country(country)
+    if not text:
+        return []
+    if isinstance(text, list):
+        return [seg for seg in text if seg]
+    return [text]
 
-def _claim_push(user_id: int, push_date: datetime, push_type: str) -> bool:
+async def _deliver(row, segments) -> bool:
     try:
-        with psycopg.connect(pg_dsn()) as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    """
-                    INSERT INTO push_log (user_id, push_date, push_type)
-                    VALUES (%s, %s, %s)
-                    ON CONFLICT (user_id, push_date, push_type) DO NOTHING
-                    RETURNING id
-                    """,
-                    (int(user_id), push_date.date(), push_type),
-                )
-                row = cur.fetchone()
-                if row:
-                    conn.commit()
-                    return True
+        user_id, chatroom_id, country = row
+        for seg in segments:
+            # waits for the outbox to confirm, so the slot stats describe delivery rather than queueing
+            if await send_telegram_message(chatroom_id, seg, PRIORITY_BULK, wait=True) is None:
                 return False
+        return True
     except Exception:
-        logger.exception("Claim push error")
+        logger.exception("Daily push per-user error")
         return False
 
-def _push_yesterday(user_row) -> None:
+async def _fan_out(rows, segments) -> int:
+    results = await asyncio.gather(*(_deliver(row, segments) for row in rows))
+    return sum(1 for ok in results if ok)
+
+async def _run_push_slot(country: str, push_type: str, local_now: datetime) -> None:
+    t0 = time.perf_counter()
     try:
-        user_id, chatroom_id, country = user_row
-        text = ai_yesterday_text_for_country(country)
-        if text:
-            send_telegram_message(chatroom_id, text)
+        segments = await _render_slot(push_type, country)
     except Exception:
-        logger.exception("Push yesterday error")
+        logger.exception(f"Push render error country={country} type={push_type}")
+        segments = []
+    t1 = time.perf_counter()
+    rows = await _claim_cohort(country, local_now, push_type) if segments else []
+    t2 = time.perf_counter()
+    delivered = await _fan_out(rows, segments) if rows else 0
+    t3 = time.perf_counter()
+    deliver_s = t3 - t2
+    stats = {
+        "country": country,
+        "push_type": push_type,
+        "slot": local_now.strftime("%Y-%m-%d %H:%M"),
+        "users_claimed": len(rows),
+        "users_delivered": delivered,
+        "users_failed": len(rows) - delivered,
+        "render_ms": round((t1 - t0) * 1000.0, 1),
+        "claim_ms": round((t2 - t1) * 1000.0, 1),
+        "deliver_ms": round(deliver_s * 1000.0, 1),
+        "users_per_second": round(delivered / deliver_s, 1) if deliver_s > 0 else 0.0,
+    }
+    _last_slots[(country, push_type)] = stats
+    logger.info(f"push slot {stats}")
+
+def push_stats() -> dict:
+    return {f"{c}:{t}": dict(v) for (c, t), v in _last_slots.items()}
+
+def _next_due(country: str, hour: int, minute: int, due_utc: datetime) -> datetime:
+    day = to_local(country, due_utc).date() + timedelta(days=1)
+    return local_time_utc(country, day, hour, minute)
+
+def _first_due(country: str, hour: int, minute: int, now_utc: datetime, grace: timedelta) -> datetime:
+    today = day_windows(country, now_utc).local_date
+    due = local_time_utc(country, today, hour, minute)
+    if due > now_utc:
+        prev = local_time_utc(country, today - timedelta(days=1), hour, minute)
+        return prev if now_utc - prev <= grace else due
+    return due if now_utc - due <= grace else _next_due(country, hour, minute, due)
+
+def _schedule_missing(heap, scheduled, now_utc: datetime, grace: timedelta) -> None:
+    for country in push_countries():
+        for push_type, hour, minute in PUSH_SLOTS:
+            key = (country, push_type)
+            if key in scheduled:
+                continue
+            due = _first_due(country, hour, minute, now_utc, grace)
+            heapq.heappush(heap, (due, country, push_type, hour, minute))
+            scheduled.add(key)
 
-def _push_pick(user_row) -> None:
+async def _fire_slot(country: str, push_type: str, due_utc: datetime) -> None:
     try:
-        user_id, chatroom_id, country = user_row
-        text = ai_pick_text_for_country(country)
-        if text:
-            if isinstance(text, list):
-                for seg in text:
-                    if seg:
-                        send_telegram_message(chatroom_id, seg)
-            else:
-                send_telegram_message(chatroom_id, text)
+        await _run_push_slot(country, push_type, to_local(country, due_utc))
     except Exception:
-        logger.exception("Push pick error")
+        logger.exception(f"Push slot error country={country} type={push_type}")
 
 async def run_daily_push_scheduler():
+    heap = []
+    scheduled = set()
+    running = set()
     while True:
         try:
+            grace = timedelta(minutes=push_catchup_grace_minutes())
             now_utc = datetime.now(timezone.utc)
-            users = _list_users_for_push()
-            for row in users:
-                try:
-                    user_id, chatroom_id, country = row
-                    offset = read_offset(country) if country else 0
-                    local_now = now_utc + timedelta(hours=offset)
-                    if local_now.hour == 11 and local_now.minute == 0:
-                        if _claim_push(user_id, local_now, "yesterday"):
-                            _push_yesterday(row)
-                    if local_now.hour == 20 and local_now.minute == 0:
-                        if _claim_push(user_id, local_now, "pick"):
-                            _push_pick(row)
-                except Exception:
-                    logger.exception("Daily push per-user error")
+            _schedule_missing(heap, scheduled, now_utc, grace)
+            while heap and heap[0][0] <= now_utc:
+                due, country, push_type, hour, minute = heapq.heappop(heap)
+                if now_utc - due <= grace:
+                    t = asyncio.create_task(_fire_slot(country, push_type, due))
+                    running.add(t)
+                    t.add_done_callback(running.discard)
+                else:
+                    logger.warning(f"Push slot missed beyond grace country={country} type={push_type} due={due}")
+                heapq.heappush(heap, (_next_due(country, hour, minute, due), country, push_type, hour, minute))
+            wait = (heap[0][0] - now_utc).total_seconds() if heap else SCHEDULER_MAX_SLEEP_SECONDS
         except Exception:
             logger.exception("Daily push scheduler error")
-        await asyncio.sleep(60)
+            wait = SCHEDULER_MAX_SLEEP_SECONDS
+        await asyncio.sleep(min(max(wait, 0.0), SCHEDULER_MAX_SLEEP_SECONDS))
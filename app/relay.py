@@ -0,0 +1,150 @@
+import asyncio
+import logging
+from .config import telegram_stream_edit_interval_seconds
+from .outbox import enqueue_telegram, PRIORITY_INTERACTIVE
+from .sse import KIND_DELTA, KIND_RESET
+
+logger = logging.getLogger(__name__)
+
+TELEGRAM_MESSAGE_LIMIT = 4096
+ROLLOVER_AT = 3900
+TYPING_REFRESH_SECONDS = 4.5
+
+def _split_point(body: str, limit: int) -> int:
+    cut = max(body.rfind("\n", 0, limit), body.rfind(" ", 0, limit))
+    return cut + 1 if cut > limit // 2 else limit
+
+class TelegramStreamRelay:
+    def __init__(self, chat_id: int, interval: float = None):
+        self.chat_id = int(chat_id)
+        self.interval = float(interval) if interval else telegram_stream_edit_interval_seconds()
+        self.messages = []
+        self.edits = 0
+        self._text = ""
+        self._pending = []
+        self._base = 0
+        self._prefix = ""
+        self._current = None
+        self._shown = ""
+        self._dirty = asyncio.Event()
+        self._done = False
+        self._task = None
+
+    @property
+    def streamed(self) -> bool:
+        return bool(self._text or self._pending)
+
+    @property
+    def delivered(self) -> bool:
+        return bool(self.messages)
+
+    def start(self) -> None:
+        self._typing()
+        self._task = asyncio.create_task(self._run())
+
+    def _typing(self) -> None:
+        try:
+            enqueue_telegram(self.chat_id, "sendChatAction", {"chat_id": self.chat_id, "action": "typing"}, PRIORITY_INTERACTIVE)
+        except Exception:
+            logger.exception("Telegram typing action error")
+
+    def on_event(self, ev) -> None:
+        if ev.kind == KIND_RESET:
+            self._restart()
+        elif ev.kind == KIND_DELTA and ev.delta:
+            # joined lazily at flush time so a long reply is not re-copied per token
+            self._pending.append(ev.delta)
+            self._dirty.set()
+
+    def feed(self, text: str) -> None:
+        self._materialize()
+        text = str(text or "")
+        if not text or text == self._text:
+            return
+        if self._prefix and not text.startswith(self._prefix):
+            self._restart()
+        self._text = text
+        self._dirty.set()
+
+    def _restart(self) -> None:
+        # the agent moved on to a new message; earlier rolled-over chunks stay as they are
+        self._text = ""
+        self._pending = []
+        if self._prefix:
+            self._base = 0
+            self._prefix = ""
+            self._current = None
+            self._shown = ""
+
+    def _materialize(self) -> None:
+        if self._pending:
+            self._text += "".join(self._pending)
+            self._pending = []
+
+    async def finish(self, final_text: str = None) -> bool:
+        if final_text:
+            self.feed(final_text)
+        self._done = True
+        self._dirty.set()
+        if self._task is not None:
+            try:
+                await self._task
+            except Exception:
+                logger.exception("Telegram stream relay error")
+        try:
+            await self._flush()
+        except Exception:
+            logger.exception("Telegram stream relay final flush error")
+        return self.delivered
+
+    async def _run(self) -> None:
+        while not self._done:
+            if not self._dirty.is_set() and self._current is None:
+                try:
+                    await asyncio.wait_for(self._dirty.wait(), timeout=TYPING_REFRESH_SECONDS)
+                except asyncio.TimeoutError:
+                    self._typing()
+                    continue
+            await self._dirty.wait()
+            if self._done:
+                break
+            self._dirty.clear()
+            try:
+                await self._flush()
+            except Exception:
+                logger.exception("Telegram stream relay flush error")
+            await asyncio.sleep(self.interval)
+
+    async def _flush(self) -> None:
+        self._materialize()
+        while True:
+            body = self._text[self._base:]
+            if len(body) > ROLLOVER_AT:
+                cut = _split_point(body, ROLLOVER_AT)
+                await self._show(body[:cut])
+                self._base += cut
+                self._prefix = self._text[:self._base]
+                self._current = None
+                self._shown = ""
+                continue
+            if body.strip() and body != self._shown:
+                await self._show(body)
+            return
+
+    async def _show(self, part: str) -> None:
+        if self._current is None:
+            res = await enqueue_telegram(self.chat_id, "sendMessage", {"chat_id": self.chat_id, "text": part}, PRIORITY_INTERACTIVE)
+            message_id = (res or {}).get("message_id") if isinstance(res, dict) else None
+            if message_id is None:
+                raise RuntimeError("sendMessage returned no message_id")
+            self._current = message_id
+            self.messages.append(message_id)
+        else:
+            await enqueue_telegram(
+                self.chat_id,
+                "editMessageText",
+                {"chat_id": self.chat_id, "message_id": self._current, "text": part},
+                PRIORITY_INTERACTIVE,
+            )
+            self.edits += 1
+        self._shown = part
@@ -0,0 +1,268 @@
+import time
+import random
+import asyncio
+import logging
+import httpx
+from contextlib import asynccontextmanager
+from .config import agent_retry_attempts, agent_retry_base_seconds, agent_retry_max_seconds, agent_breaker_failures, agent_breaker_reset_seconds, agent_max_concurrency, agent_queue_limit, agent_queue_wait_seconds
+from .http_clients import request, stream
+
+logger = logging.getLogger(__name__)
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+RETRYABLE_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+class CircuitOpenError(Exception):
+    pass
+
+class BulkheadFullError(Exception):
+    pass
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.reset_timeout = float(reset_timeout)
+        self.state = STATE_CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self._probe = False
+        self.stats = {"calls": 0, "successes": 0, "failures": 0, "retries": 0, "short_circuited": 0, "opened": 0}
+
+    def allow(self, now: float = None) -> bool:
+        now = time.monotonic() if now is None else now
+        if self.state == STATE_OPEN:
+            if now - self.opened_at < self.reset_timeout:
+                return False
+            self.state = STATE_HALF_OPEN
+            self._probe = False
+        if self.state == STATE_HALF_OPEN:
+            # let exactly one request probe the upstream
+            if self._probe:
+                return False
+            self._probe = True
+        return True
+
+    def record_success(self) -> None:
+        self.stats["successes"] += 1
+        if self.state != STATE_CLOSED:
+            logger.info(f"Circuit {self.name} closed")
+        self.state = STATE_CLOSED
+        self.failures = 0
+        self._probe = False
+
+    def record_failure(self, now: float = None) -> None:
+        self.stats["failures"] += 1
+        self.failures += 1
+        if self.state == STATE_HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != STATE_OPEN:
+                self.stats["opened"] += 1
+                logger.warning(f"Circuit {self.name} open after failures={self.failures}")
+            self.state = STATE_OPEN
+            self.opened_at = time.monotonic() if now is None else now
+            self._probe = False
+
+    def release(self) -> None:
+        # the call ended without telling us anything about the upstream; free the probe slot for the next caller
+        if self.state == STATE_HALF_OPEN:
+            self._probe = False
+
+    def snapshot(self) -> dict:
+        out = {"state": self.state, "consecutive_failures": self.failures, **self.stats}
+        if self.state == STATE_OPEN and self.opened_at is not None:
+            out["retry_in_s"] = round(max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at)), 1)
+        return out
+
+_breakers = {}
+
+def breaker_for(key: str) -> CircuitBreaker:
+    b = _breakers.get(key)
+    if b is None:
+        b = CircuitBreaker(key, agent_breaker_failures(), agent_breaker_reset_seconds())
+        _breakers[key] = b
+    return b
+
+def breaker_stats() -> dict:
+    return {k: b.snapshot() for k, b in _breakers.items()}
+
+class Bulkhead:
+    def __init__(self, name: str, limit: int, queue_limit: int, wait_budget: float):
+        self.name = name
+        self.limit = max(1, int(limit))
+        self.queue_limit = max(0, int(queue_limit))
+        self.wait_budget = float(wait_budget)
+        self.in_flight = 0
+        self.waiting = 0
+        self.avg_service = None
+        self._sem = asyncio.Semaphore(self.limit)
+        self.stats = {"admitted": 0, "shed_queue_full": 0, "shed_wait_budget": 0, "shed_timeout": 0, "last_wait_ms": 0.0, "max_wait_ms": 0.0}
+
+    def queued(self) -> int:
+        # callers still waking up on the semaphore count as waiting, not yet in flight
+        return max(0, self.in_flight + self.waiting - self.limit)
+
+    def estimated_wait(self) -> float:
+        if self.in_flight + self.waiting < self.limit or not self.avg_service:
+            return 0.0
+        return (self.queued() + 1) * self.avg_service / self.limit
+
+    def _shed(self, reason: str):
+        self.stats[reason] += 1
+        logger.warning(f"Bulkhead {self.name} shed {reason} in_flight={self.in_flight} waiting={self.waiting}")
+        return BulkheadFullError(f"bulkhead {self.name} {reason}")
+
+    @asynccontextmanager
+    async def slot(self):
+        if self.in_flight + self.waiting >= self.limit:
+            if self.queued() >= self.queue_limit:
+                raise self._shed("shed_queue_full")
+            if self.estimated_wait() > self.wait_budget:
+                raise self._shed("shed_wait_budget")
+        t0 = time.monotonic()
+        self.waiting += 1
+        acquired = False
+        try:
+            # awaited in this task, not wrapped like wait_for, so a cancel can never leave a permit behind
+            async with asyncio.timeout(self.wait_budget):
+                await self._sem.acquire()
+                acquired = True
+        except BaseException as e:
+            if acquired:
+                self._sem.release()
+            if isinstance(e, TimeoutError):
+                raise self._shed("shed_timeout") from None
+            raise
+        finally:
+            self.waiting -= 1
+        waited = (time.monotonic() - t0) * 1000.0
+        self.stats["admitted"] += 1
+        self.stats["last_wait_ms"] = round(waited, 1)
+        self.stats["max_wait_ms"] = round(max(self.stats["max_wait_ms"], waited), 1)
+        self.in_flight += 1
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._sem.release()
+            dt = time.monotonic() - started
+            self.avg_service = dt if self.avg_service is None else self.avg_service * 0.8 + dt * 0.2
+
+    def snapshot(self) -> dict:
+        return {
+            "limit": self.limit,
+            "queue_limit": self.queue_limit,
+            "in_flight": self.in_flight,
+            "queued": self.queued(),
+            "avg_service_s": round(self.avg_service, 2) if self.avg_service is not None else None,
+            "estimated_wait_s": round(self.estimated_wait(), 2),
+            **self.stats,
+        }
+
+_bulkheads = {}
+
+def bulkhead_for(key: str) -> Bulkhead:
+    b = _bulkheads.get(key)
+    if b is None:
+        b = Bulkhead(key, agent_max_concurrency(), agent_queue_limit(), agent_queue_wait_seconds())
+        _bulkheads[key] = b
+    return b
+
+def bulkhead_stats() -> dict:
+    return {k: b.snapshot() for k, b in _bulkheads.items()}
+
+def _backoff(attempt: int) -> float:
+    d = min(agent_retry_max_seconds(), agent_retry_base_seconds() * (2 ** max(0, attempt - 1)))
+    return d * (0.5 + random.random() / 2)
+
+def _acquire(breaker: CircuitBreaker) -> None:
+    if not breaker.allow():
+        breaker.stats["short_circuited"] += 1
+        raise CircuitOpenError(f"circuit {breaker.name} is open")
+    breaker.stats["calls"] += 1
+
+async def resilient_request(upstream: str, key: str, method: str, url: str, **kwargs) -> httpx.Response:
+    breaker = breaker_for(key)
+    attempts = 1 + agent_retry_attempts()
+    for attempt in range(1, attempts + 1):
+        _acquire(breaker)
+        try:
+            resp = await request(upstream, method, url, **kwargs)
+        except RETRYABLE_ERRORS as e:
+            breaker.record_failure()
+            if attempt >= attempts or breaker.state == STATE_OPEN:
+                raise
+            logger.warning(f"{key} {type(e).__name__}, retry {attempt}/{attempts - 1}")
+        except Exception:
+            # a read timeout may mean the agent is still working on it, so it is not retried
+            breaker.record_failure()
+            raise
+        except BaseException:
+            # cancelled by the caller (bulkhead, shutdown): neither a success nor a failure
+            breaker.release()
+            raise
+        else:
+            if resp.status_code < 500:
+                breaker.record_success()
+                return resp
+            breaker.record_failure()
+            if attempt >= attempts or breaker.state == STATE_OPEN:
+                return resp
+            logger.warning(f"{key} HTTP {resp.status_code}, retry {attempt}/{attempts - 1}")
+        breaker.stats["retries"] += 1
+        await asyncio.sleep(_backoff(attempt))
+
+@asynccontextmanager
+async def resilient_stream(upstream: str, key: str, method: str, url: str, **kwargs):
+    breaker = breaker_for(key)
+    attempts = 1 + agent_retry_attempts()
+    attempt = 0
+    while True:
+        attempt += 1
+        _acquire(breaker)
+        opened = False
+        settled = False
+        retry = False
+        try:
+            async with stream(upstream, method, url, **kwargs) as resp:
+                opened = True
+                if resp.status_code >= 500:
+                    breaker.record_failure()
+                    settled = True
+                    retry = attempt < attempts and breaker.state != STATE_OPEN
+                    if retry:
+                        logger.warning(f"{key} HTTP {resp.status_code}, retry {attempt}/{attempts - 1}")
+                        breaker.stats["retries"] += 1
+                    else:
+                        yield resp
+                else:
+                    yield resp
+                    breaker.record_success()
+                    settled = True
+            if not retry:
+                return
+        except RETRYABLE_ERRORS as e:
+            if not settled:
+                breaker.record_failure()
+                settled = True
+            if opened or attempt >= attempts or breaker.state == STATE_OPEN:
+                raise
+            logger.warning(f"{key} {type(e).__name__}, retry {attempt}/{attempts - 1}")
+            breaker.stats["retries"] += 1
+        except httpx.HTTPError:
+            if not settled:
+                breaker.record_failure()
+                settled = True
+            raise
+        finally:
+            if not settled:
+                if opened:
+                    # the agent answered; the caller stopped reading early or failed on its own
+                    breaker.record_success()
+                else:
+                    # cancelled before any response: no evidence either way, so free the probe
+                    breaker.release()
+        await asyncio.sleep(_backoff(attempt))
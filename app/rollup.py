@@ -0,0 +1,103 @@
+import sys
+import logging
+from decimal import Decimal
+from datetime import datetime, timezone
+from .db import connection
+
+logger = logging.getLogger(__name__)
+
+PICK_CONFIDENCE_THRESHOLD = Decimal("0.6")
+
+def _floor_hour(dt: datetime):
+    if dt is None:
+        return None
+    return dt.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+async def accuracy_counts(cur, windows, threshold: Decimal = PICK_CONFIDENCE_THRESHOLD):
+    exprs = []
+    params = []
+    for start, end in windows:
+        cond = []
+        cond_params = []
+        if start is not None:
+            cond.append("b >= %s")
+            cond_params.append(_floor_hour(start))
+        if end is not None:
+            cond.append("b < %s")
+            cond_params.append(end)
+        where = " and ".join(cond) if cond else "true"
+        exprs.append(f"coalesce(sum(hits) filter (where {where}), 0), coalesce(sum(picks) filter (where {where}), 0)")
+        params.extend(cond_params * 2)
+    params.append(threshold)
+    await cur.execute(
+        f"""
+        select {", ".join(exprs)}
+        from (
+            select (day + make_interval(hours => hour::int)) at time zone 'UTC' as b, hits, picks
+            from daily_accuracy
+            where threshold = %s
+        ) r
+        """,
+        params,
+    )
+    row = await cur.fetchone() or ()
+    return [(int(row[i] or 0), int(row[i + 1] or 0)) for i in range(0, len(row), 2)]
+
+REBUILD_SQL = """
+INSERT INTO daily_accuracy (day, hour, threshold, picks, hits)
+SELECT (f.fixture_date AT TIME ZONE 'UTC')::date,
+       EXTRACT(HOUR FROM f.fixture_date AT TIME ZONE 'UTC')::smallint,
+       th,
+       COUNT(*),
+       COUNT(*) FILTER (WHERE pick_hit(e.predict_winner, f.result))
+FROM unnest(%s::numeric[]) AS th
+JOIN ai_eval e ON e.confidence > th
+JOIN fixtures f ON f.fixture_id = e.fixture_id
+WHERE e.if_bet = 1 AND f.result IS NOT NULL AND f.fixture_date IS NOT NULL
+GROUP BY 1, 2, 3
+"""
+
+def _thresholds(thresholds=None) -> list:
+    return [Decimal(str(t)) for t in (thresholds or [PICK_CONFIDENCE_THRESHOLD])]
+
+def rebuild_daily_accuracy(thresholds=None) -> int:
+    ths = _thresholds(thresholds)
+    with connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("LOCK TABLE daily_accuracy IN SHARE ROW EXCLUSIVE MODE")
+            cur.execute("DELETE FROM daily_accuracy WHERE threshold = ANY(%s)", (ths,))
+            cur.execute(REBUILD_SQL, (ths,))
+            n = cur.rowcount
+            conn.commit()
+            return n
+
+def backfill_daily_accuracy() -> int:
+    # the triggers only keep the rollup current from the moment they exist; history before that is filled once here
+    ths = _thresholds()
+    with connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT to_regclass('fixtures')")
+            row = cur.fetchone()
+            if not row or row[0] is None:
+                conn.rollback()
+                return 0
+            cur.execute("LOCK TABLE daily_accuracy IN SHARE ROW EXCLUSIVE MODE")
+            cur.execute("SELECT EXISTS (SELECT 1 FROM daily_accuracy)")
+            if cur.fetchone()[0]:
+                conn.rollback()
+                return 0
+            cur.execute(REBUILD_SQL, (ths,))
+            n = cur.rowcount
+            conn.commit()
+    logger.info(f"daily_accuracy backfilled buckets={n}")
+    return n
+
+if __name__ == "__main__":
+    try:
+        from dotenv import load_dotenv
+        load_dotenv()
+    except Exception:
+        pass
+    logging.basicConfig(level=logging.INFO)
+    n = rebuild_daily_accuracy(sys.argv[1:] or None)
+    logger.info(f"daily_accuracy rebuilt buckets={n}")
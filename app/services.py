@@ -1,15 +1,55 @@
 import logging
 import os
-import requests
-import psycopg
-from datetime import datetime, timezone, timedelta
-from .config import chatwoot_base_url, chatwoot_token, telegram_token, telegram_webhook_url, allowed_account_inbox_pairs, agent_url, agent_name, agent_endpoint_path, thread_ttl_minutes_telegram, thread_ttl_minutes_chatwoot, thread_max_age_days
-from .db import pg_dsn
+import time
+from datetime import datetime, timezone
+from .config import chatwoot_base_url, chatwoot_token, telegram_token, telegram_webhook_url, allowed_account_inbox_pairs, agent_url, agent_name, agent_endpoint_path, telegram_stream_replies, thread_ttl_minutes_telegram, thread_ttl_minutes_chatwoot, thread_max_age_days, thread_cache_max_entries, thread_touch_interval_seconds, agent_spare_threads, agent_spare_thread_max_age_seconds
+from .db import aconnection
+from .http_clients import request
+from .resilience import resilient_request, resilient_stream, CircuitOpenError, BulkheadFullError, bulkhead_for
+from .outbox import enqueue_telegram, PRIORITY_INTERACTIVE
+from .relay import TelegramStreamRelay
+from .sse import AgentStreamDecoder, KIND_DELTA, KIND_RESET, KIND_ERROR
+from .ai import invalidate_country_cache, remember_country
+from .cache import TTLCache
+from .message_log import log_agent_message
+from .thread_pool import SpareThreadPool
 from .utils import extract_chatwoot_fields, extract_chatroom_id, normalize_country, to_int
 
 logger = logging.getLogger(__name__)
 
-def send_chatwoot_reply(account_id: int, conversation_id: int, content: str, inbox_id: int = None) -> None:
+AGENT_BUSY_REPLY = "System is busy, please try again later."
+
+THREAD_LOCK_SQL = "SELECT pg_advisory_xact_lock(hashtext(%s || ':' || %s))"
+
+# only the newest active thread counts; an expired or too old one makes the caller start a new thread
+RESOLVE_THREAD_SQL = """
+WITH latest AS (
+    SELECT id
+    FROM agent_threads
+    WHERE platform = %s AND chatroom_id = %s AND status = 'active'
+    ORDER BY id DESC
+    LIMIT 1
+)
+UPDATE agent_threads t
+SET last_activity_at = NOW(), expires_at = NOW() + make_interval(mins => %s)
+FROM latest
+WHERE t.id = latest.id
+  AND t.expires_at > NOW()
+  AND t.started_at > NOW() - make_interval(days => %s)
+RETURNING t.agent_thread_id,
+          EXTRACT(EPOCH FROM LEAST(t.expires_at, t.started_at + make_interval(days => %s)) - NOW())
+"""
+
+INSERT_THREAD_SQL = """
+INSERT INTO agent_threads (platform, chatroom_id, agent_thread_id, started_at, last_activity_at, expires_at, status)
+VALUES (%s, %s, %s, NOW(), NOW(), NOW() + make_interval(mins => %s), 'active')
+RETURNING EXTRACT(EPOCH FROM LEAST(expires_at, started_at + make_interval(days => %s)) - NOW())
+"""
+
+_thread_cache = TTLCache(thread_cache_max_entries())
+_thread_stats = {"db_resolves": 0, "created": 0, "create_failed": 0, "lost_races": 0, "errors": 0}
+
+async def send_chatwoot_reply(account_id: int, conversation_id: int, content: str, inbox_id: int = None) -> None:
     base_url = chatwoot_base_url()
     token = chatwoot_token()
     if not base_url or not token:
@@ -35,13 +75,13 @@ def send_chatwoot_reply(account_id: int, conversation_id: int, content: str, inb
     payload = {"content": content, "message_type": "outgoing", "private": False, "content_type": "text"}
     headers = {"Content-Type": "application/json", "api_access_token": token}
     try:
-        resp = requests.post(endpoint, json=payload, headers=headers, timeout=10)
+        resp = await request("chatwoot", "POST", endpoint, json=payload, headers=headers, timeout=10)
         if resp.status_code >= 300:
             logger.error(f"Chatwoot reply failed: {resp.status_code} {resp.text[:200]}")
     except Exception:
         logger.exception("Chatwoot reply error")
 
-def send_telegram_country_keyboard(chatroom_id_raw) -> None:
+async def send_telegram_country_keyboard(chatroom_id_raw) -> None:
     token = telegram_token()
     if not token or chatroom_id_raw is None:
         logger.warning("Telegram token/chat_id missing, skip keyboard")
@@ -59,20 +99,17 @@ def send_telegram_country_keyboard(chatroom_id_raw) -> None:
     if chat_id is None:
         logger.warning("Telegram chat_id parse failed, skip keyboard")
         return
-    url = f"https://api.telegram.org/bot{token}/sendMessage"
     payload = {
         "chat_id": chat_id,
         "text": "Please choose your region",
         "reply_markup": {"inline_keyboard": [[{"text": "🇵🇭 Philippines", "callback_data": "PH"}, {"text": "🇺🇸 United States", "callback_data": "US"}]]},
     }
     try:
-        resp = requests.post(url, json=payload, timeout=10)
-        if resp.status_code >= 300:
-            logger.error(f"Telegram keyboard failed: {resp.status_code} {resp.text[:200]}")
+        enqueue_telegram(chat_id, "sendMessage", payload, PRIORITY_INTERACTIVE)
     except Exception:
         logger.exception("Telegram keyboard error")
 
-def send_telegram_message(chatroom_id_raw, text: str) -> None:
+async def send_telegram_message(chatroom_id_raw, text: str, priority: int = PRIORITY_INTERACTIVE, wait: bool = False):
     token = telegram_token()
     if not token or chatroom_id_raw is None or not text:
         return
@@ -88,27 +125,29 @@ def send_telegram_message(chatroom_id_raw, text: str) -> None:
         chat_id = None
     if chat_id is None:
         return
-    url = f"https://api.telegram.org/bot{token}/sendMessage"
     payload = {"chat_id": chat_id, "text": text}
     try:
-        requests.post(url, json=payload, timeout=10)
+        fut = enqueue_telegram(chat_id, "sendMessage", payload, priority)
+        if wait:
+            return await fut
     except Exception:
         logger.exception("Telegram sendMessage error")
+    return None
 
-def set_telegram_webhook() -> None:
+async def set_telegram_webhook() -> None:
     token = telegram_token()
     url = telegram_webhook_url()
     if not token or not url:
         return
     api = f"https://api.telegram.org/bot{token}/setWebhook"
     try:
-        resp = requests.post(api, json={"url": url}, timeout=10)
+        resp = await request("telegram", "POST", api, json={"url": url}, timeout=10)
         if resp.status_code >= 300:
             logger.error(f"Telegram setWebhook failed: {resp.status_code} {resp.text[:200]}")
     except Exception:
         logger.exception("Telegram setWebhook error")
 
-def answer_callback_query(token: str, callback_id: str, text: str = None) -> None:
+async def answer_callback_query(token: str, callback_id: str, text: str = None) -> None:
     if not token or not callback_id:
         return
     api = f"https://api.telegram.org/bot{token}/answerCallbackQuery"
@@ -117,7 +156,7 @@ def answer_callback_query(token: str, callback_id: str, text: str = None) -> Non
         payload["text"] = text
         payload["show_alert"] = False
     try:
-        resp = requests.post(api, json=payload, timeout=10)
+        resp = await request("telegram", "POST", api, json=payload, timeout=10)
         if resp.status_code >= 300:
             logger.error(f"Telegram answerCallbackQuery failed: {resp.status_code} {resp.text[:200]}")
     except Exception:
@@ -129,68 +168,14 @@ def _get_thread_ttl_minutes(platform: str) -> int:
         return int(thread_ttl_minutes_telegram())
     return int(thread_ttl_minutes_chatwoot())
 
-def find_active_thread(platform: str, chatroom_id: str):
-    try:
-        now = datetime.now(timezone.utc)
-        with psycopg.connect(pg_dsn()) as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    """
-                    SELECT agent_thread_id, started_at, last_activity_at, expires_at
-                    FROM agent_threads
-                    WHERE platform = %s AND chatroom_id = %s AND status = 'active'
-                    ORDER BY id DESC
-                    LIMIT 1
-                    """,
-                    (str(platform or ""), str(chatroom_id or "")),
-                )
-                row = cur.fetchone()
-                if not row:
-                    return None
-                tid, started_at, last_activity_at, expires_at = row
-                max_days = int(thread_max_age_days())
-                try:
-                    if started_at and (now - started_at).days >= max_days:
-                        return None
-                except Exception:
-                    pass
-                if expires_at and expires_at > now:
-                    return tid
-                return None
-    except Exception:
-        logger.exception("Find active thread error")
-        return None
-
-def _touch_thread(platform: str, chatroom_id: str, agent_thread_id: str) -> None:
-    try:
-        ttl_min = _get_thread_ttl_minutes(platform)
-        now = datetime.now(timezone.utc)
-        expires = now + timedelta(minutes=int(ttl_min))
-    except Exception:
-        expires = datetime.now(timezone.utc)
-    try:
-        with psycopg.connect(pg_dsn()) as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    """
-                    UPDATE agent_threads
-                    SET last_activity_at = NOW(), expires_at = %s
-                    WHERE platform = %s AND chatroom_id = %s AND agent_thread_id = %s AND status = 'active'
-                    """,
-                    (expires, str(platform or ""), str(chatroom_id or ""), str(agent_thread_id or "")),
-                )
-                conn.commit()
-    except Exception:
-        logger.exception("Touch thread error")
-
-def _create_remote_thread() -> str:
+async def _create_remote_thread() -> str:
     base = agent_url()
     if not base:
         return None
     endpoint = f"{base}/threads"
     headers = {"Content-Type": "application/json"}
     try:
-        resp = requests.post(endpoint, json={}, headers=headers, timeout=10)
+        resp = await resilient_request("agent", "agent:/threads", "POST", endpoint, json={}, headers=headers, timeout=10)
         if resp.status_code >= 300:
             return None
         try:
@@ -199,42 +184,152 @@ def _create_remote_thread() -> str:
             return str(tid) if tid else None
         except Exception:
             return None
+    except CircuitOpenError:
+        logger.warning("Agent circuit open, skip remote thread creation")
+        return None
     except Exception:
         logger.exception("Create remote thread error")
         return None
 
-def ensure_agent_thread(platform: str, chatroom_id: str) -> str:
-    tid = find_active_thread(platform, chatroom_id)
-    if tid:
-        _touch_thread(platform, chatroom_id, tid)
-        return tid
-    # create new
-    new_tid = _create_remote_thread()
+_spare_threads = SpareThreadPool(_create_remote_thread, agent_spare_threads(), agent_spare_thread_max_age_seconds())
+
+def start_spare_threads() -> None:
+    if agent_url():
+        _spare_threads.start()
+
+async def stop_spare_threads() -> None:
+    await _spare_threads.stop()
+
+def spare_thread_stats() -> dict:
+    return _spare_threads.snapshot()
+
+def _cache_thread(platform: str, chatroom_id: str, tid: str, remaining) -> None:
+    try:
+        ttl = float(remaining)
+    except Exception:
+        return
+    if ttl > 1:
+        _thread_cache.set((platform, chatroom_id), (str(tid), time.monotonic()), ttl=ttl)
+
+async def _locked_resolve(cur, platform: str, chatroom_id: str, ttl_min: int, max_days: int):
+    # the lock is its own statement so the lookup snapshot sees a thread the previous holder just
+    # inserted; pipelining keeps both in one round trip
+    async with cur.connection.pipeline():
+        await cur.execute(THREAD_LOCK_SQL, (platform, chatroom_id))
+        await cur.execute(RESOLVE_THREAD_SQL, (platform, chatroom_id, ttl_min, max_days, max_days))
+    return await cur.fetchone()
+
+async def _resolve_thread_db(platform: str, chatroom_id: str) -> str:
+    ttl_min = _get_thread_ttl_minutes(platform)
+    max_days = int(thread_max_age_days())
+    _thread_stats["db_resolves"] += 1
+    async with aconnection() as conn:
+        async with conn.cursor() as cur:
+            row = await _locked_resolve(cur, platform, chatroom_id, ttl_min, max_days)
+            await conn.commit()
+    if row:
+        _cache_thread(platform, chatroom_id, row[0], row[1])
+        return row[0]
+    # the agent call can take seconds, so no connection, transaction or lock is held across it
+    new_tid = _spare_threads.take() or await _create_remote_thread()
     if not new_tid:
+        _thread_stats["create_failed"] += 1
         return None
+    async with aconnection() as conn:
+        async with conn.cursor() as cur:
+            row = await _locked_resolve(cur, platform, chatroom_id, ttl_min, max_days)
+            if row:
+                # another message for this chat got there first; keep its thread and save ours for later
+                await conn.commit()
+                _thread_stats["lost_races"] += 1
+                _spare_threads.give_back(new_tid)
+                _cache_thread(platform, chatroom_id, row[0], row[1])
+                return row[0]
+            await cur.execute(INSERT_THREAD_SQL, (platform, chatroom_id, str(new_tid), ttl_min, max_days))
+            row = await cur.fetchone()
+            await conn.commit()
+    _thread_stats["created"] += 1
+    _cache_thread(platform, chatroom_id, new_tid, row[0] if row else None)
+    return new_tid
+
+async def ensure_agent_thread(platform: str, chatroom_id: str) -> str:
+    platform = str(platform or "")
+    chatroom_id = str(chatroom_id or "")
+    hit = _thread_cache.get((platform, chatroom_id))
+    if hit is not None:
+        tid, touched = hit
+        # expires_at only slides forward once per touch interval, so hot chats skip the database
+        if time.monotonic() - touched < thread_touch_interval_seconds():
+            return tid
     try:
-        ttl_min = _get_thread_ttl_minutes(platform)
-        now = datetime.now(timezone.utc)
-        expires = now + timedelta(minutes=int(ttl_min))
+        return await _resolve_thread_db(platform, chatroom_id)
     except Exception:
-        now = datetime.now(timezone.utc)
-        expires = now
+        _thread_stats["errors"] += 1
+        logger.exception("Resolve agent thread error")
+        return None
+
+def thread_cache_stats() -> dict:
+    return {**_thread_cache.stats(), **_thread_stats}
+
+def _result_text(result) -> str:
+    if not result:
+        return None
+    segments = result.get("segments")
+    if isinstance(segments, list):
+        return "\n\n".join(str(x) for x in segments if x)
+    reply = result.get("reply")
+    return reply if isinstance(reply, str) else None
+
+def _log_exchange(payload: dict, thread_id: str, role: str, text: str, status: str = None, latency_ms=None) -> None:
+    meta = (payload or {}).get("metadata") or {}
+    log_agent_message(
+        meta.get("platform") or "",
+        role,
+        text,
+        chatroom_id=meta.get("chatroom_id"),
+        thread_id=thread_id,
+        message_id=meta.get("message_id"),
+        status=status,
+        latency_ms=latency_ms,
+        conversation_id=meta.get("conversation_id"),
+        account_id=meta.get("account_id"),
+        inbox_id=meta.get("inbox_id"),
+    )
+
+async def post_agent_message(payload: dict, idempotency_key: str = None, thread_id: str = None, on_progress=None):
+    if not agent_url():
+        return None
+    msgs = (payload or {}).get("messages") or []
+    user_text = msgs[-1].get("content") if msgs and isinstance(msgs[-1], dict) else None
+    _log_exchange(payload, thread_id, "user", user_text if isinstance(user_text, str) else None)
+    t0 = time.monotonic()
     try:
-        with psycopg.connect(pg_dsn()) as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    """
-                    INSERT INTO agent_threads (platform, chatroom_id, agent_thread_id, started_at, last_activity_at, expires_at, status)
-                    VALUES (%s, %s, %s, NOW(), NOW(), %s, 'active')
-                    """,
-                    (str(platform or ""), str(chatroom_id or ""), str(new_tid), expires),
-                )
-                conn.commit()
-    except Exception:
-        logger.exception("Insert agent thread error")
-    return new_tid
+        # a capped number of agent runs at a time, so a burst cannot starve /ai_pick and the push scheduler
+        async with bulkhead_for("agent").slot():
+            result = await _post_agent_message(payload, idempotency_key, thread_id, on_progress)
+    except BulkheadFullError:
+        _log_exchange(payload, thread_id, "error", AGENT_BUSY_REPLY, "shed", 0)
+        return {"thread_id": None, "reply": AGENT_BUSY_REPLY}
+    latency_ms = (time.monotonic() - t0) * 1000.0
+    text = _result_text(result)
+    if not result or text == AGENT_BUSY_REPLY:
+        _log_exchange(payload, thread_id, "error", text, "error", latency_ms)
+    else:
+        _log_exchange(payload, thread_id, "assistant", text, "ok", latency_ms)
+    return result
 
-def post_agent_message(payload: dict, idempotency_key: str = None, thread_id: str = None):
+def _dispatch_stream_events(events, on_progress) -> None:
+    for ev in events:
+        if ev.kind == KIND_ERROR:
+            logger.warning(f"Agent stream error event: {str(ev.raw)[:300]}")
+            continue
+        if on_progress is not None and ev.kind in (KIND_DELTA, KIND_RESET):
+            try:
+                on_progress(ev)
+            except Exception:
+                logger.exception("Agent stream progress callback error")
+
+async def _post_agent_message(payload: dict, idempotency_key: str = None, thread_id: str = None, on_progress=None):
     url = agent_url()
     if not url:
         return None
@@ -244,6 +339,7 @@ def post_agent_message(payload: dict, idempotency_key: str = None, thread_id: st
         endpoint = f"{url}/threads/{thread_id}{suffix}"
     else:
         endpoint = f"{url}{endpoint_path}"
+    breaker_key = f"agent:{endpoint_path}"
     headers = {"Content-Type": "application/json"}
     if idempotency_key:
         headers["Idempotency-Key"] = idempotency_key
@@ -288,7 +384,7 @@ def post_agent_message(payload: dict, idempotency_key: str = None, thread_id: st
                         "thread": {"threadId": ""},
                     },
                 }
-            resp = requests.post(endpoint, json=rpc_payload, headers=headers, timeout=10)
+            resp = await resilient_request("agent", breaker_key, "POST", endpoint, json=rpc_payload, headers=headers, timeout=10)
         else:
             if "/runs" in endpoint_path:
                 try:
@@ -300,119 +396,23 @@ def post_agent_message(payload: dict, idempotency_key: str = None, thread_id: st
                     if endpoint_path.endswith("/stream"):
                         headers["Accept"] = "text/event-stream"
                         run_payload["stream_mode"] = "messages"
-                        resp = requests.post(endpoint, json=run_payload, headers=headers, timeout=60, stream=True)
-                        segments = []
-                        acc_text = ""
+                        decoder = AgentStreamDecoder()
                         try:
-                            for line in resp.iter_lines(decode_unicode=True):
-                                if not line:
-                                    continue
-                                s = line.strip()
-                                if s.startswith("data:"):
-                                    import json as _json
-                                    try:
-                                        obj = _json.loads(s[5:].strip())
-                                    except Exception:
-                                        obj = None
-                                    if isinstance(obj, list):
-                                        for m in obj:
-                                            c = m.get("content")
-                                            if isinstance(c, str):
-                                                if acc_text and c.startswith(acc_text):
-                                                    delta = c[len(acc_text):]
-                                                    if delta:
-                                                        segments.append(delta)
-                                                    acc_text = c
-                                                else:
-                                                    segments.append(c)
-                                                    acc_text = c
-                                            elif isinstance(c, list):
-                                                parts_text = []
-                                                for part in c:
-                                                    t = part.get("text") or part.get("output_text") or part.get("content")
-                                                    if t:
-                                                        parts_text.append(str(t))
-                                                if parts_text:
-                                                    joined = "".join(parts_text)
-                                                    if acc_text and joined.startswith(acc_text):
-                                                        delta = joined[len(acc_text):]
-                                                        if delta:
-                                                            segments.append(delta)
-                                                        acc_text = joined
-                                                    else:
-                                                        segments.append(joined)
-                                                        acc_text = joined
-                                    elif isinstance(obj, dict):
-                                        data_obj = obj.get("data") or obj
-                                        out_msgs = (
-                                            data_obj.get("messages")
-                                            or (data_obj.get("output") or {}).get("messages")
-                                        )
-                                        if not out_msgs:
-                                            delta = data_obj.get("delta") or {}
-                                            c = delta.get("content")
-                                            if isinstance(c, str):
-                                                if acc_text and c.startswith(acc_text):
-                                                    d = c[len(acc_text):]
-                                                    if d:
-                                                        segments.append(d)
-                                                    acc_text = c
-                                                else:
-                                                    segments.append(c)
-                                                    acc_text = c
-                                            elif isinstance(c, list):
-                                                parts_text = []
-                                                for part in c:
-                                                    t = part.get("text") or part.get("output_text") or part.get("content")
-                                                    if t:
-                                                        parts_text.append(str(t))
-                                                if parts_text:
-                                                    joined = "".join(parts_text)
-                                                    if acc_text and joined.startswith(acc_text):
-                                                        d = joined[len(acc_text):]
-                                                        if d:
-                                                            segments.append(d)
-                                                        acc_text = joined
-                                                    else:
-                                                        segments.append(joined)
-                                                        acc_text = joined
-                                        if isinstance(out_msgs, list):
-                                            for m in out_msgs:
-                                                c = m.get("content")
-                                                if isinstance(c, str):
-                                                    if acc_text and c.startswith(acc_text):
-                                                        d = c[len(acc_text):]
-                                                        if d:
-                                                            segments.append(d)
-                                                        acc_text = c
-                                                    else:
-                                                        segments.append(c)
-                                                        acc_text = c
-                                                elif isinstance(c, list):
-                                                    parts_text = []
-                                                    for part in c:
-                                                        t = part.get("text") or part.get("output_text") or part.get("content")
-                                                        if t:
-                                                            parts_text.append(str(t))
-                                                    if parts_text:
-                                                        joined = "".join(parts_text)
-                                                        if acc_text and joined.startswith(acc_text):
-                                                            d = joined[len(acc_text):]
-                                                            if d:
-                                                                segments.append(d)
-                                                            acc_text = joined
-                                                        else:
-                                                            segments.append(joined)
-                                                            acc_text = joined
+                            async with resilient_stream("agent", breaker_key, "POST", endpoint, json=run_payload, headers=headers, timeout=60) as resp:
+                                async for line in resp.aiter_lines():
+                                    _dispatch_stream_events(decoder.feed_line(line), on_progress)
+                            _dispatch_stream_events(decoder.close(), on_progress)
+                        except CircuitOpenError:
+                            raise
                         except Exception:
-                            pass
-                        if segments or acc_text:
-                            final_text = acc_text if acc_text else "".join(segments)
-                            return {"segments": [final_text]} if final_text else {"reply": "System is busy, please try again later."}
+                            logger.exception(f"Agent stream error after frames={decoder.frames} events={decoder.events}")
+                        if decoder.events:
+                            final_text = decoder.text
+                            return {"segments": [final_text]} if final_text else {"reply": AGENT_BUSY_REPLY}
                         # fallback to non-stream
                         try:
                             fallback_endpoint = endpoint.replace("/stream", "")
-                            resp2 = requests.post(fallback_endpoint, json=run_payload, headers={k:v for k,v in headers.items() if k != "Accept"}, timeout=30)
+                            resp2 = await resilient_request("agent", breaker_key.replace("/stream", ""), "POST", fallback_endpoint, json=run_payload, headers={k:v for k,v in headers.items() if k != "Accept"}, timeout=30)
                             if resp2.status_code < 300:
                                 d2 = resp2.json()
                                 out2 = d2.get("output") or {}
@@ -432,22 +432,24 @@ def post_agent_message(payload: dict, idempotency_key: str = None, thread_id: st
                                     return {"segments": texts}
                         except Exception:
                             pass
-                        return {"reply": "System is busy, please try again later."}
+                        return {"reply": AGENT_BUSY_REPLY}
                     else:
-                        resp = requests.post(endpoint, json=run_payload, headers=headers, timeout=20)
+                        resp = await resilient_request("agent", breaker_key, "POST", endpoint, json=run_payload, headers=headers, timeout=20)
+                except CircuitOpenError:
+                    raise
                 except Exception:
-                    resp = requests.post(endpoint, json=payload, headers=headers, timeout=10)
+                    resp = await resilient_request("agent", breaker_key, "POST", endpoint, json=payload, headers=headers, timeout=10)
             else:
-                resp = requests.post(endpoint, json=payload, headers=headers, timeout=10)
+                resp = await resilient_request("agent", breaker_key, "POST", endpoint, json=payload, headers=headers, timeout=10)
         if resp.status_code >= 300:
-            return {"thread_id": None, "reply": "System is busy, please try again later."}
+            return {"thread_id": None, "reply": AGENT_BUSY_REPLY}
         try:
             data = resp.json()
             if "/a2a/" in endpoint_path:
                 try:
                     err = data.get("error")
                     if err:
-                        return {"thread_id": None, "reply": "System is busy, please try again later."}
+                        return {"thread_id": None, "reply": AGENT_BUSY_REPLY}
                     res = data.get("result") or {}
                     texts = []
                     msg = res.get("message") or {}
@@ -479,12 +481,15 @@ def post_agent_message(payload: dict, idempotency_key: str = None, thread_id: st
                     return {"segments": texts}
             return data
         except Exception:
-            return {"thread_id": None, "reply": "System is busy, please try again later."}
+            return {"thread_id": None, "reply": AGENT_BUSY_REPLY}
+    except CircuitOpenError:
+        logger.warning(f"Agent circuit open, failing fast endpoint={endpoint_path}")
+        return {"thread_id": None, "reply": AGENT_BUSY_REPLY}
     except Exception:
         logger.exception("Agent request error")
-        return {"thread_id": None, "reply": "System is busy, please try again later."}
+        return {"thread_id": None, "reply": AGENT_BUSY_REPLY}
 
-def forward_chatwoot_to_agent(body: dict) -> None:
+async def forward_chatwoot_to_agent(body: dict) -> None:
     try:
         content, message_type, conversation_id, account_id = extract_chatwoot_fields(body)
         if message_type != "incoming":
@@ -519,17 +524,17 @@ def forward_chatwoot_to_agent(body: dict) -> None:
         inbox_id_int = to_int(inbox_id)
         if acc_id_int is not None and conv_id_int is not None:
             try:
-                send_chatwoot_reply(acc_id_int, conv_id_int, "Assistant is thinking, please wait...", inbox_id_int)
+                await send_chatwoot_reply(acc_id_int, conv_id_int, "Assistant is thinking, please wait...", inbox_id_int)
             except Exception:
                 pass
         thread_key = chatroom_id_raw or conversation_id
-        tid = ensure_agent_thread("chatwoot", str(thread_key)) if thread_key is not None else None
+        tid = await ensure_agent_thread("chatwoot", str(thread_key)) if thread_key is not None else None
         if tid:
             try:
                 payload["metadata"]["thread_id"] = tid
             except Exception:
                 pass
-        result = post_agent_message(payload, idempotency_key, thread_id=tid)
+        result = await post_agent_message(payload, idempotency_key, thread_id=tid)
         if not result:
             return
         reply = result.get("reply")
@@ -562,22 +567,22 @@ def forward_chatwoot_to_agent(body: dict) -> None:
                     if isinstance(seg, str) and len(seg) > 3500:
                         t = seg
                         while t:
-                            send_chatwoot_reply(acc_id_int, conv_id_int, t[:3000], inbox_id_int)
+                            await send_chatwoot_reply(acc_id_int, conv_id_int, t[:3000], inbox_id_int)
                             t = t[3000:]
                     else:
-                        send_chatwoot_reply(acc_id_int, conv_id_int, seg, inbox_id_int)
+                        await send_chatwoot_reply(acc_id_int, conv_id_int, seg, inbox_id_int)
             elif isinstance(reply, str):
                 if len(reply) > 3500:
                     t = reply
                     while t:
-                        send_chatwoot_reply(acc_id_int, conv_id_int, t[:3000], inbox_id_int)
+                        await send_chatwoot_reply(acc_id_int, conv_id_int, t[:3000], inbox_id_int)
                         t = t[3000:]
                 else:
-                    send_chatwoot_reply(acc_id_int, conv_id_int, reply, inbox_id_int)
+                    await send_chatwoot_reply(acc_id_int, conv_id_int, reply, inbox_id_int)
     except Exception:
         logger.exception("Forward chatwoot to agent error")
 
-def forward_telegram_to_agent(body: dict) -> None:
+async def forward_telegram_to_agent(body: dict) -> None:
     try:
         msg = body.get("message") or {}
         text = msg.get("text") or ""
@@ -587,9 +592,17 @@ def forward_telegram_to_agent(body: dict) -> None:
         sender = msg.get("from") or {}
         sender_id = sender.get("id")
         username = sender.get("first_name") or sender.get("username")
-        if chat_id is not None:
+        relay = None
+        if chat_id is not None and telegram_stream_replies():
             try:
-                send_telegram_message(chat_id, "Assistant is thinking, please wait...")
+                relay = TelegramStreamRelay(chat_id)
+                relay.start()
+            except Exception:
+                logger.exception("Telegram stream relay start error")
+                relay = None
+        elif chat_id is not None:
+            try:
+                await send_telegram_message(chat_id, "Assistant is thinking, please wait...")
             except Exception:
                 pass
         payload = {
@@ -605,14 +618,28 @@ def forward_telegram_to_agent(body: dict) -> None:
                 "timestamp": datetime.now(timezone.utc).isoformat(),
             },
         }
+        merged_ids = body.get("coalesced_message_ids")
+        if isinstance(merged_ids, list) and len(merged_ids) > 1:
+            payload["metadata"]["message_ids"] = merged_ids
         idempotency_key = f"telegram:{message_id}" if message_id is not None else None
-        tid = ensure_agent_thread("telegram", str(chat_id)) if chat_id is not None else None
+        tid = await ensure_agent_thread("telegram", str(chat_id)) if chat_id is not None else None
         if tid:
             try:
                 payload["metadata"]["thread_id"] = tid
             except Exception:
                 pass
-        result = post_agent_message(payload, idempotency_key, thread_id=tid)
+        result = await post_agent_message(payload, idempotency_key, thread_id=tid, on_progress=relay.on_event if relay else None)
+        if relay is not None and relay.streamed:
+            # the streamed text is already on screen; settle it on the final answer instead of resending
+            final = None
+            if result and isinstance(result.get("segments"), list):
+                final = "".join(str(x) for x in result.get("segments") if x)
+            elif result and isinstance(result.get("reply"), str):
+                final = result.get("reply")
+            if await relay.finish(final):
+                return
+        elif relay is not None:
+            await relay.finish()
         if not result:
             return
         reply = result.get("reply")
@@ -639,12 +666,13 @@ def forward_telegram_to_agent(body: dict) -> None:
         if isinstance(segments, list):
             for seg in segments:
                 if seg:
-                    send_telegram_message(chat_id, seg)
+                    await send_telegram_message(chat_id, seg)
         elif isinstance(reply, str) and reply:
-            send_telegram_message(chat_id, reply)
+            await send_telegram_message(chat_id, reply)
     except Exception:
         logger.exception("Forward telegram to agent error")
-def set_user_country(body: dict, choice_text: str) -> None:
+
+async def set_user_country(body: dict, choice_text: str) -> None:
     try:
         country = normalize_country(choice_text)
         if not country:
@@ -678,9 +706,9 @@ def set_user_country(body: dict, choice_text: str) -> None:
             sender = data.get("sender") or data.get("contact") or {}
             sender_id = sender.get("id") or data.get("sender_id") or (data.get("contact") or {}).get("id")
             username = username or sender.get("name") or data.get("name") or b.get("name")
-        with psycopg.connect(pg_dsn()) as conn:
-            with conn.cursor() as cur:
-                cur.execute(
+        async with aconnection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
                     """
                     INSERT INTO users (external_id, username, chatroom_id, country)
                     VALUES (%s, %s, %s, %s)
@@ -698,88 +726,15 @@ def set_user_country(body: dict, choice_text: str) -> None:
                         country,
                     ),
                 )
-                conn.commit()
+                await conn.commit()
+        # other workers hear about it through the users trigger NOTIFY
+        invalidate_country_cache({"chatroom_id": chat_id, "external_id": sender_id})
+        if sender_id is not None:
+            remember_country("external", sender_id, country)
     except Exception:
         logger.exception("DB set country error")
 
-def store_message(body: dict) -> None:
-    try:
-        content, message_type, conversation_id, account_id = extract_chatwoot_fields(body)
-        chatroom_id_raw = extract_chatroom_id(body)
-        b = body or {}
-        data = b.get("data") or b.get("payload") or b
-        sender = data.get("sender") or data.get("contact") or {}
-        message = data.get("message") or {}
-        contact = data.get("contact") or {}
-        external_id = sender.get("id") or data.get("sender_id") or message.get("sender_id")
-        msg_id = data.get("id") or message.get("id")
-        inbox_id = ((data.get("conversation") or {}).get("inbox_id") or message.get("inbox_id") or data.get("inbox_id"))
-        source_id = (
-            data.get("source_id")
-            or message.get("source_id")
-            or (data.get("conversation") or {}).get("source_id")
-            or ((data.get("conversation") or {}).get("additional_attributes") or {}).get("source_id")
-            or (message.get("additional_attributes") or {}).get("source_id")
-        )
-        username = sender.get("name") or data.get("name") or b.get("name")
-        with psycopg.connect(pg_dsn()) as conn:
-            with conn.cursor() as cur:
-                user_id = None
-                if external_id is not None:
-                    cur.execute(
-                        """
-                        INSERT INTO users (external_id, username, chatroom_id)
-                        VALUES (%s, %s, %s)
-                        ON CONFLICT (external_id) DO UPDATE SET
-                            username = EXCLUDED.username,
-                            chatroom_id = COALESCE(EXCLUDED.chatroom_id, users.chatroom_id),
-                            updated_at = NOW()
-                        RETURNING id
-                        """,
-                        (str(external_id), username, str(chatroom_id_raw) if chatroom_id_raw is not None else None),
-                    )
-                    row = cur.fetchone()
-                    user_id = row[0] if row else None
-                try:
-                    conv_id_int = int(conversation_id) if conversation_id is not None else None
-                except Exception:
-                    conv_id_int = None
-                try:
-                    acc_id_int = int(account_id) if account_id is not None else None
-                except Exception:
-                    acc_id_int = None
-                try:
-                    msg_id_int = int(msg_id) if msg_id is not None else None
-                except Exception:
-                    msg_id_int = None
-                try:
-                    inbox_id_int = int(inbox_id) if inbox_id is not None else None
-                except Exception:
-                    inbox_id_int = None
-                cur.execute(
-                    """
-                    INSERT INTO chat_messages (chatroom_id, account_id, conversation_id, user_id, content, message_type, message_id, sender_id, contact_id, inbox_id, source_id)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    """,
-                    (
-                        str(chatroom_id_raw) if chatroom_id_raw is not None else (str(conversation_id) if conversation_id is not None else None),
-                        acc_id_int,
-                        conv_id_int,
-                        user_id,
-                        content,
-                        message_type,
-                        msg_id_int,
-                        str(external_id) if external_id is not None else None,
-                        str(contact.get("id")) if contact.get("id") is not None else None,
-                        inbox_id_int,
-                        str(source_id) if source_id is not None else None,
-                    ),
-                )
-                conn.commit()
-    except Exception:
-        logger.exception("DB store error")
-
-def send_lark_help_alert(body: dict) -> None:
+async def send_lark_help_alert(body: dict) -> None:
     url = os.getenv("LARK_BOT_WEBHOOK_URL", "")
     if not url:
         return
@@ -814,7 +769,7 @@ def send_lark_help_alert(body: dict) -> None:
             f"请求内容: {str(content)[:300]}"
         )
         payload = {"msg_type": "text", "content": {"text": text}}
-        resp = requests.post(url, json=payload, timeout=10)
+        resp = await request("lark", "POST", url, json=payload, timeout=10)
         if resp.status_code >= 300:
             logger.error(f"Lark alert failed: {resp.status_code} {resp.text[:200]}")
     except Exception:
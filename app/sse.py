@@ -0,0 +1,182 @@
+import json
+import logging
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+SSEFrame = namedtuple("SSEFrame", ["event", "data", "id"])
+StreamEvent = namedtuple("StreamEvent", ["kind", "delta", "message_id", "raw"])
+
+KIND_DELTA = "delta"
+KIND_RESET = "reset"
+KIND_ERROR = "error"
+KIND_END = "end"
+
+TAIL_CHARS = 64
+
+_UNSET = object()
+
+class SSEDecoder:
+    def __init__(self):
+        self._event = None
+        self._data = []
+        self._id = None
+
+    def feed_line(self, line: str):
+        if line is None:
+            return None
+        line = line.rstrip("\r\n")
+        if not line:
+            return self.flush()
+        if line.startswith(":"):
+            return None
+        field, sep, value = line.partition(":")
+        if sep and value.startswith(" "):
+            value = value[1:]
+        if field == "data":
+            self._data.append(value)
+        elif field == "event":
+            self._event = value
+        elif field == "id":
+            self._id = value
+        return None
+
+    def flush(self):
+        if not self._data and self._event is None:
+            return None
+        frame = SSEFrame(self._event or "message", "\n".join(self._data), self._id)
+        self._event = None
+        self._data = []
+        return frame
+
+def content_text(c) -> str:
+    if isinstance(c, str):
+        return c
+    if isinstance(c, list):
+        out = []
+        for part in c:
+            if isinstance(part, str):
+                out.append(part)
+            elif isinstance(part, dict):
+                t = part.get("text") or part.get("output_text") or part.get("content")
+                if isinstance(t, str) and t:
+                    out.append(t)
+        return "".join(out)
+    return ""
+
+def _a2a_parts(res: dict):
+    for src in (res, res.get("message") or {}, res.get("artifact") or {}, (res.get("status") or {}).get("message") or {}):
+        parts = src.get("parts") if isinstance(src, dict) else None
+        if isinstance(parts, list) and parts:
+            return parts
+    return None
+
+class AgentStreamDecoder:
+    """Turns an agent SSE feed (LangGraph messages/values/delta frames or A2A results) into text deltas.
+
+    Producers either resend the whole message so far or send only the new piece; both are told
+    apart by comparing the last few characters at the known length, so each frame costs
+    O(size of the new text) rather than O(size of the reply).
+    """
+
+    def __init__(self):
+        self.sse = SSEDecoder()
+        self.frames = 0
+        self.events = 0
+        self.errors = 0
+        self._msg_id = _UNSET
+        self._pieces = []
+        self._len = 0
+        self._tail = ""
+
+    @property
+    def text(self) -> str:
+        if len(self._pieces) > 1:
+            self._pieces = ["".join(self._pieces)]
+        return self._pieces[0] if self._pieces else ""
+
+    def feed_line(self, line: str) -> list:
+        frame = self.sse.feed_line(line)
+        return self.feed_frame(frame) if frame is not None else []
+
+    def close(self) -> list:
+        frame = self.sse.flush()
+        return self.feed_frame(frame) if frame is not None else []
+
+    def feed_frame(self, frame: SSEFrame) -> list:
+        self.frames += 1
+        out = []
+        if frame.event == "end":
+            out.append(StreamEvent(KIND_END, "", None, None))
+            return out
+        try:
+            obj = json.loads(frame.data) if frame.data else None
+        except ValueError:
+            obj = None
+        if frame.event == "error":
+            self.errors += 1
+            out.append(StreamEvent(KIND_ERROR, "", None, obj if obj is not None else frame.data))
+            return out
+        if obj is None or frame.event == "metadata":
+            return out
+        self._payload(obj, out)
+        return out
+
+    def _payload(self, obj, out: list) -> None:
+        if isinstance(obj, list):
+            for m in obj:
+                if isinstance(m, dict) and "content" in m:
+                    self._content(m.get("id"), content_text(m.get("content")), out)
+            return
+        if not isinstance(obj, dict):
+            return
+        if "jsonrpc" in obj or "result" in obj:
+            if obj.get("error"):
+                self.errors += 1
+                out.append(StreamEvent(KIND_ERROR, "", None, obj.get("error")))
+                return
+            res = obj.get("result") or {}
+            parts = _a2a_parts(res) if isinstance(res, dict) else None
+            if parts:
+                mid = res.get("messageId") or (res.get("artifact") or {}).get("artifactId") or res.get("taskId")
+                self._content(mid, content_text(parts), out)
+            return
+        data_obj = obj.get("data") or obj
+        if not isinstance(data_obj, dict):
+            return
+        out_msgs = data_obj.get("messages") or (data_obj.get("output") or {}).get("messages")
+        if isinstance(out_msgs, list):
+            # values snapshots resend the whole history; the newest message is the one being written
+            for m in reversed(out_msgs):
+                if isinstance(m, dict) and "content" in m:
+                    self._content(m.get("id"), content_text(m.get("content")), out)
+                    break
+            return
+        delta = data_obj.get("delta")
+        if isinstance(delta, dict):
+            self._content(delta.get("id") or data_obj.get("id"), content_text(delta.get("content")), out)
+        elif "content" in data_obj:
+            self._content(data_obj.get("id"), content_text(data_obj.get("content")), out)
+
+    def _content(self, msg_id, c: str, out: list) -> None:
+        if msg_id != self._msg_id:
+            if self._msg_id is not _UNSET and self._len:
+                self._pieces = []
+                self._len = 0
+                self._tail = ""
+                out.append(StreamEvent(KIND_RESET, "", msg_id, None))
+            self._msg_id = msg_id
+        if not c:
+            return
+        n = len(c)
+        if self._len and n > self._len and c.startswith(self._tail, self._len - len(self._tail)):
+            delta = c[self._len:]
+        elif self._len and n == self._len and (c.endswith(self._tail) if self._len > TAIL_CHARS else c == self.text):
+            return
+        else:
+            delta = c
+        self._pieces.append(delta)
+        self._len += len(delta)
+        self._tail = (self._tail + delta)[-TAIL_CHARS:]
+        self.events += 1
+        out.append(StreamEvent(KIND_DELTA, delta, msg_id, None))
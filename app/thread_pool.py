@@ -0,0 +1,104 @@
+import time
+import asyncio
+import logging
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+REFILL_RETRY_SECONDS = 5.0
+
+class SpareThreadPool:
+    """Keeps a few remote agent threads created ahead of time so a new conversation need not wait for one."""
+
+    def __init__(self, create, size: int, max_age: float):
+        self.create = create
+        self.size = max(0, int(size))
+        self.max_age = float(max_age)
+        self._spares = deque()
+        self._wake = None
+        self._task = None
+        self.stats = {"hits": 0, "misses": 0, "created": 0, "create_failed": 0, "expired": 0, "returned": 0}
+
+    def take(self):
+        now = time.monotonic()
+        while self._spares:
+            tid, created = self._spares.popleft()
+            if now - created < self.max_age:
+                self.stats["hits"] += 1
+                self._refill()
+                return tid
+            self.stats["expired"] += 1
+        self.stats["misses"] += 1
+        self._refill()
+        return None
+
+    def give_back(self, tid) -> None:
+        # an unused thread is as good as a fresh spare; past the target size it is simply dropped
+        if tid and len(self._spares) < max(1, self.size):
+            self._spares.append((tid, time.monotonic()))
+            self.stats["returned"] += 1
+
+    def _refill(self) -> None:
+        if self._wake is not None:
+            self._wake.set()
+
+    def _expire(self) -> None:
+        now = time.monotonic()
+        # oldest first, so stop at the first one still fresh
+        while self._spares and now - self._spares[0][1] >= self.max_age:
+            self._spares.popleft()
+            self.stats["expired"] += 1
+
+    async def _run(self) -> None:
+        while True:
+            self._expire()
+            failed = False
+            while len(self._spares) < self.size:
+                try:
+                    tid = await self.create()
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
+                    logger.exception("Spare thread create error")
+                    tid = None
+                if not tid:
+                    self.stats["create_failed"] += 1
+                    failed = True
+                    break
+                self._spares.append((tid, time.monotonic()))
+                self.stats["created"] += 1
+            self._wake.clear()
+            timeout = REFILL_RETRY_SECONDS if failed else (self._spares[0][1] + self.max_age - time.monotonic() if self._spares else None)
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=max(0.0, timeout) if timeout is not None else None)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self) -> None:
+        if self.size <= 0 or self._task is not None:
+            return
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run(), name="spare-threads")
+
+    async def stop(self) -> None:
+        t = self._task
+        self._task = None
+        self._wake = None
+        if t is None:
+            return
+        t.cancel()
+        try:
+            await t
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            logger.exception("Spare thread pool stop error")
+
+    def snapshot(self) -> dict:
+        total = self.stats["hits"] + self.stats["misses"]
+        return {
+            "size": self.size,
+            "available": len(self._spares),
+            "hit_rate": round(self.stats["hits"] / total, 3) if total else 0.0,
+            **self.stats,
+        }
@@ -0,0 +1,54 @@
+import threading
+from collections import namedtuple
+from datetime import datetime, date, time, timedelta, timezone
+from .config import country_zone
+
+DayWindows = namedtuple(
+    "DayWindows",
+    ["local_date", "yesterday_start", "today_start", "tomorrow_start", "pick_end"],
+)
+
+WINDOW_CACHE_MAX_ENTRIES = 256
+
+_windows = {}
+_lock = threading.Lock()
+
+def local_midnight_utc(zone, day: date) -> datetime:
+    return datetime.combine(day, time(0, 0), tzinfo=zone).astimezone(timezone.utc)
+
+def local_time_utc(country: str, day: date, hour: int, minute: int = 0) -> datetime:
+    return datetime.combine(day, time(hour, minute), tzinfo=country_zone(country)).astimezone(timezone.utc)
+
+def local_now(country: str, now_utc: datetime = None) -> datetime:
+    now_utc = now_utc or datetime.now(timezone.utc)
+    return now_utc.astimezone(country_zone(country))
+
+def to_local(country: str, dt: datetime) -> datetime:
+    if dt is None:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(country_zone(country))
+
+def _build(zone, day: date) -> DayWindows:
+    return DayWindows(
+        local_date=day,
+        yesterday_start=local_midnight_utc(zone, day - timedelta(days=1)),
+        today_start=local_midnight_utc(zone, day),
+        tomorrow_start=local_midnight_utc(zone, day + timedelta(days=1)),
+        pick_end=local_midnight_utc(zone, day + timedelta(days=2)),
+    )
+
+def day_windows(country: str, now_utc: datetime = None) -> DayWindows:
+    zone = country_zone(country)
+    now_utc = now_utc or datetime.now(timezone.utc)
+    day = now_utc.astimezone(zone).date()
+    key = (zone, day)
+    w = _windows.get(key)
+    if w is None:
+        w = _build(zone, day)
+        with _lock:
+            if len(_windows) >= WINDOW_CACHE_MAX_ENTRIES:
+                _windows.clear()
+            _windows[key] = w
+    return w
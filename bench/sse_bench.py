@@ -0,0 +1,82 @@
+"""Decode throughput of the agent SSE decoder on recorded stream shapes.
+
+Usage: python bench/sse_bench.py [tokens ...]
+"""
+import os
+import sys
+import json
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.sse import AgentStreamDecoder
+
+# cumulative recordings grow quadratically in memory, so they are capped
+CUMULATIVE_MAX_TOKENS = 16000
+
+def recorded_streams(tokens: int):
+    words = [f"tok{i % 97} " for i in range(tokens)]
+    cumulative = []
+    acc = ""
+    for w in words[:CUMULATIVE_MAX_TOKENS]:
+        acc += w
+        cumulative.append("data: " + json.dumps([{"id": "m1", "type": "AIMessageChunk", "content": acc}, {"langgraph_node": "agent"}]))
+        cumulative.append("")
+    chunks = []
+    for w in words:
+        chunks.append("event: messages")
+        chunks.append("data: " + json.dumps([{"id": "m1", "type": "AIMessageChunk", "content": [{"type": "text", "text": w}]}, {}]))
+        chunks.append("")
+    deltas = []
+    for w in words:
+        deltas.append("data: " + json.dumps({"data": {"delta": {"content": w}}}))
+        deltas.append("")
+    return {"cumulative": cumulative, "chunks": chunks, "delta": deltas}, words
+
+def _legacy_track(snapshots) -> int:
+    # the old loop: prefix-compare every snapshot against the whole reply so far
+    acc_text = ""
+    deltas = 0
+    for c in snapshots:
+        if acc_text and c.startswith(acc_text):
+            if c[len(acc_text):]:
+                deltas += 1
+        else:
+            deltas += 1
+        acc_text = c
+    return deltas
+
+def _new_track(snapshots) -> int:
+    dec = AgentStreamDecoder()
+    out = []
+    for c in snapshots:
+        dec._content("m1", c, out)
+    return len(out)
+
+def run_benchmark(sizes=(1000, 4000, 16000)) -> None:
+    for tokens in sizes:
+        streams, expected = recorded_streams(tokens)
+        for name, lines in streams.items():
+            t0 = time.perf_counter()
+            dec = AgentStreamDecoder()
+            for line in lines:
+                dec.feed_line(line)
+            dec.close()
+            dt = time.perf_counter() - t0
+            ok = dec.text == "".join(expected[:CUMULATIVE_MAX_TOKENS] if name == "cumulative" else expected)
+            print(f"decode {name:10s} tokens={tokens:6d} events={dec.events:6d} {dt * 1000:8.1f} ms {dec.events / dt:10.0f} ev/s ok={ok}")
+        # cumulative snapshots are O(n^2) bytes on the wire, so compare delta tracking on pre-parsed text
+        snapshots = []
+        acc = ""
+        for i in range(min(tokens, CUMULATIVE_MAX_TOKENS)):
+            acc += f"tok{i % 97} "
+            snapshots.append(acc)
+        for name, fn in (("legacy", _legacy_track), ("tail", _new_track)):
+            t0 = time.perf_counter()
+            n = fn(snapshots)
+            dt = time.perf_counter() - t0
+            print(f"track  {name:10s} tokens={tokens:6d} events={n:6d} {dt * 1000:8.1f} ms {n / dt:10.0f} ev/s")
+
+if __name__ == "__main__":
+    sizes = tuple(int(a) for a in sys.argv[1:]) or (1000, 4000, 16000)
+    run_benchmark(sizes)
@@ -1,6 +1,7 @@
 import logging
 from fastapi import FastAPI
 import asyncio
+import signal
  
 try:
     from dotenv import load_dotenv
@@ -12,18 +13,57 @@ app = FastAPI()
 logger = logging.getLogger(__name__)
 
 
-from app.db import init_db
+from app.config import reload_settings, check_settings, run_settings_watcher
+from app.db import init_db, close_pool, open_async_pool, close_async_pool
+from app.handlers import drain_agent_turns
+from app.message_log import start_message_log, stop_message_log
+from app.inbound import start_inbound_workers, stop_inbound_workers
+from app.http_clients import open_http_clients, close_http_clients
+from app.notify import start_listener, stop_listener
+from app.outbox import start_outbox, stop_outbox
 from app.push import run_daily_push_scheduler
+from app.rollup import backfill_daily_accuracy
 from app.routes import router as api_router
-from app.services import set_telegram_webhook
+from app.services import set_telegram_webhook, start_spare_threads, stop_spare_threads
 
 app.include_router(api_router)
 
 @app.on_event("startup")
 async def on_startup():
+    reload_settings(force=True)
+    for problem in check_settings():
+        logger.warning(f"Config check: {problem}")
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGHUP, reload_settings, True)
+    except (NotImplementedError, AttributeError, RuntimeError):
+        pass
+    asyncio.create_task(run_settings_watcher())
     init_db()
+    try:
+        backfill_daily_accuracy()
+    except Exception:
+        logger.exception("daily_accuracy backfill error")
+    await open_async_pool()
+    await open_http_clients()
+    start_outbox()
+    start_message_log()
+    start_listener()
+    start_inbound_workers()
+    start_spare_threads()
     asyncio.create_task(run_daily_push_scheduler())
     try:
-        set_telegram_webhook()
+        await set_telegram_webhook()
     except Exception:
         logger.exception("Set Telegram webhook failed")
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await stop_inbound_workers()
+    await drain_agent_turns()
+    await stop_spare_threads()
+    await stop_message_log()
+    await stop_listener()
+    await stop_outbox()
+    await close_http_clients()
+    await close_async_pool()
+    close_pool()
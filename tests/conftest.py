@@ -0,0 +1,55 @@
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import resilience
+from app import http_clients
+
+@pytest.fixture(autouse=True)
+def fresh_registries():
+    # breakers, bulkheads and HTTP clients are process globals; keep tests from leaking state into each other
+    resilience._breakers.clear()
+    resilience._bulkheads.clear()
+    http_clients._clients.clear()
+    yield
+    resilience._breakers.clear()
+    resilience._bulkheads.clear()
+    http_clients._clients.clear()
+
+@pytest.fixture(scope="session")
+def pg_database():
+    """A throwaway database on the configured server, migrated, dropped at the end of the session."""
+    import uuid
+    import psycopg
+    from app import db
+    name = f"test_{uuid.uuid4().hex[:12]}"
+    try:
+        admin = psycopg.connect(db.pg_dsn(), autocommit=True, connect_timeout=3)
+    except Exception as e:
+        pytest.skip(f"Postgres not reachable: {e}")
+    old = os.environ.get("POSTGRES_DB")
+    admin.execute(f"CREATE DATABASE {name}")
+    os.environ["POSTGRES_DB"] = name
+    db.close_pool()
+    db._pool = None
+    db._async_pool = None
+    try:
+        with db.connection() as conn:
+            # the ETL owns fixtures; the migrations expect it to exist
+            conn.execute("CREATE TABLE fixtures (id BIGSERIAL PRIMARY KEY, fixture_id BIGINT, fixture_date TIMESTAMPTZ, home_name TEXT, away_name TEXT, result TEXT)")
+            conn.commit()
+        db.migrate()
+        db.ensure_fixtures_objects()
+        yield name
+    finally:
+        db.close_pool()
+        db._pool = None
+        db._async_pool = None
+        if old is None:
+            os.environ.pop("POSTGRES_DB", None)
+        else:
+            os.environ["POSTGRES_DB"] = old
+        admin.execute(f"DROP DATABASE IF EXISTS {name} WITH (FORCE)")
+        admin.close()
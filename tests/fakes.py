@@ -0,0 +1,48 @@
+import json
+import asyncio
+
+class FakeAgent:
+    """A tiny HTTP/1.1 server; each request pops the next (delay, status, body, content_type) from `plan`."""
+
+    def __init__(self, plan=None):
+        self.plan = list(plan or [])
+        self.paths = []
+        self.server = None
+        self.url = None
+
+    async def _handle(self, reader, writer) -> None:
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+            lines = head.split(b"\r\n")
+            self.paths.append(lines[0].split(b" ")[1].decode())
+            length = 0
+            for line in lines:
+                if line.lower().startswith(b"content-length:"):
+                    length = int(line.split(b":", 1)[1])
+            if length:
+                await reader.readexactly(length)
+            delay, status, body, ctype = self.plan.pop(0) if self.plan else (0.0, 200, b'{"thread_id": "t-fake"}', "application/json")
+            await asyncio.sleep(delay)
+            if isinstance(body, (dict, list)):
+                body = json.dumps(body).encode()
+            writer.write(b"HTTP/1.1 %d X\r\nContent-Type: %s\r\nContent-Length: %d\r\nConnection: close\r\n\r\n%s" % (status, ctype.encode(), len(body), body))
+            await writer.drain()
+        except Exception:
+            pass
+        finally:
+            writer.close()
+
+    async def __aenter__(self):
+        self.server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        self.url = f"http://127.0.0.1:{self.server.sockets[0].getsockname()[1]}"
+        return self
+
+    async def __aexit__(self, *exc):
+        self.server.close()
+        await self.server.wait_closed()
+
+def sse_body(frames) -> bytes:
+    out = []
+    for event, data in frames:
+        out.append(f"event: {event}\ndata: {json.dumps(data)}\n\n")
+    return "".join(out).encode()
@@ -0,0 +1,34 @@
+import asyncio
+from app import config, services
+from app.sse import KIND_DELTA
+from tests.fakes import FakeAgent, sse_body
+
+def _use_agent(monkeypatch, url: str, endpoint: str) -> None:
+    monkeypatch.setenv("AGENT_URL", url)
+    monkeypatch.setenv("AGENT_ENDPOINT", endpoint)
+    monkeypatch.setenv("AGENT_MESSAGE_LOG", "0")
+    config.reload_settings(True)
+
+def test_streamed_run_reports_progress_and_runs_once(monkeypatch):
+    frames = [
+        ("metadata", {"run_id": "r1"}),
+        ("messages", [{"id": "m1", "type": "AIMessageChunk", "content": "Hello"}, {}]),
+        ("messages", [{"id": "m1", "type": "AIMessageChunk", "content": " world"}, {}]),
+        ("end", None),
+    ]
+
+    async def run():
+        async with FakeAgent([(0.0, 200, sse_body(frames), "text/event-stream")]) as agent:
+            _use_agent(monkeypatch, agent.url, "/runs/stream")
+            progress = []
+            payload = {"messages": [{"role": "user", "content": "hi"}], "metadata": {"platform": "telegram"}}
+            result = await services.post_agent_message(payload, "telegram:1", thread_id="t1", on_progress=progress.append)
+            return agent.paths, progress, result
+
+    try:
+        paths, progress, result = asyncio.run(run())
+    finally:
+        config.reload_settings(True)
+    assert paths == ["/threads/t1/runs/stream"]
+    assert [ev.delta for ev in progress if ev.kind == KIND_DELTA] == ["Hello", " world"]
+    assert result == {"segments": ["Hello world"]}
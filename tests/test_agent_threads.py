@@ -0,0 +1,53 @@
+import time
+import asyncio
+import itertools
+from collections import deque
+from app import db, services
+
+def _fresh(monkeypatch, delay: float):
+    counter = itertools.count()
+
+    async def slow_create():
+        await asyncio.sleep(delay)
+        return f"thread-{next(counter)}"
+
+    monkeypatch.setattr(services, "_create_remote_thread", slow_create)
+    monkeypatch.setattr(services._spare_threads, "_spares", deque())
+    services._thread_cache.clear()
+
+def test_concurrent_messages_share_one_thread(pg_database, monkeypatch):
+    _fresh(monkeypatch, 0.2)
+
+    async def run():
+        try:
+            tids = await asyncio.gather(*[services.ensure_agent_thread("telegram", "race-1") for _ in range(5)])
+            async with db.aconnection() as conn:
+                cur = await conn.execute("SELECT agent_thread_id FROM agent_threads WHERE chatroom_id = 'race-1'")
+                rows = await cur.fetchall()
+            return tids, rows
+        finally:
+            await db.close_async_pool()
+
+    tids, rows = asyncio.run(run())
+    assert len(set(tids)) == 1
+    assert rows == [(tids[0],)]
+    # the losers' threads go to the spare pool instead of leaking
+    assert len(services._spare_threads._spares) >= 1
+
+def test_thread_creation_does_not_hold_a_connection(pg_database, monkeypatch):
+    monkeypatch.setenv("POSTGRES_POOL_MIN_SIZE", "1")
+    monkeypatch.setenv("POSTGRES_POOL_MAX_SIZE", "1")
+    _fresh(monkeypatch, 0.3)
+
+    async def run():
+        try:
+            t0 = time.perf_counter()
+            tids = await asyncio.gather(*[services.ensure_agent_thread("telegram", f"slow-{i}") for i in range(4)])
+            return tids, time.perf_counter() - t0
+        finally:
+            await db.close_async_pool()
+
+    tids, elapsed = asyncio.run(run())
+    assert len(set(tids)) == 4
+    # with one pooled connection, holding it across the agent call would serialise the four chats
+    assert elapsed < 0.9
@@ -0,0 +1,23 @@
+import asyncio
+from datetime import datetime, timezone
+from app import ai
+
+def test_pick_filters_on_now_and_ignores_renders_raced_by_invalidation(monkeypatch):
+    calls = []
+
+    async def render(country, start_utc, end_utc):
+        calls.append(start_utc)
+        if len(calls) == 1:
+            # the ai_pick NOTIFY lands while the first render is still querying
+            ai.invalidate_ai_pick_cache("1")
+        return [f"picks {len(calls)}"]
+
+    monkeypatch.setattr(ai, "_render_ai_pick", render)
+    ai.invalidate_ai_pick_cache()
+    before = datetime.now(timezone.utc)
+    first = asyncio.run(ai.ai_pick_text_for_country("US"))
+    second = asyncio.run(ai.ai_pick_text_for_country("US"))
+    third = asyncio.run(ai.ai_pick_text_for_country("US"))
+    assert (first, second, third) == ("picks 1", "picks 2", "picks 2")
+    assert len(calls) == 2
+    assert all(start >= before for start in calls)
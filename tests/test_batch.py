@@ -0,0 +1,74 @@
+import asyncio
+from app.batch import BatchWriter
+
+def test_stop_drains_a_partial_batch():
+    written = []
+
+    async def flush(rows):
+        await asyncio.sleep(0)
+        written.append(list(rows))
+
+    async def run():
+        w = BatchWriter("drain_test", flush, 50, 60.0, 1000)
+        w.start()
+        for i in range(107):
+            w.add(i)
+        await w.stop()
+        return w.snapshot()
+
+    stats = asyncio.run(run())
+    assert [x for batch in written for x in batch] == list(range(107))
+    assert max(len(b) for b in written) == 50
+    assert stats["buffered"] == 0 and stats["dropped"] == 0
+
+def test_poison_row_is_dead_lettered_and_outage_is_retried():
+    written = []
+    down = [True]
+
+    class Outage(Exception):
+        pass
+
+    async def flush(rows):
+        if down[0]:
+            raise Outage("database away")
+        if "bad" in rows:
+            raise ValueError("bad row")
+        written.extend(rows)
+
+    async def run():
+        w = BatchWriter("poison_test", flush, 4, 60.0, 100, retryable=(Outage,))
+        for r in ["a", "b", "bad", "c", "d", "e"]:
+            w.add(r)
+        # an outage never uses up the attempts
+        for _ in range(5):
+            assert await w.flush_once() == -1
+        down[0] = False
+        assert await w.flush_once() == -1
+        assert await w.flush_once() == -1
+        assert await w.flush_once() == 4
+        await w.stop()
+        return w.snapshot()
+
+    stats = asyncio.run(run())
+    assert written == ["a", "b", "c", "d", "e"]
+    assert stats["dead_lettered"] == 1 and stats["split_batches"] == 1
+    assert stats["buffered"] == 0 and stats["dropped"] == 0
+
+def test_stop_gets_past_a_poison_batch():
+    written = []
+
+    async def flush(rows):
+        if "bad" in rows:
+            raise ValueError("bad row")
+        written.extend(rows)
+
+    async def run():
+        w = BatchWriter("poison_stop_test", flush, 10, 60.0, 100)
+        for r in ["a", "bad", "b"]:
+            w.add(r)
+        await w.stop()
+        return w.snapshot()
+
+    stats = asyncio.run(run())
+    assert written == ["a", "b"]
+    assert stats["dead_lettered"] == 1 and stats["dropped"] == 0
@@ -0,0 +1,132 @@
+import asyncio
+from app import db, inbound
+from app.coalesce import ChatCoalescer
+
+def _status(qid):
+    with db.connection() as conn:
+        row = conn.execute("SELECT status, locked_until > NOW(), attempts FROM inbound_updates WHERE id = %s", (qid,)).fetchone()
+        conn.commit()
+    return row
+
+def test_deferred_update_stays_leased_until_the_turn_reports_done(pg_database):
+    seen = []
+
+    async def handler(update, qid):
+        seen.append(qid)
+        return inbound.DEFERRED
+
+    inbound.register_update_handler("deferred_test", handler)
+
+    async def run():
+        try:
+            a = await inbound.enqueue_update({"update_id": 424242, "message": {"chat": {"id": 7}}}, platform="deferred_test")
+            b = await inbound.enqueue_update({"update_id": 424243, "message": {"chat": {"id": 8}}}, platform="deferred_test")
+            inbound.start_inbound_workers()
+            for _ in range(100):
+                if len(seen) == 2 and _status(a)[0] == _status(b)[0] == "deferred":
+                    break
+                await asyncio.sleep(0.05)
+            await inbound.stop_inbound_workers()
+            leased = _status(a)
+            await inbound.complete_deferred([a])
+            # b's process died mid-turn: once the lease runs out the update goes back on the queue
+            with db.connection() as conn:
+                conn.execute("UPDATE inbound_updates SET locked_until = NOW() - INTERVAL '1 second' WHERE id = %s", (b,))
+                conn.commit()
+            redriven = await inbound.redrive_deferred()
+            return [a, b], leased, _status(a)[0], redriven, _status(b)[0]
+        finally:
+            inbound._handlers.pop("deferred_test", None)
+            await db.close_async_pool()
+
+    ids, leased, a_status, redriven, b_status = asyncio.run(run())
+    assert sorted(seen) == ids
+    assert leased == ("deferred", True, 1)
+    assert a_status == "done"
+    assert redriven == 1
+    assert b_status == "pending"
+
+def test_coalescer_reports_tokens_only_for_turns_that_finished():
+    done = []
+    turns = []
+
+    async def turn(body):
+        turns.append(body["message"]["text"])
+        if "boom" in body["message"]["text"]:
+            raise RuntimeError("agent turn failed")
+
+    async def on_done(tokens):
+        done.append(tokens)
+
+    def body(text):
+        return {"message": {"message_id": len(turns), "text": text}}
+
+    async def run():
+        c = ChatCoalescer(turn, quiet=0.05, max_wait=1.0, on_done=on_done)
+        c.submit(1, body("hi"), 10)
+        c.submit(1, body("there"), 11)
+        await asyncio.sleep(0.2)
+        c.submit(1, body("boom"), 12)
+        await c.drain()
+        return c.snapshot()
+
+    stats = asyncio.run(run())
+    assert turns == ["hi\nthere", "boom"]
+    assert done == [[10, 11]]
+    assert stats["turn_errors"] == 1
+
+def test_failed_turn_hands_back_its_updates_and_the_chats_later_ones():
+    failed = []
+    turns = []
+
+    async def turn(body):
+        turns.append(body["message"]["text"])
+        await asyncio.sleep(0.1)
+        if "boom" in body["message"]["text"]:
+            raise RuntimeError("agent down")
+
+    async def on_failed(tokens, error):
+        failed.append((tokens, str(error)))
+
+    async def run():
+        c = ChatCoalescer(turn, quiet=0.02, max_wait=1.0, on_failed=on_failed)
+        c.submit(1, {"message": {"text": "boom"}}, 20)
+        await asyncio.sleep(0.05)
+        # arrives while the failing turn runs; must not overtake it
+        c.submit(1, {"message": {"text": "later"}}, 21)
+        await asyncio.sleep(0.3)
+        return c.snapshot()
+
+    stats = asyncio.run(run())
+    assert turns == ["boom"]
+    assert failed == [([20, 21], "agent down")]
+    assert stats["handed_back"] == 2 and stats["buffered"] == 0
+
+def test_failed_deferred_update_is_retried_soon_and_holds_its_chat(pg_database):
+    async def run():
+        try:
+            with db.connection() as conn:
+                conn.execute("DELETE FROM inbound_updates")
+                conn.commit()
+            a = await inbound.enqueue_update({"update_id": 525252, "message": {"chat": {"id": 9}}}, platform="fail_test")
+            rows = await inbound._claim(10)
+            assert [r[0] for r in rows] == [a]
+            await inbound._finish([], [], [a])
+            b = await inbound.enqueue_update({"update_id": 525253, "message": {"chat": {"id": 9}}}, platform="fail_test")
+            await inbound.fail_deferred([a], RuntimeError("agent down"))
+            claimed = await inbound._claim(10)
+            with db.connection() as conn:
+                retry_in = conn.execute(
+                    "SELECT status, EXTRACT(EPOCH FROM available_at - NOW()), last_error FROM inbound_updates WHERE id = %s", (a,)
+                ).fetchone()
+                conn.execute("DELETE FROM inbound_updates WHERE platform = 'fail_test'")
+                conn.commit()
+            return b, claimed, retry_in
+        finally:
+            await db.close_async_pool()
+
+    b, claimed, (status, retry_in, error) = asyncio.run(run())
+    assert status == "pending" and 0 < retry_in <= inbound.BACKOFF_BASE_SECONDS
+    assert error == "RuntimeError: agent down"
+    # the newer update of the same chat waits behind the retry
+    assert b not in [r[0] for r in claimed]
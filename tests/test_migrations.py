@@ -0,0 +1,96 @@
+from app import db
+
+FIXTURES_TRIGGERS = {
+    "trg_ai_eval_ai_pick_notify",
+    "trg_fixtures_ai_pick_notify",
+    "trg_fixtures_daily_accuracy",
+    "trg_ai_eval_daily_accuracy",
+}
+
+def _triggers():
+    with db.connection() as conn:
+        rows = conn.execute(
+            "SELECT tgname FROM pg_trigger WHERE NOT tgisinternal AND tgrelid IN ('fixtures'::regclass, 'ai_eval'::regclass)"
+        ).fetchall()
+        conn.commit()
+    return [r[0] for r in rows]
+
+def test_fixtures_objects_are_reinstalled_at_every_start(pg_database):
+    with db.connection() as conn:
+        # the ETL recreating fixtures takes our triggers with it
+        conn.execute("DROP TRIGGER trg_fixtures_daily_accuracy ON fixtures")
+        conn.commit()
+    assert "trg_fixtures_daily_accuracy" not in _triggers()
+    assert db.ensure_fixtures_objects()
+    assert db.ensure_fixtures_objects()
+    names = _triggers()
+    assert set(names) == FIXTURES_TRIGGERS
+    assert len(names) == len(FIXTURES_TRIGGERS)
+
+def test_empty_daily_accuracy_is_backfilled_from_history(pg_database):
+    from app.rollup import backfill_daily_accuracy
+    with db.connection() as conn:
+        # history that predates the rollup triggers
+        conn.execute("SET LOCAL session_replication_role = replica")
+        conn.execute("TRUNCATE daily_accuracy, ai_eval")
+        conn.execute("DELETE FROM fixtures")
+        conn.execute(
+            "INSERT INTO fixtures (fixture_id, fixture_date, result) VALUES "
+            "(1, '2026-01-01 10:15+00', 'Home'), (2, '2026-01-01 10:45+00', 'Away'), (3, '2026-01-02 08:00+00', 'Home')"
+        )
+        conn.execute(
+            "INSERT INTO ai_eval (fixture_id, predict_winner, confidence, if_bet) VALUES "
+            "(1, 'home', 0.8, 1), (2, 'home', 0.7, 1), (3, 'home', 0.9, 1)"
+        )
+        conn.commit()
+    try:
+        assert backfill_daily_accuracy() == 2
+        # already populated, so a restart leaves it to the triggers
+        assert backfill_daily_accuracy() == 0
+        with db.connection() as conn:
+            rows = conn.execute("SELECT day::text, hour, picks, hits FROM daily_accuracy ORDER BY day, hour").fetchall()
+        assert rows == [("2026-01-01", 10, 2, 1), ("2026-01-02", 8, 1, 1)]
+    finally:
+        with db.connection() as conn:
+            conn.execute("TRUNCATE daily_accuracy, ai_eval")
+            conn.execute("DELETE FROM fixtures")
+            conn.commit()
+
+def test_concurrent_writers_to_one_hour_do_not_overwrite_each_other(pg_database):
+    import threading
+    import psycopg
+    with db.connection() as conn:
+        conn.execute("TRUNCATE daily_accuracy, ai_eval")
+        conn.execute("DELETE FROM fixtures")
+        conn.execute("INSERT INTO ai_eval (fixture_id, predict_winner, confidence, if_bet) VALUES (21, 'home', 0.8, 1), (22, 'away', 0.8, 1)")
+        conn.commit()
+    first = psycopg.connect(db.pg_dsn())
+    second = psycopg.connect(db.pg_dsn())
+    try:
+        first.execute("INSERT INTO fixtures (fixture_id, fixture_date, result) VALUES (21, '2026-02-01 10:05+00', ' Home ')")
+
+        def write_second():
+            # waits on the bucket until the first writer commits, then counts both games
+            second.execute("INSERT INTO fixtures (fixture_id, fixture_date, result) VALUES (22, '2026-02-01 10:40+00', 'away')")
+            second.commit()
+
+        t = threading.Thread(target=write_second)
+        t.start()
+        t.join(0.5)
+        first.commit()
+        t.join(10)
+        with db.connection() as conn:
+            row = conn.execute("SELECT picks, hits FROM daily_accuracy WHERE day = '2026-02-01' AND hour = 10").fetchone()
+            listed = conn.execute(
+                "SELECT pick_hit(e.predict_winner, f.result) FROM ai_eval e JOIN fixtures f USING (fixture_id) ORDER BY fixture_id"
+            ).fetchall()
+        assert row == (2, 2)
+        # the ✅ marks use the same rule as the rollup, padding and case included
+        assert listed == [(True,), (True,)]
+    finally:
+        first.close()
+        second.close()
+        with db.connection() as conn:
+            conn.execute("TRUNCATE daily_accuracy, ai_eval")
+            conn.execute("DELETE FROM fixtures")
+            conn.commit()
@@ -0,0 +1,101 @@
+import time
+import asyncio
+import httpx
+from app import outbox
+from app.outbox import TelegramOutbox, PRIORITY_INTERACTIVE, PRIORITY_BULK
+
+class FakeTelegram:
+    """Stands in for http_clients.request; `plan` maps a chat id to the statuses it answers with, in turn."""
+
+    def __init__(self, plan=None):
+        self.plan = {k: list(v) for k, v in (plan or {}).items()}
+        self.calls = []
+
+    async def __call__(self, upstream, method, url, json=None, **kwargs):
+        chat_id = json["chat_id"]
+        self.calls.append((chat_id, time.monotonic()))
+        steps = self.plan.get(chat_id)
+        status = steps.pop(0) if steps else 200
+        if status == 429:
+            return httpx.Response(429, json={"ok": False, "parameters": {"retry_after": 0.3}})
+        if status >= 300:
+            return httpx.Response(status, json={"ok": False})
+        return httpx.Response(200, json={"ok": True, "result": {"chat": chat_id}})
+
+def _setup(monkeypatch, fake, concurrency: int = 1):
+    monkeypatch.setattr(outbox, "request", fake)
+    monkeypatch.setattr(outbox, "BACKOFF_BASE_SECONDS", 0.01)
+    monkeypatch.setenv("TELEGRAM_BOT_TOKEN", "test")
+    monkeypatch.setenv("TELEGRAM_GLOBAL_RATE", "1000")
+    monkeypatch.setenv("TELEGRAM_CHAT_RATE", "1000")
+    monkeypatch.setenv("TELEGRAM_SEND_CONCURRENCY", str(concurrency))
+
+def _send(box, chat_id, priority=PRIORITY_INTERACTIVE):
+    return box.enqueue(chat_id, "sendMessage", {"chat_id": chat_id, "text": "x"}, priority)
+
+def test_interactive_lane_goes_before_queued_bulk(monkeypatch):
+    fake = FakeTelegram()
+    _setup(monkeypatch, fake)
+
+    async def run():
+        box = TelegramOutbox()
+        futs = [_send(box, c, PRIORITY_BULK) for c in (1, 2, 3)]
+        futs.append(_send(box, 4))
+        await asyncio.gather(*futs)
+        await box.stop()
+
+    asyncio.run(run())
+    assert [c for c, _ in fake.calls] == [4, 1, 2, 3]
+
+def test_private_chat_429_pauses_every_chat(monkeypatch):
+    fake = FakeTelegram({5: [429]})
+    _setup(monkeypatch, fake)
+
+    async def run():
+        box = TelegramOutbox()
+        first = _send(box, 5)
+        await asyncio.sleep(0.05)
+        other = _send(box, 6)
+        results = await asyncio.gather(first, other)
+        await box.stop()
+        return results, box.stats()
+
+    results, stats = asyncio.run(run())
+    limited_at = fake.calls[0][1]
+    other_at = next(t for c, t in fake.calls if c == 6)
+    assert other_at - limited_at >= 0.25
+    assert results == [{"chat": 5}, {"chat": 6}]
+    assert stats["rate_limited"] == 1
+
+def test_group_429_pauses_only_that_group(monkeypatch):
+    fake = FakeTelegram({-100: [429]})
+    _setup(monkeypatch, fake)
+
+    async def run():
+        box = TelegramOutbox()
+        group = _send(box, -100)
+        await asyncio.sleep(0.05)
+        other = _send(box, 6)
+        await asyncio.gather(group, other)
+        await box.stop()
+
+    asyncio.run(run())
+    limited_at = fake.calls[0][1]
+    other_at = next(t for c, t in fake.calls if c == 6)
+    assert other_at - limited_at < 0.2
+    assert [c for c, _ in fake.calls] == [-100, 6, -100]
+
+def test_5xx_is_retried_then_delivered(monkeypatch):
+    fake = FakeTelegram({7: [502, 503]})
+    _setup(monkeypatch, fake)
+
+    async def run():
+        box = TelegramOutbox()
+        result = await _send(box, 7)
+        await box.stop()
+        return result, box.stats()
+
+    result, stats = asyncio.run(run())
+    assert result == {"chat": 7}
+    assert [c for c, _ in fake.calls] == [7, 7, 7]
+    assert stats["retried"] == 2 and stats["sent"] == 1 and stats["failed"] == 0
@@ -0,0 +1,86 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+from app import db, push, tz
+
+ZONES = {"US": ZoneInfo("America/New_York"), "PH": ZoneInfo("Asia/Manila")}
+
+def _zones(monkeypatch):
+    monkeypatch.setattr(tz, "country_zone", lambda country: ZONES.get(country) or timezone.utc)
+
+def _utc(*args):
+    return datetime(*args, tzinfo=timezone.utc)
+
+def test_slot_keeps_local_time_across_dst(monkeypatch):
+    _zones(monkeypatch)
+    # 11:00 New York is 16:00 UTC on the last EST day and 15:00 UTC once EDT starts (2026-03-08)
+    due = push._first_due("US", 11, 0, _utc(2026, 3, 7, 12, 0), timedelta(minutes=30))
+    assert due == _utc(2026, 3, 7, 16, 0)
+    assert push._next_due("US", 11, 0, due) == _utc(2026, 3, 8, 15, 0)
+    assert push._next_due("US", 11, 0, _utc(2026, 10, 31, 15, 0)) == _utc(2026, 11, 1, 16, 0)
+
+def test_first_due_uses_the_local_day_not_the_utc_day(monkeypatch):
+    _zones(monkeypatch)
+    grace = timedelta(minutes=30)
+    # 20:00 Manila is 12:00 UTC; at 23:50 UTC it is already 07:50 tomorrow in Manila
+    assert push._first_due("PH", 20, 0, _utc(2026, 5, 1, 23, 50), grace) == _utc(2026, 5, 2, 12, 0)
+    # a restart within the grace window still fires the slot it missed
+    assert push._first_due("PH", 20, 0, _utc(2026, 5, 2, 12, 20), grace) == _utc(2026, 5, 2, 12, 0)
+    # past the grace window it waits for the next local day
+    assert push._first_due("PH", 20, 0, _utc(2026, 5, 2, 13, 0), grace) == _utc(2026, 5, 3, 12, 0)
+
+def test_cohort_is_claimed_once_even_by_concurrent_schedulers(pg_database):
+    async def run():
+        try:
+            async with db.aconnection() as conn:
+                await conn.execute("TRUNCATE users RESTART IDENTITY CASCADE")
+                await conn.execute(
+                    """
+                    INSERT INTO users (external_id, username, chatroom_id, country)
+                    SELECT 'push' || g, 'u' || g, (1000 + g)::text, CASE WHEN g <= 40 THEN 'US' ELSE 'PH' END
+                    FROM generate_series(1, 50) g
+                    """
+                )
+                await conn.commit()
+            slot = datetime(2026, 5, 2, 11, 0)
+            first, second = await asyncio.gather(
+                push._claim_cohort("US", slot, "yesterday"),
+                push._claim_cohort("US", slot, "yesterday"),
+            )
+            again = await push._claim_cohort("US", slot, "yesterday")
+            other_type = await push._claim_cohort("US", slot, "pick")
+            return first, second, again, other_type
+        finally:
+            async with db.aconnection() as conn:
+                await conn.execute("TRUNCATE users RESTART IDENTITY CASCADE")
+                await conn.commit()
+            await db.close_async_pool()
+
+    first, second, again, other_type = asyncio.run(run())
+    ids = [r[0] for r in first] + [r[0] for r in second]
+    assert len(ids) == 40 and len(set(ids)) == 40
+    assert again == []
+    assert len(other_type) == 40
+
+def test_slot_rate_counts_confirmed_deliveries(monkeypatch):
+    async def render(push_type, country):
+        return ["a", "b"]
+
+    async def claim(country, local_now, push_type):
+        return [(i, str(i), country) for i in range(1, 5)]
+
+    async def send(chat, text, priority=None, wait=False):
+        assert wait
+        await asyncio.sleep(0.05)
+        # chat 4 is blocked on the Telegram side
+        return None if chat == "4" else {"ok": True}
+
+    monkeypatch.setattr(push, "_render_slot", render)
+    monkeypatch.setattr(push, "_claim_cohort", claim)
+    monkeypatch.setattr(push, "send_telegram_message", send)
+    asyncio.run(push._run_push_slot("US", "pick", datetime(2026, 5, 2, 20, 0)))
+    stats = push.push_stats()["US:pick"]
+    assert stats["users_claimed"] == 4
+    assert stats["users_delivered"] == 3 and stats["users_failed"] == 1
+    assert stats["deliver_ms"] >= 100
+    assert stats["users_per_second"] <= 3 / 0.1
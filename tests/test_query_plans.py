@@ -0,0 +1,88 @@
+from datetime import datetime, timedelta, timezone
+import pytest
+from app import db
+from app.ai import COUNTRY_BY_CHATROOM_SQL, COUNTRY_BY_EXTERNAL_ID_SQL, RECENT_PICKS_SQL, YESTERDAY_PICKS_SQL, AI_PICK_SQL
+from app.services import RESOLVE_THREAD_SQL
+
+AUDIT_ROWS = 100000
+LARGE_TABLES = ("users", "ai_eval", "fixtures", "agent_threads")
+
+NOW = datetime.now(timezone.utc)
+
+AUDITED_QUERIES = [
+    ("get_country_for_chat chatroom_id", COUNTRY_BY_CHATROOM_SQL, ("4242",)),
+    ("get_country_for_chat external_id", COUNTRY_BY_EXTERNAL_ID_SQL, ("4242",)),
+    ("ai_history recent", RECENT_PICKS_SQL, None),
+    ("ai_yesterday picks", YESTERDAY_PICKS_SQL, (NOW - timedelta(days=1), NOW)),
+    ("ai_pick", AI_PICK_SQL, (NOW, NOW + timedelta(days=2))),
+    ("resolve_agent_thread", RESOLVE_THREAD_SQL, ("telegram", "4242", 30, 7, 7)),
+]
+
+def _seq_scans(node: dict, out: list) -> None:
+    if node.get("Node Type") == "Seq Scan" and node.get("Relation Name") in LARGE_TABLES:
+        out.append(node.get("Relation Name"))
+    for child in node.get("Plans") or []:
+        _seq_scans(child, out)
+
+def _load_synthetic(cur, rows: int) -> None:
+    # rolled back with the test transaction; the NOTIFY and rollup triggers are not what is audited
+    cur.execute("SET LOCAL session_replication_role = replica")
+    cur.execute("ALTER TABLE ai_eval ADD COLUMN IF NOT EXISTS home_odd TEXT, ADD COLUMN IF NOT EXISTS away_odd TEXT, ADD COLUMN IF NOT EXISTS draw_odd TEXT")
+    cur.execute(
+        """
+        INSERT INTO users (external_id, username, chatroom_id, country, updated_at)
+        SELECT 'audit' || g, 'user' || g, 'audit' || g, CASE WHEN g %% 2 = 0 THEN 'PH' ELSE 'US' END, NOW() - (g %% 1000) * INTERVAL '1 minute'
+        FROM generate_series(1, %s) g
+        """,
+        (rows,),
+    )
+    cur.execute(
+        """
+        INSERT INTO fixtures (fixture_id, fixture_date, home_name, away_name, result)
+        SELECT g, d, 'home' || g, 'away' || g,
+               CASE WHEN d < NOW() THEN (CASE WHEN g %% 2 = 0 THEN 'home' ELSE 'away' END) END
+        FROM (
+            SELECT g, NOW() - INTERVAL '1095 days' + (g::float8 / %s * 1100) * INTERVAL '1 day' AS d
+            FROM generate_series(1, %s) g
+        ) s
+        """,
+        (rows, rows),
+    )
+    cur.execute(
+        """
+        INSERT INTO ai_eval (fixture_id, predict_winner, confidence, key_tag_evidence, if_bet)
+        SELECT g, CASE WHEN g %% 3 = 0 THEN 'away' ELSE 'home' END, (g %% 100) / 100.0, 'form', CASE WHEN g %% 4 = 0 THEN 1 ELSE 0 END
+        FROM generate_series(1, %s) g
+        """,
+        (rows,),
+    )
+    cur.execute(
+        """
+        INSERT INTO agent_threads (platform, chatroom_id, agent_thread_id, started_at, last_activity_at, expires_at, status)
+        SELECT 'telegram', (g %% 20000)::text, 'audit-thread-' || g, NOW(), NOW(), NOW() + INTERVAL '30 minutes',
+               CASE WHEN g %% 10 = 0 THEN 'active' ELSE 'closed' END
+        FROM generate_series(1, %s) g
+        """,
+        (rows,),
+    )
+    for t in LARGE_TABLES:
+        cur.execute(f"ANALYZE {t}")
+
+@pytest.fixture(scope="module")
+def synthetic_cursor(pg_database):
+    """The migrated test database plus a large synthetic load, all inside one transaction rolled back at the end."""
+    with db.connection() as conn:
+        try:
+            with conn.cursor() as cur:
+                _load_synthetic(cur, AUDIT_ROWS)
+                yield cur
+        finally:
+            conn.rollback()
+
+@pytest.mark.parametrize("name,sql,params", AUDITED_QUERIES, ids=[q[0] for q in AUDITED_QUERIES])
+def test_hot_query_avoids_seq_scans_on_large_tables(synthetic_cursor, name, sql, params):
+    synthetic_cursor.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+    plan = synthetic_cursor.fetchone()[0]
+    scans = []
+    _seq_scans((plan[0] if isinstance(plan, list) else plan).get("Plan") or {}, scans)
+    assert not scans, f"{name}: seq scan on {', '.join(scans)}"
@@ -0,0 +1,112 @@
+import asyncio
+from app import resilience
+from app.resilience import CircuitOpenError, STATE_OPEN, STATE_HALF_OPEN, STATE_CLOSED
+from tests.fakes import FakeAgent
+
+def test_cancelled_probe_frees_the_half_open_slot():
+    async def run():
+        async with FakeAgent([(5.0, 200, b"{}", "application/json"), (0.0, 200, b"{}", "application/json")]) as agent:
+            b = resilience.breaker_for("probe")
+            b.state = STATE_OPEN
+            b.opened_at = -b.reset_timeout
+            call = asyncio.create_task(resilience.resilient_request("agent", "probe", "POST", f"{agent.url}/threads", json={}))
+            await asyncio.sleep(0.1)
+            assert b.state == STATE_HALF_OPEN
+            call.cancel()
+            try:
+                await call
+            except asyncio.CancelledError:
+                pass
+            resp = await resilience.resilient_request("agent", "probe", "POST", f"{agent.url}/threads", json={})
+            return resp.status_code, b.state
+
+    status, state = asyncio.run(run())
+    assert status == 200
+    assert state == STATE_CLOSED
+
+def _status(code: int):
+    return (0.0, code, b'{"thread_id": "t-fake"}', "application/json")
+
+def test_retry_then_open_then_recover(monkeypatch):
+    monkeypatch.setenv("AGENT_RETRY_BASE_SECONDS", "0.01")
+    monkeypatch.setenv("AGENT_RETRY_MAX_SECONDS", "0.02")
+
+    async def run():
+        async with FakeAgent() as agent:
+            url = f"{agent.url}/threads"
+            b = resilience.breaker_for("selfcheck")
+            agent.plan[:] = [_status(503), _status(200)]
+            resp = await resilience.resilient_request("agent", "selfcheck", "POST", url, json={})
+            assert resp.status_code == 200 and b.stats["retries"] == 1 and b.state == STATE_CLOSED
+
+            agent.plan[:] = [_status(500)] * 20
+            for _ in range(b.failure_threshold):
+                try:
+                    await resilience.resilient_request("agent", "selfcheck", "POST", url, json={})
+                except CircuitOpenError:
+                    break
+            assert b.state == STATE_OPEN
+            served = len(agent.paths)
+            try:
+                await resilience.resilient_request("agent", "selfcheck", "POST", url, json={})
+                raise AssertionError("open breaker let a call through")
+            except CircuitOpenError:
+                pass
+            assert len(agent.paths) == served
+
+            b.opened_at -= b.reset_timeout
+            agent.plan[:] = [_status(200)]
+            resp = await resilience.resilient_request("agent", "selfcheck", "POST", url, json={})
+            assert resp.status_code == 200 and b.state == STATE_CLOSED
+
+    asyncio.run(run())
+
+def test_cancelled_stream_probe_does_not_close_the_circuit():
+    async def run():
+        async with FakeAgent([(5.0, 200, b"{}", "application/json")]) as agent:
+            b = resilience.breaker_for("stream-probe")
+            b.state = STATE_OPEN
+            b.opened_at = -b.reset_timeout
+
+            async def probe():
+                async with resilience.resilient_stream("agent", "stream-probe", "POST", f"{agent.url}/runs/stream", json={}):
+                    pass
+
+            call = asyncio.create_task(probe())
+            await asyncio.sleep(0.1)
+            assert b.state == STATE_HALF_OPEN
+            call.cancel()
+            try:
+                await call
+            except asyncio.CancelledError:
+                pass
+            # still unproven, but the next caller may probe
+            return b.state, b.allow()
+
+    state, allowed = asyncio.run(run())
+    assert state == STATE_HALF_OPEN
+    assert allowed
+
+def test_cancelled_bulkhead_waiter_does_not_keep_a_permit():
+    async def run():
+        bh = resilience.Bulkhead("cancel", 1, 5, 5.0)
+        entered = []
+
+        async def waiter():
+            async with bh.slot():
+                entered.append(True)
+                await asyncio.sleep(5)
+
+        async with bh.slot():
+            w = asyncio.create_task(waiter())
+            await asyncio.sleep(0.05)
+            assert bh.queued() == 1
+        # the permit was just handed to the waiter, which is cancelled before it runs
+        w.cancel()
+        await asyncio.sleep(0.1)
+        return w.cancelled(), entered, bh._sem.locked(), bh.in_flight, bh.waiting
+
+    cancelled, entered, locked, in_flight, waiting = asyncio.run(run())
+    assert cancelled and not entered
+    assert not locked
+    assert (in_flight, waiting) == (0, 0)
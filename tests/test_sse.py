@@ -0,0 +1,61 @@
+import json
+from app.sse import AgentStreamDecoder, SSEDecoder, KIND_DELTA, KIND_RESET, KIND_ERROR, KIND_END
+
+def _feed(lines):
+    dec = AgentStreamDecoder()
+    events = []
+    for line in lines:
+        events.extend(dec.feed_line(line))
+    events.extend(dec.close())
+    return dec, events
+
+def _frame(data, event=None):
+    out = [f"event: {event}"] if event else []
+    return out + ["data: " + json.dumps(data), ""]
+
+def test_sse_frames_join_multiline_data_and_skip_comments():
+    dec = SSEDecoder()
+    frames = [f for f in (dec.feed_line(l) for l in [": ping", "event: messages", "data: a", "data: b", "id: 7", ""]) if f]
+    assert [(f.event, f.data, f.id) for f in frames] == [("messages", "a\nb", "7")]
+
+def test_cumulative_snapshots_yield_only_the_new_text():
+    words = [f"w{i} " for i in range(200)]
+    lines = []
+    acc = ""
+    for w in words:
+        acc += w
+        lines += _frame([{"id": "m1", "content": acc}, {}], "messages")
+    dec, events = _feed(lines)
+    assert [e.delta for e in events if e.kind == KIND_DELTA] == words
+    assert dec.text == "".join(words)
+
+def test_chunk_and_delta_shapes():
+    chunks = []
+    for w in ["Hel", "lo"]:
+        chunks += _frame([{"id": "m1", "content": [{"type": "text", "text": w}]}, {}], "messages")
+    dec, _ = _feed(chunks)
+    assert dec.text == "Hello"
+    deltas = []
+    for w in ["a", "b", "c"]:
+        deltas += _frame({"data": {"delta": {"content": w}}})
+    dec, _ = _feed(deltas)
+    assert dec.text == "abc"
+
+def test_repeated_snapshot_is_not_duplicated():
+    lines = _frame([{"id": "m1", "content": "same"}, {}]) * 3
+    dec, events = _feed(lines)
+    assert [e.delta for e in events if e.kind == KIND_DELTA] == ["same"]
+
+def test_new_message_id_resets_the_text():
+    lines = _frame([{"id": "m1", "content": "thinking"}, {}]) + _frame([{"id": "m2", "content": "answer"}, {}])
+    dec, events = _feed(lines)
+    assert [e.kind for e in events] == [KIND_DELTA, KIND_RESET, KIND_DELTA]
+    assert dec.text == "answer"
+
+def test_a2a_error_and_end_frames():
+    lines = _frame({"jsonrpc": "2.0", "result": {"messageId": "x", "parts": [{"kind": "text", "text": "hi"}]}})
+    lines += _frame({"message": "boom"}, "error")
+    lines += ["event: end", "data: ", ""]
+    dec, events = _feed(lines)
+    assert [e.kind for e in events] == [KIND_DELTA, KIND_ERROR, KIND_END]
+    assert dec.text == "hi" and dec.errors == 1